@@ -1,23 +1,87 @@
+import os
+import secrets
+import time
+
 from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_restful import Api
-from extensions import db, bcrypt
+from sqlalchemy.exc import IntegrityError
+from extensions import db, bcrypt, password_hasher
+from database import configure_database, init_engines
+from cache import response_cache
+from instrumentation import instrumentation
+from compression import compression
 from resources import HelloWorld
-from authentication import SignUp, Login
-from models import db, User, Post, Comment, Like, Follow, Profile
+from authentication import SignUp, Login, TokenRefresh, Logout
+from tokens import require_auth, revoke_sessions, tokens_cli
+from models import db, User, Post, Comment, Like, Follow, Profile, RefreshToken
+from feed import build_feed, feed_items
+from counters import adjust, counters_cli
+from query_plans import plans_cli
+from jobs import jobs_cli
+from benchmarks import bench_cli
+from datagen import data_cli
+from recommendations import suggestions_cli, suggestions_for
+from trending import trending_cli
+import timeline
+import trending
+import batch
+import media
+import purge
+from streaming import stream_query, wants_stream
+from fieldsets import InvalidFieldset, included_tables, projection_for
+from search import InvalidSearch, exclude_search_tables, search
+from pagination import InvalidCursor, page_limit, paginate
+from threads import build_thread, DEFAULT_THREAD_DEPTH, DEFAULT_REPLIES_LIMIT
 
 app = Flask(__name__)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///pixify.db'
+configure_database(app)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Fan-out-on-write timelines are opt-in; see timeline.py.
+app.config['TIMELINE_FANOUT'] = bool(os.environ.get('TIMELINE_FANOUT'))
+app.config['TIMELINE_FANOUT_MAX_FOLLOWERS'] = int(os.environ.get('TIMELINE_FANOUT_MAX_FOLLOWERS',
+                                                                 timeline.DEFAULT_MAX_FOLLOWERS))
+# Run background jobs inline instead of queueing them (no worker needed).
+app.config['JOBS_EAGER'] = bool(os.environ.get('JOBS_EAGER'))
+# Requests slower than this are logged with the SQL they ran.
+app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 500))
+# Signs access tokens. Without one set, a random key is used and every
+# token dies with the process, and isn't accepted by other workers.
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+if not app.config['SECRET_KEY']:
+    app.config['SECRET_KEY'] = secrets.token_hex(32)
+    if not (app.debug or app.testing):
+        app.logger.warning("SECRET_KEY is not set: signing tokens with a random key. Tokens will "
+                           "not survive a restart or be accepted by other workers. Set SECRET_KEY "
+                           "in production.")
+# Uploaded images live under MEDIA_ROOT (default: instance/media) and are
+# linked as MEDIA_URL/<sha>/<variant> (default: /media on the request's host).
+app.config['MEDIA_ROOT'] = os.environ.get('MEDIA_ROOT')
+app.config['MEDIA_URL'] = os.environ.get('MEDIA_URL')
 
 CORS(app)
+instrumentation.init_app(app)
+# After instrumentation, so its hook (which runs later) sees compressed sizes.
+compression.init_app(app)
 db.init_app(app)
+init_engines(app, db)
 bcrypt.init_app(app)
-
-migrate = Migrate(app, db)
+password_hasher.init_app(app)
+response_cache.init_app(app)
+
+migrate = Migrate(app, db, include_object=exclude_search_tables)
+app.cli.add_command(counters_cli)
+app.cli.add_command(plans_cli)
+app.cli.add_command(timeline.timeline_cli)
+app.cli.add_command(bench_cli)
+app.cli.add_command(jobs_cli)
+app.cli.add_command(data_cli)
+app.cli.add_command(tokens_cli)
+app.cli.add_command(suggestions_cli)
+app.cli.add_command(trending_cli)
 
 # Initialize API
 api = Api(app)
@@ -26,6 +90,19 @@ api = Api(app)
 api.add_resource(HelloWorld, '/')
 api.add_resource(SignUp, '/signup')
 api.add_resource(Login, '/login')
+api.add_resource(TokenRefresh, '/token/refresh')
+api.add_resource(Logout, '/logout')
+
+
+def forbidden():
+    return jsonify({"error": "You can only do that for your own account."}), 403
+
+
+def acting_user_id(data, field, current_user):
+    """The user a write is made as: ``data[field]`` when the client sends it,
+    which must then be the caller, otherwise the caller."""
+    user_id = data.get(field, current_user.id)
+    return user_id if user_id == current_user.id else None
 
 
 @app.route('/')
@@ -33,26 +110,87 @@ def home():
     return "Hello, Flask!"
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return instrumentation.metrics_response()
+
+
 @app.route('/users', methods=['GET'])
+@response_cache.cached('users', related=included_tables)
 def get_users():
     try:
-        users = User.query.all()
-        return jsonify([user.to_dict_basic() for user in users]), 200
+        projection = projection_for(User)
+        keys = (User.date_created, User.id)
+        users, next_cursor = paginate(projection.query(*keys).filter(User.deleted_at.is_(None)), keys,
+                                      cursor=request.args.get('cursor'), limit=page_limit())
+        return projection.page_response(users, next_cursor)
+    except (InvalidCursor, InvalidFieldset) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/users/<int:id>', methods=['GET'])
+@response_cache.cached('users', related=included_tables)
 def get_user(id):
     try:
-        user = User.query.get_or_404(id)
-        return jsonify(user.to_dict_basic()), 200
+        projection = projection_for(User)
+        user = projection.query().filter(User.id == id, User.deleted_at.is_(None)).first()
+        if user is None:
+            return jsonify({"error": "User not found"}), 404
+        return jsonify(projection.row(user)), 200
+    except InvalidFieldset as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "User not found"}), 404
 
 
+@app.route('/search', methods=['GET'])
+@response_cache.cached('posts', 'comments', 'users', 'profiles')
+def search_content():
+    try:
+        return jsonify(search(request.args.get('q', ''), kind=request.args.get('type', 'posts'),
+                              cursor=request.args.get('cursor'), limit=page_limit())), 200
+    except (InvalidSearch, InvalidCursor) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Unable to search", "details": str(e)}), 500
+
+
+@app.route('/users/<int:id>/timeline', methods=['GET'])
+@response_cache.cached('users', 'posts', 'profiles', 'likes', 'follows', 'timeline_entries')
+def get_timeline(id):
+    User.query.get_or_404(id)
+    try:
+        post_ids, next_cursor = timeline.read_timeline(
+            id, cursor=request.args.get('cursor'), limit=page_limit()
+        )
+        posts = {post.id: post for post in Post.query.filter(Post.id.in_(post_ids))}
+        ordered = [posts[post_id] for post_id in post_ids if post_id in posts]
+        return jsonify({
+            "items": feed_items(ordered, viewer_id=id),
+            "next_cursor": next_cursor
+        }), 200
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Unable to fetch timeline", "details": str(e)}), 500
+
+
+@app.route('/users/<int:id>/suggestions', methods=['GET'])
+@response_cache.cached('follow_suggestions', 'follows', 'users', 'profiles')
+def get_suggestions(id):
+    try:
+        return jsonify({"items": suggestions_for(id, limit=page_limit())}), 200
+    except Exception as e:
+        return jsonify({"error": "Unable to fetch suggestions", "details": str(e)}), 500
+
+
 @app.route('/users/<int:id>', methods=['PATCH'])
-def update_user(id):
+@require_auth
+def update_user(id, current_user):
+    if id != current_user.id:
+        return forbidden()
     data = request.get_json()
     try:
         user = User.query.get_or_404(id)
@@ -67,38 +205,59 @@ def update_user(id):
 
 
 @app.route('/users/<int:id>', methods=['DELETE'])
-def delete_user(id):
+@require_auth
+def delete_user(id, current_user):
+    if id != current_user.id:
+        return forbidden()
     try:
         user = User.query.get_or_404(id)
-        db.session.delete(user)
+        if user.deleted_at:
+            return jsonify({"message": "User deletion in progress"}), 202
+        revoke_sessions(RefreshToken.user_id == id)
+        # Large accounts are marked deleted and purged by a background job.
+        deleted = purge.delete_user(id)
         db.session.commit()
-        return jsonify({"message": "User deleted"}), 200
+        if deleted:
+            return jsonify({"message": "User deleted"}), 200
+        return jsonify({"message": "User deletion in progress"}), 202
     except Exception as e:
         return jsonify({"error": "User not found"}), 404
 
 
 @app.route('/posts', methods=['GET'])
+@response_cache.cached('posts', related=included_tables)
 def get_posts():
     try:
-        posts = Post.query.all()
-        return jsonify([post.to_dict() for post in posts]), 200
+        projection = projection_for(Post)
+        keys = (Post.created_at, Post.id)
+        if wants_stream():
+            return stream_query(projection.query(), keys, projection.row,
+                                cursor=request.args.get('cursor'))
+        posts, next_cursor = paginate(projection.query(*keys), keys,
+                                      cursor=request.args.get('cursor'), limit=page_limit())
+        return projection.page_response(posts, next_cursor)
+    except (InvalidCursor, InvalidFieldset) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Unable to fetch posts"}), 500
 
 
 @app.route('/posts', methods=['POST'])
-def create_post():
+@require_auth
+def create_post(current_user):
     data = request.get_json()
 
     title = data.get('title')
     body = data.get('body')
-    author_id = data.get('author_id')
-    image_url = data.get('image_url')  
+    author_id = acting_user_id(data, 'author_id', current_user)
 
-    if not title or not body or not author_id:
-        return jsonify({"error": "Title, body, and author_id are required."}), 400
+    if author_id is None:
+        return forbidden()
+    if not title or not body:
+        return jsonify({"error": "Title and body are required."}), 400
 
     try:
+        image_url = media.reference(data.get('image_url'))
         new_post = Post(
             title=title,
             body=body,
@@ -106,6 +265,9 @@ def create_post():
             image_url=image_url
         )
         db.session.add(new_post)
+        adjust(User, author_id, post_count=1)
+        db.session.flush()
+        timeline.schedule_fan_out(new_post.id)
         db.session.commit()
         return jsonify(new_post.to_dict()), 201
 
@@ -116,20 +278,45 @@ def create_post():
 
 
 
+@app.route('/posts/trending', methods=['GET'])
+@response_cache.cached('users', 'posts', 'profiles', 'likes', 'follows', 'post_scores')
+def get_trending_posts():
+    try:
+        ranked = trending.top_posts.get()[:page_limit()]
+        posts = {post.id: post for post in Post.query.filter(Post.id.in_([post_id for post_id, _ in ranked]))}
+        ordered = [posts[post_id] for post_id, _ in ranked if post_id in posts]
+        items = feed_items(ordered, viewer_id=request.args.get('user_id', type=int))
+        scores = dict(ranked)
+        for item in items:
+            item["trending_score"] = round(scores[item["id"]], 4)
+        return jsonify({"items": items}), 200
+    except Exception as e:
+        return jsonify({"error": "Unable to fetch trending posts", "details": str(e)}), 500
+
+
 @app.route('/posts/<int:id>', methods=['GET'])
+@response_cache.cached('posts', related=included_tables)
 def get_post(id):
     try:
-        post = Post.query.get_or_404(id)
-        return jsonify(post.to_dict()), 200
+        projection = projection_for(Post)
+        post = projection.query().filter(Post.id == id).first()
+        if post is None:
+            return jsonify({"error": "Post not found"}), 404
+        return jsonify(projection.row(post)), 200
+    except InvalidFieldset as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Post not found"}), 404
 
 
 @app.route('/posts/<int:id>', methods=['PATCH'])
-def update_post(id):
+@require_auth
+def update_post(id, current_user):
     data = request.get_json()
     try:
         post = Post.query.get_or_404(id)
+        if post.author_id != current_user.id:
+            return forbidden()
         if 'title' in data:
             post.title = data['title']
         if 'body' in data:
@@ -141,56 +328,193 @@ def update_post(id):
 
 
 @app.route('/posts/<int:id>', methods=['DELETE'])
-def delete_post(id):
+@require_auth
+def delete_post(id, current_user):
     try:
         post = Post.query.get_or_404(id)
+        if post.author_id != current_user.id:
+            return forbidden()
         db.session.delete(post)
+        adjust(User, post.author_id, post_count=-1)
         db.session.commit()
         return jsonify({"message": "Post deleted"}), 200
     except Exception as e:
         return jsonify({"error": "Post not found"}), 404
 
 
+@app.route('/feed', methods=['GET'])
+@response_cache.cached('users', 'posts', 'profiles', 'likes', 'follows')
+def get_feed():
+    try:
+        feed = build_feed(
+            viewer_id=request.args.get('user_id', type=int),
+            cursor=request.args.get('cursor'),
+            limit=page_limit()
+        )
+        return jsonify(feed), 200
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Unable to fetch feed", "details": str(e)}), 500
+
+
+@app.route('/posts/<int:id>/comments', methods=['GET'])
+@response_cache.cached('posts', 'comments', related=included_tables)
+def get_post_comments(id):
+    Post.query.get_or_404(id)
+    try:
+        projection = projection_for(Comment)
+        query = projection.query(Comment.path).filter(Comment.post_id == id)
+        base_depth = 0
+
+        # ?parent= narrows the listing to the replies under one comment.
+        parent_id = request.args.get('parent', type=int)
+        if parent_id:
+            parent = Comment.query.filter_by(id=parent_id, post_id=id).first()
+            if not parent:
+                return jsonify({"error": "Comment not found"}), 404
+            query = query.filter(Comment.descendants_of(parent.path))
+            base_depth = parent.depth + 1
+
+        max_depth = request.args.get('depth', type=int)
+        if max_depth is not None:
+            query = query.filter(Comment.depth <= base_depth + max_depth)
+
+        # Ordering by path yields the thread depth-first, in tree order.
+        comments, next_cursor = paginate(query, (Comment.path,),
+                                         cursor=request.args.get('cursor'), limit=page_limit())
+        return projection.page_response(comments, next_cursor)
+    except (InvalidCursor, InvalidFieldset) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Unable to fetch comments", "details": str(e)}), 500
+
+
 @app.route('/comments', methods=['GET'])
+@response_cache.cached('comments', related=included_tables)
 def get_comments():
     try:
-        comments = Comment.query.all()
-        return jsonify([comment.to_dict() for comment in comments]), 200
+        post_id = request.args.get('post_id', type=int)
+
+        projection = projection_for(Comment)
+        keys = (Comment.created_at, Comment.id)
+        query = projection.query(*keys)
+        if post_id:
+            query = query.filter(Comment.post_id == post_id)
+
+        comments, next_cursor = paginate(query, keys,
+                                         cursor=request.args.get('cursor'), limit=page_limit())
+        return projection.page_response(comments, next_cursor)
+    except (InvalidCursor, InvalidFieldset) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Unable to fetch comments"}), 500
 
 
 @app.route('/comments', methods=['POST'])
-def create_comment():
+@require_auth
+def create_comment(current_user):
     data = request.get_json()
+    user_id = acting_user_id(data, 'user_id', current_user)
+    if user_id is None:
+        return forbidden()
     try:
+        parent_id = data.get('parent_comment_id')  # optional
+        if parent_id is not None:
+            # The reply's path is built from its parent's, so the parent must
+            # be on the same post.
+            parent = db.session.get(Comment, parent_id)
+            if parent is None or parent.post_id != data['post_id']:
+                return jsonify({"error": "Parent comment not found on this post."}), 400
         new_comment = Comment(
             body=data['body'],
             post_id=data['post_id'],
-            user_id=data['user_id'],  # 👈 INCLUDE THIS
-            parent_comment_id=data.get('parent_comment_id')  # optional
+            user_id=user_id,
+            parent_comment_id=parent_id
         )
         db.session.add(new_comment)
+        adjust(Post, new_comment.post_id, comment_count=1)
+        trending.record([(new_comment.post_id, trending.comment_weight(), time.time())])
         db.session.commit()
         return jsonify(new_comment.to_dict()), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Post or user not found."}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/comments/batch', methods=['POST'])
+@require_auth
+def create_comments_batch(current_user):
+    try:
+        return jsonify({"results": batch.create_comments(request.get_json(), current_user.id)}), 200
+    except batch.BatchError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
 @app.route('/comments/<int:id>', methods=['GET'])
+@response_cache.cached('comments')
 def get_comment(id):
     try:
         comment = Comment.query.get_or_404(id)
-        return jsonify(comment.to_dict()), 200
     except Exception as e:
         return jsonify({"error": "Comment not found"}), 404
 
+    try:
+        max_depth = request.args.get('depth', DEFAULT_THREAD_DEPTH, type=int)
+        # One index range scan over the subtree; it is linked in memory. The
+        # extra level lets nodes at the cut-off still report their reply count.
+        descendants = (Comment.query
+                       .filter(Comment.post_id == comment.post_id,
+                               Comment.descendants_of(comment.path),
+                               Comment.depth <= comment.depth + max_depth + 1)
+                       .order_by(Comment.created_at, Comment.id)
+                       .all())
+        thread = build_thread(
+            descendants, [comment],
+            max_depth=max_depth,
+            replies_limit=request.args.get('replies', DEFAULT_REPLIES_LIMIT, type=int)
+        )
+        return jsonify(thread[0]), 200
+    except Exception as e:
+        return jsonify({"error": "Unable to fetch comment", "details": str(e)}), 500
+
+
+@app.route('/comments/<int:id>/replies', methods=['GET'])
+@response_cache.cached('comments', related=included_tables)
+def get_comment_replies(id):
+    try:
+        projection = projection_for(Comment)
+        keys = (Comment.created_at, Comment.id)
+        replies, next_cursor = paginate(projection.query(*keys).filter(Comment.parent_comment_id == id),
+                                        keys, cursor=request.args.get('cursor'), limit=page_limit())
+        return projection.page_response(replies, next_cursor)
+    except (InvalidCursor, InvalidFieldset) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Unable to fetch replies", "details": str(e)}), 500
+
 
 @app.route('/comments/<int:id>', methods=['DELETE'])
-def delete_comment(id):
+@require_auth
+def delete_comment(id, current_user):
     try:
         comment = Comment.query.get_or_404(id)
-        db.session.delete(comment)
+        if comment.user_id != current_user.id:
+            return forbidden()
+        # Remove the comment and its whole subtree in one statement. The
+        # subtree is counted first: SQLite's rowcount leaves out replies the
+        # parent_comment_id cascade removes alongside.
+        subtree = Comment.query.filter(
+            Comment.post_id == comment.post_id,
+            db.or_(Comment.id == comment.id, Comment.descendants_of(comment.path))
+        )
+        deleted = subtree.count()
+        subtree.delete(synchronize_session=False)
+        adjust(Post, comment.post_id, comment_count=-deleted)
         db.session.commit()
         return jsonify({"message": "Comment deleted"}), 200
     except Exception as e:
@@ -198,37 +522,54 @@ def delete_comment(id):
 
 
 @app.route('/profiles', methods=['GET'])
+@response_cache.cached('profiles')
 def get_profiles():
     try:
-        profiles = Profile.query.all()
-        return jsonify([profile.to_dict() for profile in profiles]), 200
+        # Profiles carry no timestamp, so they are paged on id alone.
+        projection = projection_for(Profile)
+        profiles, next_cursor = paginate(projection.query(Profile.id), (Profile.id,),
+                                         cursor=request.args.get('cursor'), limit=page_limit())
+        return projection.page_response(profiles, next_cursor)
+    except (InvalidCursor, InvalidFieldset) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Unable to fetch profiles"}), 500
 
 
 @app.route('/profiles', methods=['POST'])
-def create_profile():
+@require_auth
+def create_profile(current_user):
     data = request.get_json()
+    user_id = acting_user_id(data, 'user_id', current_user)
+    if user_id is None:
+        return forbidden()
     try:
-        new_profile = Profile(location=data['location'], profile_image=data['profile_image'],
-                              website=data['website'], bio=data['bio'], user_id=data['user_id'])
+        new_profile = Profile(location=data['location'], profile_image=media.reference(data['profile_image']),
+                              website=data['website'], bio=data['bio'], user_id=user_id)
         db.session.add(new_profile)
         db.session.commit()
         return jsonify(new_profile.to_dict()), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Profile already exists."}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
 @app.route('/profiles/<int:user_id>', methods=['GET'])
+@response_cache.cached('profiles')
 def get_profile(user_id):
     try:
         # Look up a profile by the user_id field.
-        profile = Profile.query.filter_by(user_id=user_id).first()
+        projection = projection_for(Profile)
+        profile = projection.query().filter(Profile.user_id == user_id).first()
         if profile:
-            return jsonify(profile.to_dict()), 200
+            return jsonify(projection.row(profile)), 200
         else:
             # Return an empty object if no profile exists for that user.
             return jsonify({}), 200
+    except InvalidFieldset as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
@@ -236,7 +577,10 @@ def get_profile(user_id):
 
 
 @app.route('/profiles/<int:user_id>', methods=['PATCH'])
-def update_profile(user_id):
+@require_auth
+def update_profile(user_id, current_user):
+    if user_id != current_user.id:
+        return forbidden()
     data = request.get_json()
     try:
         # Retrieve the profile by user_id
@@ -252,7 +596,7 @@ def update_profile(user_id):
         if 'website' in data:
             profile.website = data['website']
         if 'profile_image' in data:
-            profile.profile_image = data['profile_image']
+            profile.profile_image = media.reference(data['profile_image'])
 
         db.session.commit()
         return jsonify(profile.to_dict()), 200
@@ -262,31 +606,95 @@ def update_profile(user_id):
 
 
 
+@app.route('/media', methods=['POST'])
+@require_auth
+def upload_media(current_user):
+    # Leave room for the multipart framing around the file itself.
+    if (request.content_length or 0) > media.max_bytes() + 64 * 1024:
+        return jsonify({"error": f"Images can be at most {media.max_bytes()} bytes."}), 413
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"error": "Send the image as a multipart 'file' field."}), 400
+    try:
+        stored, created = media.store(upload.stream, current_user.id)
+        db.session.commit()
+        return jsonify(media.describe(stored)), 201 if created else 200
+    except media.InvalidMedia as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Failed to store image", "details": str(e)}), 500
+
+
+@app.route('/media/<digest>/<variant>', methods=['GET'])
+def get_media(digest, variant):
+    response = media.serve(digest, variant)
+    if response is None:
+        return jsonify({"error": "Image not found"}), 404
+    return response
+
+
 @app.route('/likes', methods=['POST'])
-def like_post():
+@require_auth
+def like_post(current_user):
     data = request.get_json()
+    user_id = acting_user_id(data, 'user_id', current_user)
+    if user_id is None:
+        return forbidden()
     try:
-        new_like = Like(user_id=data['user_id'], post_id=data['post_id'])
+        new_like = Like(user_id=user_id, post_id=data['post_id'])
         db.session.add(new_like)
+        adjust(Post, new_like.post_id, like_count=1)
+        trending.record([(new_like.post_id, trending.like_weight(), time.time())])
         db.session.commit()
         return jsonify(new_like.to_dict()), 201
+    except IntegrityError:
+        db.session.rollback()
+        if Like.query.filter_by(user_id=user_id, post_id=data['post_id']).first():
+            return jsonify({"error": "Post already liked."}), 400
+        return jsonify({"error": "Post or user not found."}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/likes/batch', methods=['POST'])
+@require_auth
+def like_posts_batch(current_user):
+    try:
+        return jsonify({"results": batch.create_likes(request.get_json(), current_user.id)}), 200
+    except batch.BatchError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+
 @app.route('/likes', methods=['GET'])
+@response_cache.cached('likes')
 def get_likes():
     try:
-        likes = Like.query.all()
-        return jsonify([like.to_dict() for like in likes]), 200
+        projection = projection_for(Like)
+        keys = (Like.created_at, Like.id)
+        if wants_stream():
+            return stream_query(projection.query(), keys, projection.row,
+                                cursor=request.args.get('cursor'))
+        likes, next_cursor = paginate(projection.query(*keys), keys,
+                                      cursor=request.args.get('cursor'), limit=page_limit())
+        return projection.page_response(likes, next_cursor)
+    except (InvalidCursor, InvalidFieldset) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Unable to fetch likes"}), 500
 
 
 @app.route('/likes/<int:id>', methods=['DELETE'])
-def unlike_post(id):
+@require_auth
+def unlike_post(id, current_user):
     try:
         like = Like.query.get_or_404(id)
+        if like.user_id != current_user.id:
+            return forbidden()
         db.session.delete(like)
+        adjust(Post, like.post_id, like_count=-1)
+        # Take back exactly what the like added when it was made.
+        trending.record([(like.post_id, -trending.like_weight(), trending.timestamp(like.created_at))])
         db.session.commit()
         return jsonify({"message": "Like removed"}), 200
     except Exception as e:
@@ -294,12 +702,16 @@ def unlike_post(id):
 
 
 @app.route('/follows', methods=['POST'])
-def follow_user():
+@require_auth
+def follow_user(current_user):
     data = request.get_json()
+    data['follower_id'] = acting_user_id(data, 'follower_id', current_user)
+    if data['follower_id'] is None:
+        return forbidden()
 
     # Check required fields
-    if not data.get('follower_id') or not data.get('followed_id'):
-        return jsonify({"error": "follower_id and followed_id are required."}), 400
+    if not data.get('followed_id'):
+        return jsonify({"error": "followed_id is required."}), 400
 
     # Prevent a user from following themselves
     if data['follower_id'] == data['followed_id']:
@@ -319,34 +731,70 @@ def follow_user():
             followed_id=data['followed_id']
         )
         db.session.add(new_follow)
+        adjust(User, new_follow.followed_id, follower_count=1)
+        adjust(User, new_follow.follower_id, following_count=1)
+        timeline.schedule_backfill(new_follow.follower_id, new_follow.followed_id)
         db.session.commit()
         return jsonify(new_follow.to_dict()), 201
+    except IntegrityError:
+        # A concurrent request may have inserted the same follow.
+        db.session.rollback()
+        if Follow.query.filter_by(follower_id=data['follower_id'],
+                                  followed_id=data['followed_id']).first():
+            return jsonify({"error": "Already following this user."}), 400
+        return jsonify({"error": "User not found."}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/follows/batch', methods=['POST'])
+@require_auth
+def follow_users_batch(current_user):
+    try:
+        return jsonify({"results": batch.create_follows(request.get_json(), current_user.id)}), 200
+    except batch.BatchError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
 @app.route('/follows', methods=['GET'])
+@response_cache.cached('follows')
 def get_follows():
     try:
         follower_id = request.args.get('follower_id', type=int)
         followed_id = request.args.get('followed_id', type=int)
         
-        query = Follow.query
+        projection = projection_for(Follow)
+        keys = (Follow.created_at, Follow.id)
+        query = projection.query(*keys)
         if follower_id:
-            query = query.filter_by(follower_id=follower_id)
+            query = query.filter(Follow.follower_id == follower_id)
         if followed_id:
-            query = query.filter_by(followed_id=followed_id)
-            
-        follows = query.all()
-        return jsonify([follow.to_dict() for follow in follows]), 200
+            query = query.filter(Follow.followed_id == followed_id)
+
+        if wants_stream():
+            return stream_query(query, keys, projection.row,
+                                cursor=request.args.get('cursor'))
+        follows, next_cursor = paginate(query, keys,
+                                        cursor=request.args.get('cursor'), limit=page_limit())
+        return projection.page_response(follows, next_cursor)
+    except (InvalidCursor, InvalidFieldset) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Unable to fetch follows", "details": str(e)}), 500
 
 @app.route('/follows/<int:follow_id>', methods=['DELETE'])
-def delete_follow(follow_id):
+@require_auth
+def delete_follow(follow_id, current_user):
     try:
         follow = Follow.query.get_or_404(follow_id)
+        if follow.follower_id != current_user.id:
+            return forbidden()
         db.session.delete(follow)
+        adjust(User, follow.followed_id, follower_count=-1)
+        adjust(User, follow.follower_id, following_count=-1)
+        timeline.retract_follow(follow.follower_id, follow.followed_id)
         db.session.commit()
         return jsonify({"message": "Follow removed"}), 200
     except Exception as e:
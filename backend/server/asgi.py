@@ -0,0 +1,186 @@
+"""ASGI entry point: ``uvicorn asgi:app``.
+
+Serves the same routes, with the same responses, as the WSGI app in app.py,
+on async SQLAlchemy sessions (asyncdb.py) instead of one thread per request.
+
+Each request gets a Flask request context and an ``AsyncSession`` (reading
+from the replica for GET/HEAD when one is configured). ``POST /signup`` and
+``POST /login`` run as coroutines (authentication.py), awaiting bcrypt on
+the password pool. Every other view is the app.py function itself, run with
+``AsyncSession.run_sync``: its queries are awaited on the async driver, so
+while one request waits on the database the loop serves the others. Before
+and after request hooks, error handlers, caching and compression apply as
+they do under WSGI. Streamed exports are sent chunk by chunk.
+"""
+import io
+import os
+
+from flask import request
+
+from app import api, app as flask_app
+from asyncdb import AsyncDatabase, using_session
+from authentication import log_in_async, sign_up_async
+
+# (endpoint, method) -> coroutine taking the request's AsyncSession.
+ASYNC_VIEWS = {
+    ('signup', 'POST'): sign_up_async,
+    ('login', 'POST'): log_in_async,
+}
+
+database = AsyncDatabase(flask_app)
+
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def _environ(scope, body):
+    """The WSGI environ for an ASGI HTTP request."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope['headers']:
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        if name != 'CONTENT_TYPE':
+            name = 'HTTP_' + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def _unpack(rv):
+    """``(data, code, headers)`` from a Flask-RESTful style return value."""
+    if not isinstance(rv, tuple):
+        return rv, 200, {}
+    if len(rv) == 2:
+        return rv[0], rv[1], {}
+    return rv
+
+
+def _handle(handler, error):
+    # Flask's handlers re-raise with a bare ``raise``, so they have to run
+    # while the error is being handled in their own greenlet.
+    try:
+        raise error
+    except Exception:
+        return handler(error)
+
+
+async def _dispatch(session):
+    """The response for the current request context."""
+    view = ASYNC_VIEWS.get((request.endpoint, request.method))
+    if view is None or request.routing_exception is not None:
+        return await session.run_sync(using_session(flask_app.full_dispatch_request))
+
+    rv = await session.run_sync(using_session(flask_app.preprocess_request))
+    if rv is None:
+        try:
+            data, code, headers = _unpack(await view(session))
+            rv = api.make_response(data, code, headers=headers)
+        except Exception as e:
+            await session.rollback()
+            rv = await session.run_sync(using_session(_handle), flask_app.handle_user_exception, e)
+    return await session.run_sync(using_session(flask_app.finalize_request), rv)
+
+
+async def _send_response(send, session, response, environ):
+    app_iter, status, headers = response.get_wsgi_response(environ)
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in headers],
+    })
+    if not response.is_streamed:
+        await send({'type': 'http.response.body', 'body': b''.join(app_iter)})
+        return
+
+    # Streamed bodies read rows as they go, so each chunk is produced on the
+    # session like a view.
+    chunks = iter(app_iter)
+    next_chunk = using_session(lambda: next(chunks, None))
+    try:
+        while (chunk := await session.run_sync(next_chunk)) is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        close = getattr(app_iter, 'close', None)
+        if close is not None:
+            await session.run_sync(using_session(close))
+
+
+async def _http(scope, receive, send):
+    body = await _read_body(receive)
+    if body is None:
+        return
+    environ = _environ(scope, body)
+    ctx = flask_app.request_context(environ)
+    error = None
+    ctx.push()
+    try:
+        async with database.session(read_only=scope['method'] in ('GET', 'HEAD')) as session:
+            try:
+                response = await _dispatch(session)
+            except Exception as e:
+                error = e
+                await session.rollback()
+                response = await session.run_sync(using_session(_handle), flask_app.handle_exception, e)
+            await _send_response(send, session, response, environ)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        ctx.pop(error)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await database.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'http':
+        await _http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run('asgi:app', host=os.environ.get('HOST', '127.0.0.1'),
+                port=int(os.environ.get('PORT', 8000)))
@@ -0,0 +1,94 @@
+"""Async database sessions for the ASGI entry point (see asgi.py).
+
+The engine uses the Flask app's database URL with an async driver: aiosqlite
+for SQLite, asyncpg for PostgreSQL. It gets the same pool settings, and
+SQLite connections the same pragmas and functions, as the sync engine
+(database.py). With ``DATABASE_READ_URL`` set, sessions opened for GET/HEAD
+requests send their SELECTs to the replica.
+
+``using_session(fn)`` adapts a sync function for ``AsyncSession.run_sync``:
+while it runs, ``db.session`` is that async session's sync session. Views,
+helpers and ``Model.query`` then work unchanged, while every statement they
+issue is awaited on the async driver, so the event loop serves other
+requests in the meantime instead of blocking.
+"""
+from sqlalchemy import Select, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from database import REPLICA_BIND, _add_sqlite_functions, _apply_sqlite_pragmas, engine_options
+from extensions import db
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def async_url(url):
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {url.get_backend_name()!r} databases.")
+    return url.set(drivername=driver)
+
+
+class ReplicaSession(Session):
+    """Sends plain SELECTs to ``info['replica']`` when it is set."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if bind is None and replica is not None and not self._flushing and isinstance(clause, Select):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _create_engine(sync_engine):
+    # The sync engine's URL has relative SQLite paths resolved against the
+    # instance folder, as Flask-SQLAlchemy does.
+    url = sync_engine.url.render_as_string(hide_password=False)
+    engine = create_async_engine(async_url(url), **engine_options(url))
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', _apply_sqlite_pragmas)
+        event.listen(engine.sync_engine, 'connect', _add_sqlite_functions)
+    return engine
+
+
+class AsyncDatabase:
+
+    def __init__(self, app=None):
+        self.engine = None
+        self.read_engine = None
+        self._sessions = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Call after ``db.init_app(app)``."""
+        with app.app_context():
+            self.engine = _create_engine(db.engine)
+            if REPLICA_BIND in db.engines:
+                self.read_engine = _create_engine(db.engines[REPLICA_BIND])
+        self._sessions = async_sessionmaker(self.engine, sync_session_class=ReplicaSession)
+        app.extensions['async_database'] = self
+
+    def session(self, read_only=False):
+        info = {}
+        if read_only and self.read_engine is not None:
+            info['replica'] = self.read_engine.sync_engine
+        return self._sessions(info=info)
+
+    async def dispose(self):
+        await self.engine.dispose()
+        if self.read_engine is not None:
+            await self.read_engine.dispose()
+
+
+def using_session(fn):
+    """``fn`` as a callable for ``AsyncSession.run_sync``, with ``db.session``
+    bound to the async session while it runs."""
+    def call(sync_session, *args, **kwargs):
+        db.session.registry.set(sync_session)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            db.session.registry.clear()
+    return call
@@ -0,0 +1,591 @@
+"""Check that no route's SQL statement count grows with the data.
+
+Every route registered on the app is called once against a small generated
+dataset and once against a large one (see ``datagen.py``). A route that runs
+more statements at the larger size is issuing per-row queries (an N+1,
+typically a lazy relationship touched in a loop), and the statements that
+were repeated are printed. Routes with no entry in ``AUDITED_REQUESTS`` fail
+too, so new endpoints can't skip the audit.
+
+``RESPONSE_CHECKS`` then cover behaviour a statement count can't see, such
+as content negotiation, each against a freshly generated small dataset.
+
+Runs against a throwaway SQLite database, never the app's own:
+
+    python audit_queries.py --small 10 --large 10000
+"""
+import hashlib
+import io
+import os
+import tempfile
+from collections import Counter
+
+import click
+from PIL import Image
+
+
+def _audit_image():
+    output = io.BytesIO()
+    Image.new('RGB', (32, 24), (200, 40, 90)).save(output, format='PNG')
+    return output.getvalue()
+
+
+AUDIT_IMAGE = _audit_image()
+AUDIT_IMAGE_SHA = hashlib.sha256(AUDIT_IMAGE).hexdigest()
+
+IGNORED_METHODS = {'HEAD', 'OPTIONS'}
+
+# (method, rule, path, JSON body, user). Requests run in this order against
+# the same dataset, so the writes come after the reads and the deletes last.
+# Requests with a user carry an access token for them. A bytes body is sent
+# as a multipart file upload. A callable body or
+# user is given a dict with the id the signup request creates ('new_user')
+# and the refresh token the login returned ('refresh_token').
+AUDITED_REQUESTS = [
+    ('GET', '/', '/', None, None),
+    ('GET', '/metrics', '/metrics', None, None),
+    ('GET', '/users', '/users', None, None),
+    ('GET', '/users', '/users?fields=id,username&include=profile', None, None),
+    ('GET', '/users/<int:id>', '/users/1', None, None),
+    ('GET', '/users/<int:id>/timeline', '/users/2/timeline', None, None),
+    ('GET', '/users/<int:id>/suggestions', '/users/2/suggestions', None, None),
+    ('GET', '/search', '/search?q=post&type=posts', None, None),
+    ('GET', '/search', '/search?q=comment&type=comments', None, None),
+    ('GET', '/search', '/search?q=user&type=users', None, None),
+    ('GET', '/posts', '/posts', None, None),
+    ('GET', '/posts', '/posts?stream=1', None, None),
+    ('GET', '/posts', '/posts?fields=id,title&include=author,profile,counts', None, None),
+    ('GET', '/posts/<int:id>', '/posts/1', None, None),
+    ('GET', '/feed', '/feed?user_id=2', None, None),
+    ('GET', '/posts/<int:id>/comments', '/posts/1/comments', None, None),
+    ('GET', '/comments', '/comments', None, None),
+    ('GET', '/comments', '/comments?include=author', None, None),
+    ('GET', '/comments/<int:id>', '/comments/1', None, None),
+    ('GET', '/comments/<int:id>/replies', '/comments/1/replies', None, None),
+    ('GET', '/profiles', '/profiles', None, None),
+    ('GET', '/profiles/<int:user_id>', '/profiles/1', None, None),
+    ('GET', '/likes', '/likes', None, None),
+    ('GET', '/likes', '/likes?stream=1', None, None),
+    ('GET', '/follows', '/follows', None, None),
+    ('GET', '/follows', '/follows?stream=1', None, None),
+    ('POST', '/signup', '/signup', {"username": "auditor", "email": "auditor@example.com",
+                                    "first_name": "Audit", "last_name": "Or",
+                                    "password": "password4040"}, None),
+    ('POST', '/login', '/login', {"email": "user1@example.com", "password": "password4040"}, None),
+    ('POST', '/token/refresh', '/token/refresh',
+     lambda state: {"refresh_token": state['refresh_token']}, None),
+    ('PATCH', '/users/<int:id>', '/users/1', {"first_name": "Renamed"}, 1),
+    ('POST', '/media', '/media', AUDIT_IMAGE, 1),
+    ('GET', '/media/<digest>/<variant>', f'/media/{AUDIT_IMAGE_SHA}/original', None, None),
+    ('POST', '/profiles', '/profiles', {
+        "location": "Mombasa", "website": "https://example.com",
+        "profile_image": "https://example.com/a.jpg", "bio": "Profile written by the query audit run"},
+     lambda state: state['new_user']),
+    ('PATCH', '/profiles/<int:user_id>', '/profiles/1', {"bio": "Bio rewritten by the query audit run"}, 1),
+    ('POST', '/posts', '/posts', {"title": "Audit post", "body": "Audit body",
+                                  "image_url": f"media:{AUDIT_IMAGE_SHA}"}, 1),
+    ('PATCH', '/posts/<int:id>', '/posts/1', {"title": "Renamed post"}, 1),
+    ('POST', '/comments', '/comments', {"body": "Audit reply", "post_id": 1, "parent_comment_id": 1}, 2),
+    ('POST', '/comments/batch', '/comments/batch', {"items": [
+        {"body": f"Batch reply {n}", "post_id": 1, "parent_comment_id": 1}
+        for n in range(3)]}, 2),
+    ('POST', '/likes', '/likes', {"post_id": 2}, 2),
+    ('POST', '/likes/batch', '/likes/batch', {"items": [{"post_id": 2}, {"post_id": 3}]}, 3),
+    ('POST', '/follows', '/follows', {"followed_id": 3}, 2),
+    ('POST', '/follows/batch', '/follows/batch', {"items": [{"followed_id": 2}, {"followed_id": 4}]}, 3),
+    # Ranks the posts the requests above liked and commented on.
+    ('GET', '/posts/trending', '/posts/trending', None, None),
+    # The first like and follow generated are user 2's; comment 1 and post 1 are user 1's.
+    ('DELETE', '/likes/<int:id>', '/likes/1', None, 2),
+    ('DELETE', '/follows/<int:follow_id>', '/follows/1', None, 2),
+    ('DELETE', '/comments/<int:id>', '/comments/1', None, 1),
+    ('DELETE', '/posts/<int:id>', '/posts/1', None, 1),
+    ('POST', '/logout', '/logout', None, 1),
+    ('DELETE', '/users/<int:id>', '/users/1', None, 1),
+]
+
+
+# Functions taking the app and a test client and returning a list of problems.
+RESPONSE_CHECKS = []
+
+
+def response_check(check):
+    RESPONSE_CHECKS.append(check)
+    return check
+
+
+BROWSER_ACCEPT = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+
+
+@response_check
+def stream_negotiation(app, client):
+    """Exports stream only when asked to; default Accept headers get pages."""
+    problems = []
+    for path in ('/posts', '/likes', '/follows'):
+        for accept in (None, '*/*', BROWSER_ACCEPT):
+            response = client.get(path, headers={'Accept': accept} if accept else {})
+            if not (response.is_json and 'items' in response.get_json()):
+                problems.append(f'GET {path} with Accept {accept!r} is not a paged JSON response')
+        for path_suffix, headers in (('?stream=1', {}), ('', {'Accept': 'application/x-ndjson'})):
+            response = client.get(path + path_suffix, headers=headers)
+            if response.mimetype != 'application/x-ndjson':
+                problems.append(f'GET {path}{path_suffix} {headers} did not stream NDJSON')
+            # Finish the stream here, so its request context isn't popped
+            # later from another request's.
+            response.get_data()
+            response.close()
+    return problems
+
+
+@response_check
+def streamed_exports_unbuffered(app, client):
+    """Exports go out as they are generated, with no Content-Length."""
+    problems = []
+    for path in ('/posts?stream=1', '/likes?stream=1', '/follows?stream=1'):
+        for encoding in (None, 'gzip'):
+            response = client.get(path, headers={'Accept-Encoding': encoding} if encoding else {})
+            if not response.is_streamed or 'Content-Length' in response.headers:
+                problems.append(f'GET {path} (Accept-Encoding {encoding!r}) was buffered before sending')
+            response.get_data()
+            response.close()
+    return problems
+
+
+@response_check
+def keyset_paging(app, client):
+    """Small pages visit every row exactly once, both for the generated rows
+    (whole-second timestamps) and for rows written in the same second by
+    the app's own defaults."""
+    from sqlalchemy import func, select
+    from extensions import db
+    from models import User, Post, Comment, Like, Follow
+    from tokens import issue_access_token
+
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {issue_access_token(1, 0)}'}
+    for n in range(3):
+        client.post('/posts', json={"title": f"Paging post {n}", "body": "Same second"}, headers=headers)
+
+    problems = []
+    for path, model in (('/posts', Post), ('/comments', Comment), ('/likes', Like),
+                        ('/follows', Follow), ('/users', User)):
+        ids, cursor = [], None
+        while True:
+            page = client.get(path, query_string={'limit': 3, **({'cursor': cursor} if cursor else {})})
+            body = page.get_json()
+            ids += [item['id'] for item in body['items']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        with app.app_context():
+            total = db.session.execute(select(func.count()).select_from(model)).scalar()
+        if len(ids) != len(set(ids)) or len(set(ids)) != total:
+            problems.append(f'paging {path} returned {len(ids)} ids, {len(set(ids))} distinct, '
+                            f'of {total} rows')
+    return problems
+
+
+@response_check
+def timeline_fanout(app, client):
+    """With TIMELINE_FANOUT turned on at runtime, a new post is pushed into
+    its author's followers' timelines."""
+    from sqlalchemy import select
+    from extensions import db
+    from models import Follow, TimelineEntry
+    from tokens import issue_access_token
+
+    with app.app_context():
+        follow = db.session.execute(select(Follow.follower_id, Follow.followed_id).limit(1)).one()
+        headers = {'Authorization': f'Bearer {issue_access_token(follow.followed_id, 0)}'}
+    app.config.update(TIMELINE_FANOUT=True, JOBS_EAGER=True)
+    try:
+        post = client.post('/posts', json={"title": "Fanned out post", "body": "Pushed on write"},
+                           headers=headers).get_json()
+        with app.app_context():
+            pushed = db.session.get(TimelineEntry, (follow.follower_id, post['id']))
+        timeline = client.get(f'/users/{follow.follower_id}/timeline').get_json()
+    finally:
+        app.config.update(TIMELINE_FANOUT=False, JOBS_EAGER=False)
+    problems = []
+    if pushed is None:
+        problems.append(f"post {post['id']} was not pushed to follower {follow.follower_id}")
+    if post['id'] not in [item['id'] for item in timeline['items']]:
+        problems.append(f"post {post['id']} is missing from follower {follow.follower_id}'s timeline")
+    return problems
+
+
+@response_check
+def deleted_users_hidden_from_search(app, client):
+    """An account marked deleted, awaiting its purge, isn't found by search."""
+    from datetime import datetime
+    from sqlalchemy import update
+    from extensions import db
+    from models import User
+
+    with app.app_context():
+        user = db.session.get(User, 1)
+        username = user.username
+        db.session.execute(update(User).where(User.id == 1).values(deleted_at=datetime(2026, 1, 1)))
+        db.session.commit()
+    found = client.get('/search', query_string={'q': username, 'type': 'users'}).get_json()
+    if 1 in [item['id'] for item in found['items']]:
+        return [f'search for {username!r} returned deleted user 1']
+    return []
+
+
+@response_check
+def cascade_invalidation(app, client):
+    """Deleting a post or user expires the cached pages of the rows the
+    database deletes with it (ON DELETE CASCADE)."""
+    from tokens import issue_access_token
+
+    def auth(user):
+        with app.app_context():
+            return {'Authorization': f'Bearer {issue_access_token(user, 0)}'}
+
+    problems = []
+    app.config['CACHE_ENABLED'] = True
+    try:
+        # Comment 1 is on post 1; user 2 has the first like and follow.
+        for delete_path, user, paths in (('/posts/1', 1, ('/comments', '/likes')),
+                                         ('/users/2', 2, ('/likes', '/follows', '/profiles'))):
+            etags = {path: client.get(path).headers.get('ETag') for path in paths}
+            response = client.delete(delete_path, headers=auth(user))
+            if response.status_code != 200:
+                problems.append(f'DELETE {delete_path} answered {response.status_code}')
+                continue
+            for path, etag in etags.items():
+                if client.get(path, headers={'If-None-Match': etag}).status_code == 304:
+                    problems.append(f'GET {path} still cached after DELETE {delete_path}')
+    finally:
+        app.config['CACHE_ENABLED'] = False
+    return problems
+
+
+@response_check
+def comment_count_after_thread_delete(app, client):
+    """Deleting a comment with replies takes the whole thread off the post's
+    comment_count, including the replies removed by the cascade."""
+    from extensions import db
+    from models import Comment, Post
+    from tokens import issue_access_token
+
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {issue_access_token(1, 0)}'}
+    thread = []
+    for body in ('root', 'reply', 'nested reply'):
+        response = client.post('/comments', headers=headers, json={
+            'body': body, 'post_id': 1, 'user_id': 1,
+            'parent_comment_id': thread[-1] if thread else None})
+        if response.status_code != 201:
+            return [f'POST /comments answered {response.status_code}']
+        thread.append(response.get_json()['id'])
+    root_id = thread[0]
+    response = client.delete(f'/comments/{root_id}', headers=headers)
+    if response.status_code != 200:
+        return [f'DELETE /comments/{root_id} answered {response.status_code}']
+    with app.app_context():
+        stored = db.session.get(Post, 1).comment_count
+        actual = Comment.query.filter_by(post_id=1).count()
+    if stored != actual:
+        return [f'post 1 comment_count is {stored}, but it has {actual} comments']
+    return []
+
+
+@response_check
+def reply_parent_on_same_post(app, client):
+    """A reply naming a parent comment from another post is rejected."""
+    from tokens import issue_access_token
+
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {issue_access_token(1, 0)}'}
+    response = client.post('/comments', headers=headers, json={
+        'body': 'Comment on post 2', 'post_id': 2, 'user_id': 1})
+    if response.status_code != 201:
+        return [f'POST /comments answered {response.status_code}']
+    parent_id = response.get_json()['id']
+    response = client.post('/comments', headers=headers, json={
+        'body': 'Misplaced reply', 'post_id': 1, 'user_id': 1, 'parent_comment_id': parent_id})
+    if response.status_code != 400:
+        return [f'reply to comment {parent_id} on post 1 answered {response.status_code}']
+    return []
+
+
+@response_check
+def forged_cursors_rejected(app, client):
+    """Cursors whose values don't match the sort key types answer 400."""
+    from pagination import encode_cursor
+
+    forged = [encode_cursor(*values) for values in (
+        ('2024-01-01', 1), (True, 1), ({'id': 1}, 1), ([1], 'x'), (None, None), (1.5, '1'),
+    )]
+    problems = []
+    for path in ('/feed', '/posts', '/comments', '/search?q=audit', '/search?q=audit&type=users',
+                 '/users/1/timeline', '/posts/1/comments', '/profiles'):
+        for cursor in forged:
+            separator = '&' if '?' in path else '?'
+            response = client.get(f'{path}{separator}cursor={cursor}')
+            if response.status_code != 400:
+                problems.append(f'GET {path} with a forged cursor answered {response.status_code}')
+                break
+    return problems
+
+
+@response_check
+def revocation_follows_commit(app, client):
+    """A session revoked in a transaction that rolls back stays valid; one
+    revoked by a committed logout is rejected at once."""
+    from extensions import db
+    from models import RefreshToken
+    from tokens import issue_access_token, revocations, revoke_sessions, start_session
+
+    problems = []
+    # Served from the in-process list rather than reloaded per request.
+    app.config['REVOCATION_CACHE_TTL'] = 3600
+    try:
+        with app.app_context():
+            start_session(1)
+            db.session.commit()
+            session_id = db.session.scalar(db.select(db.func.max(RefreshToken.id)))
+            headers = {'Authorization': f'Bearer {issue_access_token(1, session_id)}'}
+            revocations.reload()
+            revoke_sessions(RefreshToken.id == session_id)
+            db.session.rollback()
+        response = client.post('/logout', headers=headers)
+        if response.status_code != 200:
+            problems.append(f'logout after a rolled back revocation answered {response.status_code}')
+        response = client.post('/logout', headers=headers)
+        if response.status_code != 401:
+            problems.append(f'logout with a revoked session answered {response.status_code}')
+    finally:
+        app.config['REVOCATION_CACHE_TTL'] = -1
+    return problems
+
+
+@response_check
+def trending_epoch_rebased(app, client):
+    """A like long after the trending epoch, with no compaction scheduled,
+    rebases the scores instead of letting them overflow."""
+    import math
+    import time
+    from extensions import db
+    from models import Like, Post, PostScore, TrendingState
+    from tokens import issue_access_token
+
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {issue_access_token(3, 0)}'}
+        post_id = db.session.scalar(db.select(db.func.min(Post.id)).where(
+            Post.id.not_in(db.select(Like.post_id).where(Like.user_id == 3))))
+        # Two thousand half-lives ago: 2 ** 2000 is past the largest float.
+        stale = time.time() - 2000 * app.config.get('TRENDING_HALF_LIFE', 6 * 3600)
+        db.session.execute(db.update(TrendingState).values(epoch=stale))
+        db.session.commit()
+    app.config['JOBS_EAGER'] = True
+    try:
+        response = client.post('/likes', headers=headers, json={'user_id': 3, 'post_id': post_id})
+    finally:
+        app.config['JOBS_EAGER'] = False
+    if response.status_code != 201:
+        return [f'POST /likes answered {response.status_code}']
+    with app.app_context():
+        epoch = db.session.scalar(db.select(TrendingState.epoch))
+        score = db.session.scalar(db.select(PostScore.score).where(PostScore.post_id == post_id))
+    problems = []
+    if epoch <= stale:
+        problems.append('trending epoch was not moved up')
+    if score is None or not math.isfinite(score):
+        problems.append(f'post {post_id} has trending score {score}')
+    return problems
+
+
+@response_check
+def cache_versions_shared(app, client):
+    """A write committed by another process (its own cache backend, as the
+    job worker or another server worker has) expires this process's ETags."""
+    from cache import LRUCache, response_cache
+    from tokens import issue_access_token
+
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {issue_access_token(1, 0)}'}
+    app.config['CACHE_ENABLED'] = True
+    backend = response_cache.backend
+    try:
+        etag = client.get('/posts').headers.get('ETag')
+        response_cache.backend = LRUCache()
+        response = client.patch('/posts/1', headers=headers, json={'title': 'Edited elsewhere'})
+        response_cache.backend = backend
+        if response.status_code != 200:
+            return [f'PATCH /posts/1 answered {response.status_code}']
+        if client.get('/posts', headers={'If-None-Match': etag}).status_code == 304:
+            return ['GET /posts still cached after another process wrote to posts']
+    finally:
+        response_cache.backend = backend
+        app.config['CACHE_ENABLED'] = False
+    return []
+
+
+@response_check
+def constraint_errors_hide_sql(app, client):
+    """Duplicate or dangling rows answer 400 with a fixed message, not the
+    database error."""
+    from tokens import issue_access_token
+
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {issue_access_token(1, 0)}'}
+    problems = []
+    for path, body in (('/likes', {'user_id': 1, 'post_id': 10 ** 9}),
+                       ('/follows', {'follower_id': 1, 'followed_id': 10 ** 9}),
+                       ('/comments', {'user_id': 1, 'post_id': 10 ** 9, 'body': 'Dangling'}),
+                       ('/profiles', {'user_id': 1, 'location': 'Nairobi', 'profile_image': 'a.png',
+                                      'website': 'https://example.com',
+                                      'bio': 'A second profile for the same account.'})):
+        for _ in range(2):
+            response = client.post(path, headers=headers, json=body)
+        error = (response.get_json() or {}).get('error', '')
+        if response.status_code != 400 or 'SQL' in error or 'constraint' in error.lower():
+            problems.append(f'POST {path} answered {response.status_code}: {error[:80]}')
+    return problems
+
+
+def unaudited_routes(app):
+    """(method, rule) pairs registered on ``app`` with no audit request."""
+    audited = {(method, rule) for method, rule, _, _, _ in AUDITED_REQUESTS}
+    registered = {(method, rule.rule) for rule in app.url_map.iter_rules()
+                  if rule.endpoint != 'static'
+                  for method in rule.methods - IGNORED_METHODS}
+    return sorted(registered - audited)
+
+
+def generate_dataset(app, scale):
+    import datagen
+    import recommendations
+
+    with app.app_context():
+        datagen.clear()
+        datagen.generate(scale)
+        recommendations.build()
+
+
+def run_requests(app, db, scale):
+    """Regenerate the dataset at ``scale`` and run every audit request.
+
+    Returns one ``(status, statements)`` pair per entry in AUDITED_REQUESTS.
+    """
+    from sqlalchemy import event
+    from tokens import issue_access_token
+
+    generate_dataset(app, scale)
+    with app.app_context():
+        engine = db.engine
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(' '.join(statement.split()))
+
+    client = app.test_client()
+    state = {'new_user': scale + 1}
+    results = []
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for method, rule, path, body, user in AUDITED_REQUESTS:
+            if callable(body):
+                body = body(state)
+            if callable(user):
+                user = user(state)
+            headers = {}
+            if user is not None:
+                with app.app_context():
+                    headers['Authorization'] = f'Bearer {issue_access_token(user, 0)}'
+            if isinstance(body, bytes):
+                payload = {'data': {'file': (io.BytesIO(body), 'audit.png')}}
+            else:
+                payload = {'json': body}
+            statements.clear()
+            response = client.open(path, method=method, headers=headers, **payload)
+            if response.is_json and 'refresh_token' in (response.get_json() or {}):
+                state['refresh_token'] = response.get_json()['refresh_token']
+            response.get_data()
+            response.close()
+            results.append((response.status_code, list(statements)))
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return results
+
+
+def repeated_statements(small, large):
+    """Statements the large run issued more often than the small one."""
+    grown = Counter(large)
+    grown.subtract(Counter(small))
+    return [(statement, count) for statement, count in grown.most_common() if count > 0]
+
+
+@click.command()
+@click.option('--small', default=10, show_default=True, help='Rows per table in the small dataset.')
+@click.option('--large', default=10000, show_default=True, help='Rows per table in the large dataset.')
+@click.option('--verbose', '-v', is_flag=True, help='Print every request, not just failures.')
+def main(small, large, verbose):
+    """Fail if any route's statement count depends on the number of rows."""
+    with tempfile.TemporaryDirectory() as directory:
+        # The app reads its database settings on import.
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'audit.db')}"
+        os.environ.pop('DATABASE_READ_URL', None)
+        from flask_migrate import upgrade
+        from app import app
+        from extensions import db
+
+        app.config.update(CACHE_ENABLED=False, JOBS_EAGER=False, SLOW_REQUEST_MS=float('inf'),
+                          MEDIA_ROOT=os.path.join(directory, 'media'),
+                          # Keep account deletion on the inline path at both sizes.
+                          USER_PURGE_INLINE_MAX=large * 100,
+                          # Reload the in-process revocation list and trending
+                          # posts on every request, so their queries show up
+                          # in every count.
+                          REVOCATION_CACHE_TTL=-1, TRENDING_CACHE_TTL=-1)
+        with app.app_context():
+            upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+
+        unaudited = unaudited_routes(app)
+        for method, rule in unaudited:
+            click.echo(f'FAIL {method} {rule}: no entry in AUDITED_REQUESTS')
+
+        failures = 0
+        small_results = run_requests(app, db, small)
+        large_results = run_requests(app, db, large)
+        for (method, _, path, _, _), (small_status, small_sql), (large_status, large_sql) in zip(
+                AUDITED_REQUESTS, small_results, large_results):
+            problems = []
+            if len(large_sql) > len(small_sql):
+                problems.append(f'{len(small_sql)} statements at {small} rows, '
+                                f'{len(large_sql)} at {large}')
+            # A rejected request doesn't exercise the route it's meant to audit.
+            if not (200 <= small_status < 300 and 200 <= large_status < 300):
+                problems.append(f'status {small_status} at {small} rows, {large_status} at {large}')
+            if problems:
+                failures += 1
+                click.echo(f'FAIL {method} {path}: {"; ".join(problems)}')
+                for statement, count in repeated_statements(small_sql, large_sql):
+                    click.echo(f'       +{count} x {statement}')
+            elif verbose:
+                click.echo(f'ok   {method} {path}: {len(large_sql)} statements, status {large_status}')
+
+        total = len(AUDITED_REQUESTS)
+        click.echo(f'{total - failures}/{total} requests run a constant number of statements.')
+
+        failed_checks = 0
+        for check in RESPONSE_CHECKS:
+            generate_dataset(app, small)
+            problems = check(app, app.test_client())
+            if problems:
+                failed_checks += 1
+            for problem in problems:
+                click.echo(f'FAIL {check.__name__}: {problem}')
+            if not problems and verbose:
+                click.echo(f'ok   {check.__name__}')
+        click.echo(f'{len(RESPONSE_CHECKS) - failed_checks}/{len(RESPONSE_CHECKS)} response checks pass.')
+        if failures or unaudited or failed_checks:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,52 +1,72 @@
 from flask import request
 from flask_restful import Resource
-from extensions import bcrypt
-from models import db, User
+from sqlalchemy import select
+from asyncdb import using_session
+from extensions import password_hasher
+from hashing import HashingBusy
+from models import db, User, RefreshToken
+from tokens import InvalidToken, refresh_session, require_auth, revoke_sessions, start_session
+
+
+def busy_response(error):
+    return ({"message": "Server is busy, please retry shortly"}, 503,
+            {"Retry-After": str(error.retry_after)})
+
+
+def user_summary(user):
+    # id + safe user fields
+    return {
+        "id":         user.id,
+        "username":   user.username,
+        "email":      user.email,
+        "first_name": user.first_name,
+        "last_name":  user.last_name
+    }
+
+
+def sign_up_error(data):
+    """The error response for a sign-up missing a field, or ``None``."""
+    if not data.get('username') or not data.get('password'):
+        return {"message": "Username and password are required"}, 400
+
+    if not data.get('email') or not data.get('first_name') or not data.get('last_name'):
+        return {"message": "Email, first name, and last name are required"}, 400
+    return None
+
+
+def new_user(data, password_hash):
+    return User(
+        username=data.get('username'),
+        email=data.get('email'),
+        first_name=data.get('first_name'),
+        last_name=data.get('last_name'),
+        password_hash=password_hash
+    )
 
 
 class SignUp(Resource):
     def post(self):
         data = request.get_json()
-        username   = data.get('username')
-        email      = data.get('email')
-        first_name = data.get('first_name')
-        last_name  = data.get('last_name')
-        password   = data.get('password')
 
         # required‐field checks
-        if not username or not password:
-            return {"message": "Username and password are required"}, 400
-
-        if not email or not first_name or not last_name:
-            return {"message": "Email, first name, and last name are required"}, 400
+        error = sign_up_error(data)
+        if error:
+            return error
 
         # ensure unique email
-        if User.query.filter_by(email=email).first():
+        if User.query.filter_by(email=data.get('email')).first():
             return {"message": "Email already exists"}, 409
 
-        # create user
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
-        new_user = User(
-            username=username,
-            email=email,
-            first_name=first_name,
-            last_name=last_name,
-            password_hash=hashed_password
-        )
-        db.session.add(new_user)
+        # create user; hashing runs on the password pool, not this thread
+        try:
+            hashed_password = password_hasher.hash(data.get('password'))
+        except HashingBusy as e:
+            return busy_response(e)
+        user = new_user(data, hashed_password)
+        db.session.add(user)
         db.session.commit()
 
-        # return id + safe user fields
-        return {
-            "message": "User created successfully",
-            "user": {
-                "id":         new_user.id,
-                "username":   new_user.username,
-                "email":      new_user.email,
-                "first_name": new_user.first_name,
-                "last_name":  new_user.last_name
-            }
-        }, 201
+        return {"message": "User created successfully", "user": user_summary(user)}, 201
 
 
 class Login(Resource):
@@ -58,18 +78,93 @@ class Login(Resource):
         if not email or not password:
             return {"message": "Email and password are required"}, 400
 
-        user = User.query.filter_by(email=email).first()
-        if not user or not bcrypt.check_password_hash(user.password_hash, password):
+        user = User.query.filter_by(email=email, deleted_at=None).first()
+        try:
+            if not user or not password_hasher.verify(password, user.password_hash):
+                return {"message": "Invalid credentials"}, 401
+
+            # Upgrade hashes made with an outdated cost while we still have
+            # the plaintext password.
+            if password_hasher.needs_rehash(user.password_hash):
+                user.password_hash = password_hasher.hash(password)
+                db.session.commit()
+        except HashingBusy as e:
+            return busy_response(e)
+
+        tokens = start_session(user.id)
+        db.session.commit()
+        return {"message": "Login successful", "user": user_summary(user), **tokens}, 200
+
+
+# Coroutine versions of SignUp.post and Login.post for the ASGI server
+# (asgi.py), on an AsyncSession: the event loop serves other requests while
+# they wait on bcrypt or the database. Same responses as the resources.
+
+async def sign_up_async(session):
+    data = request.get_json()
+    error = sign_up_error(data)
+    if error:
+        return error
+
+    if await session.scalar(select(User.id).filter_by(email=data.get('email')).limit(1)) is not None:
+        return {"message": "Email already exists"}, 409
+
+    try:
+        hashed_password = await password_hasher.hash_async(data.get('password'))
+    except HashingBusy as e:
+        return busy_response(e)
+    user = new_user(data, hashed_password)
+    session.add(user)
+    await session.flush()
+    summary = user_summary(user)
+    await session.commit()
+
+    return {"message": "User created successfully", "user": summary}, 201
+
+
+async def log_in_async(session):
+    data = request.get_json()
+    email    = data.get('email')
+    password = data.get('password')
+
+    if not email or not password:
+        return {"message": "Email and password are required"}, 400
+
+    user = await session.scalar(select(User).filter_by(email=email, deleted_at=None).limit(1))
+    try:
+        if not user or not await password_hasher.verify_async(password, user.password_hash):
             return {"message": "Invalid credentials"}, 401
 
-        # at this point you might also issue a JWT or session token
-        return {
-            "message": "Login successful",
-            "user": {
-                "id":         user.id,
-                "username":   user.username,
-                "email":      user.email,
-                "first_name": user.first_name,
-                "last_name":  user.last_name
-            }
-        }, 200
\ No newline at end of file
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password_hash = await password_hasher.hash_async(password)
+            await session.flush()
+    except HashingBusy as e:
+        return busy_response(e)
+
+    summary = user_summary(user)
+    tokens = await session.run_sync(using_session(start_session), user.id)
+    await session.commit()
+    return {"message": "Login successful", "user": summary, **tokens}, 200
+
+
+class TokenRefresh(Resource):
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        refresh_token = data.get('refresh_token')
+        if not refresh_token:
+            return {"message": "refresh_token is required"}, 400
+        try:
+            tokens = refresh_session(refresh_token)
+        except InvalidToken as e:
+            return {"message": str(e)}, 401
+        db.session.commit()
+        return tokens, 200
+
+
+class Logout(Resource):
+    method_decorators = [require_auth]
+
+    def post(self, current_user):
+        revoke_sessions(RefreshToken.id == current_user.session_id)
+        db.session.commit()
+        return {"message": "Logged out"}, 200
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""Batch creation of likes, follows and comments.
+
+Each batch is validated in one pass (one query per referenced table), written
+with a single multi-row INSERT and committed once. Likes and follows use
+``INSERT ... ON CONFLICT DO NOTHING`` on their unique constraints, so
+duplicates are reported per item instead of failing the whole batch.
+"""
+import time
+from collections import Counter
+
+from sqlalchemy import bindparam, insert, select
+
+from extensions import db
+from database import insert_ignoring_conflicts
+from models import User, Post, Comment, Like, Follow
+from counters import adjust_many
+import timeline
+import trending
+
+MAX_BATCH_SIZE = 500
+
+
+class BatchError(ValueError):
+    pass
+
+
+def _items(payload):
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError("A non-empty 'items' list is required.")
+    if len(items) > MAX_BATCH_SIZE:
+        raise BatchError(f"At most {MAX_BATCH_SIZE} items per batch.")
+    return items
+
+
+def _int_fields(item, *names):
+    if not isinstance(item, dict):
+        raise ValueError("Each item must be an object.")
+    values = []
+    for name in names:
+        value = item.get(name)
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"{name} is required and must be an integer.")
+        values.append(value)
+    return values
+
+
+def _acting_as(item, field, user_id):
+    """Fill ``item[field]`` with the caller's id; any other user is an error."""
+    if isinstance(item, dict) and item.setdefault(field, user_id) != user_id:
+        raise ValueError(f"{field} must be your own user id.")
+    return item
+
+
+def _existing_ids(model, ids):
+    if not ids:
+        return set()
+    return set(db.session.execute(select(model.id).where(model.id.in_(ids))).scalars())
+
+
+def _results(keys, created, errors, serialize):
+    """Per-item results in request order; later duplicates report ``exists``."""
+    results = []
+    for index, key in enumerate(keys):
+        if index in errors:
+            results.append({"index": index, "status": "error", "error": errors[index]})
+        elif key in created:
+            results.append({"index": index, "status": "created", "item": serialize(created.pop(key))})
+        else:
+            results.append({"index": index, "status": "exists"})
+    return results
+
+
+def create_likes(payload, user_id):
+    items = _items(payload)
+    keys, errors = [], {}
+    for index, item in enumerate(items):
+        try:
+            keys.append(tuple(_int_fields(_acting_as(item, 'user_id', user_id), 'user_id', 'post_id')))
+        except ValueError as e:
+            keys.append(None)
+            errors[index] = str(e)
+
+    users = _existing_ids(User, {key[0] for key in keys if key})
+    posts = _existing_ids(Post, {key[1] for key in keys if key})
+    for index, key in enumerate(keys):
+        if key and index not in errors:
+            if key[0] not in users:
+                errors[index] = "User not found."
+            elif key[1] not in posts:
+                errors[index] = "Post not found."
+
+    rows = [{"user_id": key[0], "post_id": key[1]}
+            for index, key in enumerate(keys) if index not in errors]
+    created = {}
+    if rows:
+        inserted = insert_ignoring_conflicts(Like, rows, ['user_id', 'post_id'])
+        created = {(row['user_id'], row['post_id']): row for row in inserted}
+        liked = Counter(post_id for _, post_id in created)
+        adjust_many(Post, 'like_count', liked)
+        now = time.time()
+        trending.record([(post_id, count * trending.like_weight(), now) for post_id, count in liked.items()])
+    db.session.commit()
+
+    return _results(keys, created, errors, lambda row: {
+        "id": row['id'], "created_at": row['created_at'],
+        "user_id": row['user_id'], "post_id": row['post_id'],
+    })
+
+
+def create_follows(payload, user_id):
+    items = _items(payload)
+    keys, errors = [], {}
+    for index, item in enumerate(items):
+        try:
+            follower_id, followed_id = _int_fields(_acting_as(item, 'follower_id', user_id),
+                                                   'follower_id', 'followed_id')
+            if follower_id == followed_id:
+                raise ValueError("User cannot follow themselves.")
+            keys.append((follower_id, followed_id))
+        except ValueError as e:
+            keys.append(None)
+            errors[index] = str(e)
+
+    users = _existing_ids(User, {user_id for key in keys if key for user_id in key})
+    for index, key in enumerate(keys):
+        if key and index not in errors and not set(key) <= users:
+            errors[index] = "User not found."
+
+    rows = [{"follower_id": key[0], "followed_id": key[1]}
+            for index, key in enumerate(keys) if index not in errors]
+    created = {}
+    if rows:
+        inserted = insert_ignoring_conflicts(Follow, rows, ['follower_id', 'followed_id'])
+        created = {(row['follower_id'], row['followed_id']): row for row in inserted}
+        adjust_many(User, 'follower_count', Counter(followed for _, followed in created))
+        adjust_many(User, 'following_count', Counter(follower for follower, _ in created))
+        for follower_id, followed_id in created:
+            timeline.schedule_backfill(follower_id, followed_id)
+    db.session.commit()
+
+    return _results(keys, created, errors, lambda row: {
+        "id": row['id'], "follower_id": row['follower_id'],
+        "followed_id": row['followed_id'], "created_at": row['created_at'],
+    })
+
+
+def create_comments(payload, user_id):
+    items = _items(payload)
+    rows, errors = {}, {}
+    for index, item in enumerate(items):
+        try:
+            post_id, _ = _int_fields(_acting_as(item, 'user_id', user_id), 'post_id', 'user_id')
+            parent_id = item.get('parent_comment_id')
+            if parent_id is not None and (not isinstance(parent_id, int) or isinstance(parent_id, bool)):
+                raise ValueError("parent_comment_id must be an integer.")
+            # Run the model's own body validation without touching the session.
+            Comment(body=item.get('body'))
+            rows[index] = {"body": item['body'], "post_id": post_id, "user_id": user_id,
+                           "parent_comment_id": parent_id}
+        except ValueError as e:
+            errors[index] = str(e)
+
+    users = _existing_ids(User, {row['user_id'] for row in rows.values()})
+    posts = _existing_ids(Post, {row['post_id'] for row in rows.values()})
+    parent_ids = {row['parent_comment_id'] for row in rows.values() if row['parent_comment_id']}
+    parents = {}
+    if parent_ids:
+        parents = {parent.id: parent for parent in db.session.execute(
+            select(Comment.id, Comment.post_id, Comment.path, Comment.depth)
+            .where(Comment.id.in_(parent_ids))
+        )}
+    for index, row in list(rows.items()):
+        parent = parents.get(row['parent_comment_id'])
+        if row['user_id'] not in users:
+            errors[index] = "User not found."
+        elif row['post_id'] not in posts:
+            errors[index] = "Post not found."
+        elif row['parent_comment_id'] and (parent is None or parent.post_id != row['post_id']):
+            errors[index] = "Parent comment not found on this post."
+        else:
+            continue
+        del rows[index]
+
+    created = {}
+    if rows:
+        indexes = list(rows)
+        comments = Comment.__table__
+        inserted = db.session.execute(
+            insert(comments).returning(*comments.c, sort_by_parameter_order=True),
+            [rows[index] for index in indexes]
+        ).mappings().all()
+        created = {index: dict(row) for index, row in zip(indexes, inserted)}
+
+        # The materialized path needs the new ids, so it is written in a
+        # second, executemany UPDATE (the ORM after_insert hook doesn't run
+        # for Core inserts).
+        for row in created.values():
+            parent = parents.get(row['parent_comment_id'])
+            row['path'] = (parent.path if parent else '') + Comment.path_segment(row['id'])
+            row['depth'] = parent.depth + 1 if parent else 0
+        db.session.execute(
+            comments.update()
+            .where(comments.c.id == bindparam('comment_id'))
+            .values(path=bindparam('new_path'), depth=bindparam('new_depth')),
+            [{"comment_id": row['id'], "new_path": row['path'], "new_depth": row['depth']}
+             for row in created.values()]
+        )
+        commented = Counter(row['post_id'] for row in created.values())
+        adjust_many(Post, 'comment_count', commented)
+        now = time.time()
+        trending.record([(post_id, count * trending.comment_weight(), now)
+                         for post_id, count in commented.items()])
+    db.session.commit()
+
+    return _results(range(len(items)), created, errors, lambda row: {
+        "id": row['id'], "body": row['body'], "created_at": row['created_at'],
+        "post_id": row['post_id'], "user_id": row['user_id'],
+        "parent_comment_id": row['parent_comment_id'], "depth": row['depth'],
+    })
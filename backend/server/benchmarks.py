@@ -0,0 +1,171 @@
+"""Benchmarks, run with ``flask bench <name>``.
+
+The microbenchmarks work on a throwaway in-memory SQLite database, never the
+app's own. ``flask bench load`` and ``flask bench concurrency`` are the
+exceptions: they send requests to the app on the configured database (see
+``loadtest.py`` and ``serverload.py``).
+"""
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import User, Post, Comment
+from serializers import dumps, serializer_for
+from fieldsets import Projection
+import compression
+import loadtest
+import serverload
+
+bench_cli = AppGroup('bench', help='Run microbenchmarks against a scratch database.')
+
+
+def _best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def _scratch_posts(rows):
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    session = Session(engine)
+    session.execute(insert(User), [{"username": "bench", "email": "bench@example.com",
+                                    "password_hash": "x"}])
+    start = datetime(2024, 1, 1)
+    session.execute(insert(Post), [
+        {"title": f"Post {i}", "body": "lorem ipsum " * 20, "author_id": 1,
+         "image_url": f"https://example.com/{i}.jpg",
+         "created_at": start + timedelta(seconds=i), "updated_at": start + timedelta(seconds=i),
+         "like_count": i % 50, "comment_count": i % 7}
+        for i in range(rows)
+    ])
+    session.commit()
+    return session
+
+
+@bench_cli.command('serializers')
+@click.option('--rows', default=10000, show_default=True)
+@click.option('--repeat', default=5, show_default=True)
+def serializers_command(rows, repeat):
+    """Compare ORM + per-attribute dicts + Flask's encoder with the
+    precompiled, column-projected serializer."""
+    session = _scratch_posts(rows)
+    serializer = serializer_for(Post)
+    fields = serializer.fields
+    flask_dumps = current_app.json.dumps
+
+    def orm_path():
+        session.expunge_all()
+        posts = session.query(Post).order_by(Post.created_at, Post.id).all()
+        items = [{field: getattr(post, field) for field in fields} for post in posts]
+        return flask_dumps({"items": items}).encode('utf-8')
+
+    def compiled_path():
+        rows_ = session.query(*serializer.columns).order_by(Post.created_at, Post.id).all()
+        row = serializer.row
+        return dumps({"items": [row(r) for r in rows_]})
+
+    orm_time, orm_body = _best_of(repeat, orm_path)
+    compiled_time, compiled_body = _best_of(repeat, compiled_path)
+    # The compiled side also adds derived keys (image variants); compare the fields.
+    compiled_items = [{field: item[field] for field in fields} for item in json.loads(compiled_body)["items"]]
+    if json.loads(orm_body)["items"] != compiled_items:
+        raise click.ClickException("Serializers disagree on the output.")
+
+    click.echo(f"{rows} posts, best of {repeat}:")
+    click.echo(f"  ORM + to_dict + Flask JSON  {orm_time * 1000:8.1f} ms")
+    click.echo(f"  compiled serializer         {compiled_time * 1000:8.1f} ms"
+               f"  ({orm_time / compiled_time:.1f}x)")
+
+
+@bench_cli.command('load')
+@click.option('--requests', default=2000, show_default=True)
+@click.option('--threads', default=1, show_default=True)
+@click.option('--warmup', default=50, show_default=True, help='Untimed requests sent first.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--no-cache', is_flag=True, help='Turn the response cache off for the run.')
+@click.option('--output', '-o', type=click.File('w'), default='-', show_default=True,
+              help='Where to write the JSON report.')
+def load_command(requests, threads, warmup, seed, no_cache, output):
+    """Replay a realistic read/write mix and report latency per endpoint."""
+    app = current_app._get_current_object()
+    if no_cache:
+        app.config['CACHE_ENABLED'] = False
+    report = loadtest.run(app, requests=requests, threads=threads, warmup=warmup, seed=seed)
+    json.dump(report, output, indent=2)
+    output.write('\n')
+    if output.name != '<stdout>':
+        click.echo(f"{report['throughput_rps']} requests/s over {report['duration_s']}s")
+        for endpoint, stats in report['endpoints'].items():
+            click.echo(f"  {endpoint:28} n={stats['requests']:<6} p50={stats['p50_ms']:8.2f} ms"
+                       f"  p95={stats['p95_ms']:8.2f} ms  p99={stats['p99_ms']:8.2f} ms")
+
+
+@bench_cli.command('concurrency')
+@click.option('--levels', default='1,16,64,256', show_default=True,
+              help='Comma-separated numbers of concurrent connections.')
+@click.option('--requests', default=2000, show_default=True, help='Requests per level.')
+@click.option('--warmup', default=100, show_default=True, help='Untimed requests sent first.')
+@click.option('--server', 'servers', type=click.Choice(list(serverload.SERVERS)), multiple=True,
+              help='Server to run (repeatable); both by default.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--output', '-o', type=click.File('w'), default=None,
+              help='Also write the JSON report here.')
+def concurrency_command(levels, requests, warmup, servers, seed, output):
+    """Throughput and latency of the WSGI and ASGI servers as concurrent
+    connections grow."""
+    maxima = [db.session.execute(select(func.max(model.id))).scalar() or 1
+              for model in (User, Post, Comment)]
+    levels = [int(level) for level in levels.split(',') if level.strip()]
+    click.echo(f"{requests} requests per level, {maxima[0]} users, {maxima[1]} posts:")
+    report = serverload.run(maxima, servers=servers or tuple(serverload.SERVERS), levels=levels,
+                            requests=requests, warmup=warmup, seed=seed, echo=click.echo)
+    if output is not None:
+        json.dump(report, output, indent=2)
+        output.write('\n')
+
+
+@bench_cli.command('payloads')
+@click.option('--rows', default=100, show_default=True, help='Posts per page.')
+@click.option('--repeat', default=200, show_default=True)
+def payloads_command(rows, repeat):
+    """Response size and build time of a page of posts, with and without
+    ?fields= / ?include= and compression."""
+    session = _scratch_posts(rows)
+    config = current_app.config
+    encoders = [('identity', lambda body: body),
+                ('gzip', lambda body: gzip.compress(body, config.get('COMPRESS_GZIP_LEVEL',
+                                                                     compression.DEFAULT_GZIP_LEVEL)))]
+    if compression.brotli is not None:
+        encoders.append(('br', lambda body: compression.brotli.compress(
+            body, quality=config.get('COMPRESS_BROTLI_QUALITY', compression.DEFAULT_BROTLI_QUALITY))))
+    shapes = [
+        ('all fields', Projection(Post, Post.serialize_fields, frozenset())),
+        ('fields=id,title', Projection(Post, ('id', 'title'), frozenset())),
+        ('fields=id,title&include=author', Projection(Post, ('id', 'title'), frozenset({'author'}),
+                                                      user_fields=('id', 'username'))),
+    ]
+
+    click.echo(f"{rows} posts per page, best of {repeat}:")
+    for label, projection in shapes:
+        def page():
+            query = session.query(*projection.columns)
+            for model, onclause in projection.joins:
+                query = query.outerjoin(model, onclause)
+            row = projection.row
+            return dumps({"items": [row(r) for r in query.order_by(Post.created_at, Post.id).all()]})
+
+        for encoding, encode in encoders:
+            elapsed, body = _best_of(repeat, lambda: encode(page()))
+            click.echo(f"  {label:32} {encoding:9} {len(body):9} bytes  {elapsed * 1000:7.2f} ms")
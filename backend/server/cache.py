@@ -0,0 +1,350 @@
+"""Response cache for the read endpoints.
+
+Cached responses are keyed on the request path plus a version number for
+every table the endpoint reads. Writes never delete entries; the ORM hooks
+below bump the versions of the tables a committed transaction touched, so
+old keys simply stop being asked for and age out. A delete also touches the
+tables whose foreign keys cascade from the deleted rows' table (``ON DELETE
+CASCADE`` or ``SET NULL``), since the database changes those rows without the
+ORM seeing them. The same key doubles as
+the ETag, which lets a matching ``If-None-Match`` be answered with a 304
+before the view runs.
+
+Versions are shared by every process, the job worker included: the default
+backend keeps them in the ``cache_versions`` table, ``ExternalCache`` in its
+store.
+"""
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache, wraps
+
+from flask import Response, current_app, make_response, request
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from extensions import db
+from models import CacheVersion
+from streaming import wants_stream
+
+DEFAULT_TTL = 30
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class CacheBackend(ABC):
+    """Storage interface used by :class:`ResponseCache`.
+
+    ``get``/``set``/``delete`` hold response entries (JSON-compatible dicts)
+    and may evict at will. ``incr``/``get_counter`` hold table versions and
+    must never evict them, or stale entries would become reachable again.
+    They must also be shared by every process that writes to the database,
+    or a write made elsewhere would never invalidate this process's entries.
+    """
+    # Mixed into every key; backends whose counters don't survive a restart
+    # must make it unique per process so old ETags never match new data.
+    namespace = ''
+
+    @abstractmethod
+    def get(self, key):
+        """The entry stored under ``key``, or ``None``."""
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Store an entry for ``ttl`` seconds."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Drop an entry, if present."""
+
+    @abstractmethod
+    def get_counter(self, key):
+        """A counter's value; 0 if it was never incremented."""
+
+    @abstractmethod
+    def incr(self, key):
+        """Add one to a counter; returns the new value."""
+
+    def get_counters(self, keys):
+        return [self.get_counter(key) for key in keys]
+
+    def incr_counters(self, keys):
+        for key in keys:
+            self.incr(key)
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU cache with a per-entry TTL.
+
+    Each worker process keeps its own entries, but the versions live in the
+    ``cache_versions`` table: a write committed by any process, the job
+    worker included, invalidates every process's entries and ETags at once.
+    Reading them costs one query per cached request. Use
+    :class:`ExternalCache` to share the entries as well.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_counter(self, key):
+        return self.get_counters([key])[0]
+
+    def incr(self, key):
+        self.incr_counters([key])
+        return self.get_counter(key)
+
+    def get_counters(self, keys):
+        stored = dict(db.session.execute(
+            select(CacheVersion.key, CacheVersion.version).where(CacheVersion.key.in_(keys))
+        ).all())
+        return [stored.get(key, 0) for key in keys]
+
+    def incr_counters(self, keys):
+        # Called once the writing transaction has committed, so the bump
+        # gets its own short transaction on the primary.
+        engine = db.session.get_bind()
+        if engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(CacheVersion.__table__).values([{"key": key, "version": 1}
+                                                                   for key in sorted(keys)])
+        statement = statement.on_conflict_do_update(
+            index_elements=['key'], set_={'version': CacheVersion.__table__.c.version + 1})
+        with engine.begin() as connection:
+            connection.execute(statement)
+
+
+class ExternalCache(CacheBackend):
+    """Adapter for a shared key-value store with a Redis-style client.
+
+    ``client`` needs ``get(key)``, ``set(key, value, ex=seconds)``,
+    ``delete(key)`` and ``incr(key)``; a ``redis.Redis`` instance works as is.
+    Versions live in the store, so every worker sees every invalidation.
+    """
+
+    def __init__(self, client, prefix='pixify:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def get_counter(self, key):
+        raw = self.client.get(self.prefix + key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+
+class FakeExternalClient:
+    """Dict-backed stand-in for a Redis client, for local runs and tests."""
+
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self.data.get(key, (None, None))
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self.data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def delete(self, key):
+        with self._lock:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self.data.get(key, (0, None))
+            self.data[key] = (int(value) + 1, expires_at)
+            return int(value) + 1
+
+
+class ResponseCache:
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_ENABLED', True)
+        app.config.setdefault('CACHE_TTL', DEFAULT_TTL)
+        app.config.setdefault('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        app.config.setdefault('CACHE_BACKEND', None)
+        self.backend = app.config['CACHE_BACKEND'] or LRUCache(app.config['CACHE_MAX_ENTRIES'])
+        app.extensions['response_cache'] = self
+
+    def versions(self, tables):
+        return self.backend.get_counters([f'version:{table}' for table in tables])
+
+    def invalidate(self, tables):
+        self.backend.incr_counters([f'version:{table}' for table in tables])
+
+    def cached(self, *tables, related=None):
+        """Cache a GET view's 200 responses until one of ``tables`` changes.
+
+        ``related``, if given, returns more tables the current request reads
+        (e.g. for ``?include=``).
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Streamed exports are never buffered into the cache.
+                if not current_app.config['CACHE_ENABLED'] or wants_stream():
+                    return view(*args, **kwargs)
+
+                read = tables + tuple(table for table in related() if table not in tables) if related else tables
+                # Versions are read before the view queries the database, so a
+                # stored body is never older than the versions in its key.
+                versions = ','.join(f'{table}={version}' for table, version
+                                    in zip(read, self.versions(read)))
+                key = f'{self.backend.namespace}:{request.full_path}:{versions}'
+                etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+                # Weak comparison: compression (compression.py) marks the
+                # ETag of an encoded body weak.
+                if request.if_none_match.contains_weak(etag):
+                    return self._not_modified(etag)
+
+                entry = self.backend.get(key)
+                if entry is not None:
+                    response = Response(entry['body'], status=entry['status'],
+                                        mimetype=entry['mimetype'])
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    self.backend.set(key, {
+                        'body': response.get_data(as_text=True),
+                        'status': response.status_code,
+                        'mimetype': response.mimetype,
+                    }, current_app.config['CACHE_TTL'])
+
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            return wrapper
+        return decorator
+
+    def _not_modified(self, etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+response_cache = ResponseCache()
+
+
+def _mark_dirty(session, *tables):
+    if session is not None:
+        session.info.setdefault('cache_dirty_tables', set()).update(tables)
+
+
+@lru_cache(maxsize=None)
+def cascaded_tables(table_name):
+    """Tables the database changes when rows of ``table_name`` are deleted,
+    following ``ON DELETE CASCADE``/``SET NULL`` foreign keys transitively."""
+    found, pending = set(), [table_name]
+    while pending:
+        parent = pending.pop()
+        for table in db.metadata.tables.values():
+            if table.name in found:
+                continue
+            actions = {(fk.ondelete or '').upper() for fk in table.foreign_keys
+                       if fk.column.table.name == parent}
+            if actions & {'CASCADE', 'SET NULL'}:
+                found.add(table.name)
+            # Rows that are only updated don't delete anything further.
+            if 'CASCADE' in actions:
+                pending.append(table.name)
+    found.discard(table_name)
+    return frozenset(found)
+
+
+def _mark_deleted(session, *tables):
+    _mark_dirty(session, *tables)
+    for table in tables:
+        _mark_dirty(session, *cascaded_tables(table))
+
+
+def _on_flush_change(mapper, connection, target):
+    _mark_dirty(object_session(target), *(table.name for table in mapper.tables))
+
+
+def _on_flush_delete(mapper, connection, target):
+    _mark_deleted(object_session(target), *(table.name for table in mapper.tables))
+
+
+for _event_name in ('after_insert', 'after_update'):
+    event.listen(db.Model, _event_name, _on_flush_change, propagate=True)
+event.listen(db.Model, 'after_delete', _on_flush_delete, propagate=True)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _on_bulk_statement(orm_execute_state):
+    # Bulk UPDATE/DELETE/INSERT statements (counter increments, subtree
+    # deletes, timeline fan-out) bypass the per-object mapper hooks.
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is None:
+            return
+        if orm_execute_state.is_delete:
+            _mark_deleted(orm_execute_state.session, table.name)
+        else:
+            _mark_dirty(orm_execute_state.session, table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    tables = session.info.pop('cache_dirty_tables', None)
+    if tables and response_cache.backend is not None:
+        response_cache.invalidate(tables)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _on_rollback(session, previous_transaction):
+    session.info.pop('cache_dirty_tables', None)
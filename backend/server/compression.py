@@ -0,0 +1,118 @@
+"""Response compression negotiated from ``Accept-Encoding``.
+
+JSON, NDJSON and text responses of at least ``COMPRESS_MIN_SIZE`` bytes are
+sent brotli-encoded when the client accepts ``br`` and the ``brotli`` package
+is installed, otherwise gzip-encoded when it accepts ``gzip``. Smaller bodies
+gain little and are sent as they are. Streamed exports are compressed chunk
+by chunk, each chunk flushed so rows still reach the client as they are
+read.
+
+An encoded body is a different representation, so its ETag is made weak;
+``If-None-Match`` still matches it (see cache.py).
+"""
+import gzip
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_GZIP_LEVEL = 6
+# Brotli's top qualities are far too slow for per-request compression.
+DEFAULT_BROTLI_QUALITY = 4
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/plain', 'text/html'}
+
+
+class _Gzip:
+    def __init__(self, level):
+        # wbits=31: gzip header and trailer around the deflate stream.
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def _compressed_stream(chunks, compressor):
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield compressor.chunk(chunk)
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class Compression:
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', DEFAULT_GZIP_LEVEL)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY)
+        app.extensions['compression'] = self
+        app.after_request(self._compress)
+
+    def encodings(self):
+        return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    def _compressor(self, encoding):
+        if encoding == 'br':
+            return _Brotli(current_app.config['COMPRESS_BROTLI_QUALITY'])
+        return _Gzip(current_app.config['COMPRESS_GZIP_LEVEL'])
+
+    def _compress(self, response):
+        config = current_app.config
+        if (not config['COMPRESS_ENABLED'] or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.status_code < 200 or response.status_code in (204, 206, 304)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings())
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compressed_stream(response.response, self._compressor(encoding))
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < config['COMPRESS_MIN_SIZE']:
+                return response
+            if encoding == 'br':
+                body = brotli.compress(body, quality=config['COMPRESS_BROTLI_QUALITY'])
+            else:
+                body = gzip.compress(body, config['COMPRESS_GZIP_LEVEL'], mtime=0)
+            response.set_data(body)
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
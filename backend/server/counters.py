@@ -0,0 +1,72 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, func, select, update
+
+from extensions import db
+from models import User, Post, Comment, Like, Follow
+
+
+def adjust(model, row_id, **deltas):
+    """Add ``deltas`` to counter columns of one row in the current transaction.
+
+    The increment happens in SQL (``SET n = n + 1``), so concurrent writers
+    never lose updates.
+    """
+    values = {name: getattr(model, name) + delta for name, delta in deltas.items()}
+    db.session.execute(update(model).where(model.id == row_id).values(values))
+
+
+def adjust_many(model, column, deltas):
+    """Apply per-row ``{row_id: delta}`` increments to one counter column.
+
+    Sent as a single executemany UPDATE, for batch writes.
+    """
+    if not deltas:
+        return
+    table = model.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == bindparam('row_id'))
+        .values({column: table.c[column] + bindparam('delta')}),
+        [{"row_id": row_id, "delta": delta} for row_id, delta in deltas.items()]
+    )
+
+
+def _count(model, column, owner):
+    return (select(func.count())
+            .select_from(model)
+            .where(column == owner.id)
+            .scalar_subquery())
+
+
+def recount_posts(post_ids=None):
+    statement = update(Post).values(
+        like_count=_count(Like, Like.post_id, Post),
+        comment_count=_count(Comment, Comment.post_id, Post),
+    )
+    if post_ids is not None:
+        statement = statement.where(Post.id.in_(post_ids))
+    return db.session.execute(statement).rowcount
+
+
+def recount_users(user_ids=None):
+    statement = update(User).values(
+        follower_count=_count(Follow, Follow.followed_id, User),
+        following_count=_count(Follow, Follow.follower_id, User),
+        post_count=_count(Post, Post.author_id, User),
+    )
+    if user_ids is not None:
+        statement = statement.where(User.id.in_(user_ids))
+    return db.session.execute(statement).rowcount
+
+
+counters_cli = AppGroup('counters', help='Maintain denormalized like/comment/follow counters.')
+
+
+@counters_cli.command('repair')
+def repair_command():
+    """Recompute every counter from the underlying rows."""
+    posts = recount_posts()
+    users = recount_users()
+    db.session.commit()
+    click.echo(f"Recounted {posts} posts and {users} users.")
@@ -0,0 +1,158 @@
+"""Database engine configuration.
+
+Everything is read from the environment so the same build can run against
+the bundled SQLite file in development and a pooled server database (plus an
+optional read replica) in production:
+
+``DATABASE_URL``        primary database (default ``sqlite:///pixify.db``)
+``DATABASE_READ_URL``   optional replica; GET/HEAD requests read from it
+``DB_POOL_SIZE``, ``DB_MAX_OVERFLOW``, ``DB_POOL_TIMEOUT``, ``DB_POOL_RECYCLE``
+                        connection pool sizing for server databases
+``SQLITE_BUSY_TIMEOUT_MS``, ``SQLITE_MMAP_SIZE``, ``SQLITE_CACHE_SIZE_KB``
+                        SQLite pragmas, applied on every new connection
+
+SQLite connections are switched to WAL, so readers no longer block the
+writer (and vice versa), with ``synchronous=NORMAL`` and a busy timeout so
+concurrent writers from several gunicorn workers wait for the lock instead
+of failing with ``database is locked``. Foreign keys are enforced, which
+``ON DELETE CASCADE`` depends on. ``power()`` is added to SQLite builds
+without math functions.
+
+On SQLite, ``func.now()`` (the timestamp column defaults) renders in the
+``YYYY-MM-DD HH:MM:SS.ffffff`` text SQLAlchemy writes datetimes in, rather
+than ``CURRENT_TIMESTAMP``'s whole seconds, so every stored timestamp sorts
+and compares the same way (see pagination.py).
+"""
+import math
+import os
+import sqlite3
+
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import functions
+
+DEFAULT_DATABASE_URL = 'sqlite:///pixify.db'
+REPLICA_BIND = 'replica'
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def engine_options(url):
+    """Engine keyword arguments suited to ``url``'s backend."""
+    if make_url(url).get_backend_name() == 'sqlite':
+        # The busy timeout is also set as a pragma below; this covers the
+        # driver's own wait before it raises "database is locked".
+        return {'connect_args': {'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000}}
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas():
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': _env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        # Negative values are KiB rather than pages.
+        'cache_size': -_env_int('SQLITE_CACHE_SIZE_KB', 64 * 1024),
+        'temp_store': 'MEMORY',
+        # Off by default in SQLite; the schema relies on ON DELETE CASCADE.
+        'foreign_keys': 'ON',
+    }
+
+
+@compiles(functions.now, 'sqlite')
+def _sqlite_now(element, compiler, **kw):
+    # %f is seconds with milliseconds; pad to SQLAlchemy's microseconds.
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def _add_sqlite_functions(dbapi_connection, connection_record):
+    # SQLite only has power() when built with its math functions.
+    try:
+        dbapi_connection.execute('SELECT power(2, 1)')
+    except sqlite3.OperationalError:
+        dbapi_connection.create_function('power', 2, math.pow, deterministic=True)
+
+
+def configure_database(app):
+    """Fill in the SQLAlchemy config; call before ``db.init_app(app)``."""
+    url = os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', url)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(url))
+
+    read_url = os.environ.get('DATABASE_READ_URL')
+    if read_url:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = {
+            'url': read_url, **engine_options(read_url)
+        }
+
+
+def init_engines(app, db):
+    """Hook up pragmas and replica routing; call after ``db.init_app(app)``."""
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _apply_sqlite_pragmas)
+                event.listen(engine, 'connect', _add_sqlite_functions)
+
+    if REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+        @app.before_request
+        def _route_reads_to_replica():
+            db.session.info['use_replica'] = request.method in ('GET', 'HEAD')
+
+
+def insert_ignoring_conflicts(model, rows, conflict_columns):
+    """Multi-row ``INSERT ... ON CONFLICT DO NOTHING RETURNING *``.
+
+    Only the rows actually inserted come back.
+    """
+    from extensions import db
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    table = model.__table__
+    statement = (dialect_insert(table)
+                 .values(rows)
+                 .on_conflict_do_nothing(index_elements=conflict_columns)
+                 .returning(*table.c))
+    return db.session.execute(statement).mappings().all()
+
+
+class RoutingSession(Session):
+    """Sends plain SELECTs to the replica engine when the request allows it.
+
+    Writes, flushes and anything issued outside a GET/HEAD request always go
+    to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.info.get('use_replica') and not self._flushing
+                and isinstance(clause, Select)):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
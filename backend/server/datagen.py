@@ -0,0 +1,263 @@
+"""Synthetic datasets of any size, for audits, benchmarks and capacity planning.
+
+Unlike ``seed.py``, which writes a handful of hand-made rows through the
+ORM, these insert rows in bulk with explicit ids, so they expect empty
+tables (see :func:`clear`).
+
+- :func:`generate` builds a deliberately lopsided dataset: user 1, post 1 and
+  comment 1 collect a share of the rows that grows with ``scale``, which is
+  what exposes per-row queries on the endpoints that read them.
+- :func:`populate` builds a social graph shaped like a real one, with a
+  power-law follower distribution, and is what ``flask data generate`` runs.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+
+from extensions import db, password_hasher
+from models import User, Post, Comment, Like, Follow, Profile
+from counters import recount_posts, recount_users
+
+PASSWORD = 'password4040'
+START = datetime(2025, 1, 1)
+DEFAULT_BATCH_SIZE = 5000
+
+
+# Hold settings rather than data: the app expects the trending epoch row to
+# exist, and cache versions must never go back or old ETags would match.
+KEPT_TABLES = {'trending_state', 'cache_versions'}
+
+
+def clear():
+    """Delete every row from every data table."""
+    for table in reversed(db.metadata.sorted_tables):
+        if table.name not in KEPT_TABLES:
+            db.session.execute(table.delete())
+
+
+def _at(i):
+    return START + timedelta(seconds=i)
+
+
+def generate(scale):
+    """Insert a dataset of roughly ``scale`` rows per table and commit.
+
+    - ``scale`` users with profiles; every other user follows user 1, and
+      user 1 follows them back.
+    - ``scale`` posts, half of them by user 1; every other user likes post 1.
+    - ``scale`` comments on post 1: comment 1 is the root, even ids reply
+      to it and odd ids reply to the comment before them.
+    """
+    scale = max(scale, 3)
+    # One hash for everyone: hashing per user would dominate the run time.
+    password_hash = password_hasher.hash(PASSWORD)
+    users = range(1, scale + 1)
+
+    db.session.execute(insert(User), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@example.com",
+         "password_hash": password_hash, "first_name": f"First{i}", "last_name": f"Last{i}",
+         "date_created": _at(i)}
+        for i in users
+    ])
+    db.session.execute(insert(Profile), [
+        {"id": i, "user_id": i, "location": "Nairobi", "website": f"https://example.com/{i}",
+         "profile_image": f"https://example.com/{i}.jpg", "bio": f"Bio of user {i}"}
+        for i in users
+    ])
+    db.session.execute(insert(Follow), [
+        {"follower_id": follower, "followed_id": followed, "created_at": _at(i)}
+        for i in users if i > 1
+        for follower, followed in ((i, 1), (1, i))
+    ])
+    db.session.execute(insert(Post), [
+        {"id": i, "title": f"Post number {i}", "body": f"Body of post {i}",
+         "author_id": 1 if i % 2 else i, "created_at": _at(i), "updated_at": _at(i)}
+        for i in users
+    ])
+    db.session.execute(insert(Like), [
+        {"user_id": i, "post_id": 1, "created_at": _at(i)} for i in users if i > 1
+    ])
+
+    comments = []
+    for i in users:
+        parent = None if i == 1 else (1 if i % 2 == 0 else i - 1)
+        path = Comment.path_segment(i)
+        if parent == 1:
+            path = Comment.path_segment(1) + path
+        elif parent is not None:
+            path = Comment.path_segment(1) + Comment.path_segment(parent) + path
+        comments.append({"id": i, "body": f"Comment {i}", "post_id": 1, "user_id": i,
+                         "parent_comment_id": parent, "path": path,
+                         "depth": path.count('/') - 1, "created_at": _at(i)})
+    db.session.execute(insert(Comment), comments)
+
+    recount_posts()
+    recount_users()
+    db.session.commit()
+
+
+def _insert_batches(model, rows, batch_size):
+    """executemany INSERT of ``rows`` (any iterable), ``batch_size`` at a time."""
+    rows = iter(rows)
+    inserted = 0
+    while batch := list(islice(rows, batch_size)):
+        db.session.execute(insert(model), batch)
+        inserted += len(batch)
+    return inserted
+
+
+def _follow_targets(rng, users, follows_per_user, alpha):
+    """``{user: followers}`` with a power-law in-degree.
+
+    Every user follows about ``follows_per_user`` others, picked with weight
+    ``rank ** -alpha``, so a few accounts collect most of the followers.
+    """
+    ranks = list(range(1, users + 1))
+    rng.shuffle(ranks)
+    cum_weights = []
+    total = 0.0
+    for rank in ranks:
+        total += rank ** -alpha
+        cum_weights.append(total)
+    population = range(1, users + 1)
+
+    followers = {user: [] for user in population}
+    for follower in population:
+        wanted = min(users - 1, int(rng.expovariate(1 / follows_per_user)) if follows_per_user else 0)
+        picked = set()
+        # Popular targets repeat, so draw a few extra and cap the attempts.
+        for _ in range(4):
+            if len(picked) >= wanted:
+                break
+            picked.update(rng.choices(population, cum_weights=cum_weights, k=wanted - len(picked)))
+            picked.discard(follower)
+        for followed in islice(picked, wanted):
+            followers[followed].append(follower)
+    return followers
+
+
+def populate(users=1000, posts_per_user=5, follows_per_user=20, alpha=1.2,
+             comments_per_post=3, max_comment_depth=3, reply_ratio=0.5, like_density=0.1,
+             seed=0, batch_size=DEFAULT_BATCH_SIZE, echo=lambda message: None):
+    """Insert a realistic social graph and commit. Returns rows per table.
+
+    ``posts_per_user`` and ``comments_per_post`` are means of exponential
+    distributions, so some users post far more than others. A comment
+    replies to an earlier comment on the same post with probability
+    ``reply_ratio``, down to ``max_comment_depth`` levels. Each post is liked
+    by about ``like_density`` of its author's followers.
+    """
+    rng = random.Random(seed)
+    password_hash = password_hasher.hash(PASSWORD)
+    counts = {}
+    span = timedelta(days=365).total_seconds()
+
+    def at(offset):
+        return START + timedelta(seconds=offset)
+
+    joined = {user: rng.uniform(0, span / 2) for user in range(1, users + 1)}
+    counts['users'] = _insert_batches(User, (
+        {"id": user, "username": f"user{user}", "email": f"user{user}@example.com",
+         "password_hash": password_hash, "first_name": f"First{user}",
+         "last_name": f"Last{user}", "date_created": at(offset)}
+        for user, offset in joined.items()
+    ), batch_size)
+    counts['profiles'] = _insert_batches(Profile, (
+        {"id": user, "user_id": user, "location": "Nairobi",
+         "website": f"https://example.com/{user}", "profile_image": f"https://example.com/{user}.jpg",
+         "bio": f"Bio of user {user}, written by the data generator."}
+        for user in joined
+    ), batch_size)
+    echo(f"users: {counts['users']}")
+
+    followers = _follow_targets(rng, users, follows_per_user, alpha)
+    counts['follows'] = _insert_batches(Follow, (
+        {"follower_id": follower, "followed_id": followed,
+         "created_at": at(max(joined[follower], joined[followed]) + rng.uniform(0, 86400))}
+        for followed, fans in followers.items() for follower in fans
+    ), batch_size)
+    echo(f"follows: {counts['follows']}")
+
+    posts = []
+    for author, offset in joined.items():
+        for _ in range(int(rng.expovariate(1 / posts_per_user)) if posts_per_user else 0):
+            posts.append((len(posts) + 1, author, rng.uniform(offset, span)))
+    counts['posts'] = _insert_batches(Post, (
+        {"id": post_id, "title": f"Post number {post_id}",
+         "body": f"Body of post {post_id} by user {author}.", "author_id": author,
+         "image_url": f"https://example.com/posts/{post_id}.jpg",
+         "created_at": at(offset), "updated_at": at(offset)}
+        for post_id, author, offset in posts
+    ), batch_size)
+    echo(f"posts: {counts['posts']}")
+
+    def likes():
+        for post_id, author, offset in posts:
+            fans = followers[author]
+            wanted = min(len(fans), int(len(fans) * like_density + rng.random()))
+            for user in rng.sample(fans, wanted):
+                yield {"user_id": user, "post_id": post_id,
+                       "created_at": at(offset + rng.uniform(0, 86400))}
+    counts['likes'] = _insert_batches(Like, likes(), batch_size)
+    echo(f"likes: {counts['likes']}")
+
+    def comments():
+        comment_id = 0
+        for post_id, author, offset in posts:
+            thread = []
+            for _ in range(int(rng.expovariate(1 / comments_per_post)) if comments_per_post else 0):
+                comment_id += 1
+                parent = None
+                if thread and rng.random() < reply_ratio:
+                    parent = rng.choice(thread)
+                    if parent[2] >= max_comment_depth:
+                        parent = None
+                path = (parent[1] if parent else '') + Comment.path_segment(comment_id)
+                depth = parent[2] + 1 if parent else 0
+                thread.append((comment_id, path, depth))
+                yield {"id": comment_id, "body": f"Comment {comment_id} on post {post_id}.",
+                       "post_id": post_id, "user_id": rng.randint(1, users),
+                       "parent_comment_id": parent[0] if parent else None,
+                       "path": path, "depth": depth,
+                       "created_at": at(offset + rng.uniform(0, 86400) + depth)}
+    counts['comments'] = _insert_batches(Comment, comments(), batch_size)
+    echo(f"comments: {counts['comments']}")
+
+    recount_posts()
+    recount_users()
+    db.session.commit()
+    return counts
+
+
+data_cli = AppGroup('data', help='Generate synthetic data.')
+
+
+@data_cli.command('generate')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--posts-per-user', default=5.0, show_default=True, help='Mean posts per user.')
+@click.option('--follows-per-user', default=20.0, show_default=True, help='Mean accounts each user follows.')
+@click.option('--alpha', default=1.2, show_default=True,
+              help='Power-law exponent of the follower distribution.')
+@click.option('--comments-per-post', default=3.0, show_default=True, help='Mean comments per post.')
+@click.option('--max-comment-depth', default=3, show_default=True)
+@click.option('--like-density', default=0.1, show_default=True,
+              help="Share of an author's followers that like each post.")
+@click.option('--seed', default=0, show_default=True)
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True)
+@click.option('--clear', 'replace', is_flag=True, help='Delete all existing rows first.')
+def generate_command(replace, **options):
+    """Fill the configured database with a synthetic social graph."""
+    if replace:
+        clear()
+    elif db.session.execute(select(User.id).limit(1)).first() is not None:
+        raise click.ClickException('The database already has users; pass --clear to replace them.')
+    started = time.perf_counter()
+    counts = populate(echo=click.echo, **options)
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - started
+    click.echo(f"Inserted {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s).")
@@ -0,0 +1,59 @@
+from extensions import db
+from models import User, Post, Like, Follow, Profile
+from pagination import paginate
+
+
+def build_feed(viewer_id=None, cursor=None, limit=20):
+    """Return one page of the home feed, newest first."""
+    posts, next_cursor = paginate(Post.query, (Post.created_at, Post.id),
+                                  cursor=cursor, limit=limit, descending=True)
+    return {"items": feed_items(posts, viewer_id), "next_cursor": next_cursor}
+
+
+def feed_items(posts, viewer_id=None):
+    """Serialize ``posts`` with author, profile and the viewer's like/follow state.
+
+    Every related value is fetched with one set-based query per kind of data
+    (authors, viewer state) instead of lazy loads per post; like, comment and
+    follower counts come from the denormalized counter columns.
+    """
+    post_ids = [post.id for post in posts]
+    author_ids = list({post.author_id for post in posts})
+
+    authors = {}
+    if author_ids:
+        rows = (db.session.query(User, Profile)
+                .outerjoin(Profile, Profile.user_id == User.id)
+                .filter(User.id.in_(author_ids))
+                .all())
+        authors = {user.id: (user, profile) for user, profile in rows}
+
+    viewer_likes = {}
+    viewer_follows = {}
+    if viewer_id and post_ids:
+        viewer_likes = dict(db.session.query(Like.post_id, Like.id)
+                            .filter(Like.user_id == viewer_id, Like.post_id.in_(post_ids))
+                            .all())
+        viewer_follows = dict(db.session.query(Follow.followed_id, Follow.id)
+                              .filter(Follow.follower_id == viewer_id,
+                                      Follow.followed_id.in_(author_ids))
+                              .all())
+
+    items = []
+    for post in posts:
+        user, profile = authors.get(post.author_id, (None, None))
+        author = None
+        if user is not None:
+            author = user.to_dict_basic()
+            author["profile"] = profile.to_dict() if profile else None
+
+        item = post.to_dict()
+        item.update({
+            "author": author,
+            "liked_by_viewer": post.id in viewer_likes,
+            "viewer_like_id": viewer_likes.get(post.id),
+            "following_author": post.author_id in viewer_follows,
+            "viewer_follow_id": viewer_follows.get(post.author_id),
+        })
+        items.append(item)
+    return items
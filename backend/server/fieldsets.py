@@ -0,0 +1,159 @@
+"""Sparse fieldsets and includes for the resource read endpoints.
+
+``?fields=id,title`` limits each item to those fields, and
+``?fields[users]=id,username`` does the same for the users of a resource or
+of an include (``fields[<table>]`` for any table). Only the requested columns
+are selected. ``?include=`` adds related rows, outer-joined into the same
+SELECT:
+
+- ``author``: a post's or comment's author, as ``"author"``;
+- ``profile``: the author's profile, under ``"author"`` (so it implies
+  ``author``), or a user's own profile, as ``"profile"``;
+- ``counts``: the resource's counter columns, even when ``fields`` leaves
+  them out.
+
+``projection_for(Post)`` reads both parameters and returns a ``Projection``
+whose row function is built once per combination.
+"""
+from functools import lru_cache
+
+from flask import request
+
+from extensions import db
+from models import User, Post, Comment, Profile
+from serializers import json_response, serializer_for
+
+COUNT_FIELDS = {
+    Post: ("like_count", "comment_count"),
+    User: ("follower_count", "following_count", "post_count"),
+}
+# Column holding the author's user id, for models that have an author.
+AUTHOR_COLUMNS = {Post: "author_id", Comment: "user_id"}
+
+
+class InvalidFieldset(ValueError):
+    pass
+
+
+def _names(raw):
+    return tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+
+
+def allowed_includes(model):
+    allowed = set()
+    if model in AUTHOR_COLUMNS:
+        allowed.update(('author', 'profile'))
+    if model is User:
+        allowed.add('profile')
+    if model in COUNT_FIELDS:
+        allowed.add('counts')
+    return allowed
+
+
+def requested_includes(model):
+    names = set(_names(request.args.get('include', '')))
+    unknown = sorted(names - allowed_includes(model))
+    if unknown:
+        raise InvalidFieldset(f"Unknown include {unknown[0]!r} for {model.__tablename__}.")
+    if 'profile' in names and model in AUTHOR_COLUMNS:
+        names.add('author')
+    return frozenset(names)
+
+
+def requested_fields(model, primary=False):
+    """Fields asked for with ``fields[<table>]`` (or ``fields`` for the
+    endpoint's own resource); ``None`` when the request doesn't say."""
+    raw = request.args.get(f'fields[{model.__tablename__}]')
+    if raw is None and primary:
+        raw = request.args.get('fields')
+    if raw is None:
+        return None
+    fields = _names(raw)
+    if not fields:
+        raise InvalidFieldset(f"No fields requested for {model.__tablename__}.")
+    unknown = [field for field in fields if field not in model.serialize_fields]
+    if unknown:
+        raise InvalidFieldset(f"Unknown field {unknown[0]!r} for {model.__tablename__}.")
+    return fields
+
+
+def included_tables():
+    """Tables read by the request's includes, for ``response_cache.cached``."""
+    names = set(_names(request.args.get('include', '')))
+    tables = []
+    if names & {'author', 'profile'}:
+        tables.append('users')
+    if 'profile' in names:
+        tables.append('profiles')
+    return tables
+
+
+class Projection:
+    """Row serializers for a resource and its includes over one SELECT.
+
+    Each include reads its columns from its own stretch of the row, followed
+    by its primary key, which is NULL when the outer join found nothing.
+    """
+
+    def __init__(self, model, fields, includes, user_fields=None, profile_fields=None):
+        self.model = model
+        if 'counts' in includes:
+            fields = fields + tuple(field for field in COUNT_FIELDS[model] if field not in fields)
+        self.primary = serializer_for(model, fields)
+        self.fields = self.primary.fields
+        self.columns = list(self.primary.columns)
+        self.joins = []
+        # (key, serializer, index of the key column); each one nests in the last.
+        self.segments = []
+
+        user = model
+        if 'author' in includes:
+            author_id = getattr(model, AUTHOR_COLUMNS[model])
+            self._include('author', User, user_fields, User.id, author_id)
+            user = User
+        if 'profile' in includes:
+            self._include('profile', Profile, profile_fields, Profile.user_id, user.id)
+
+    def _include(self, key, model, fields, join_column, parent_column):
+        serializer = serializer_for(model, fields, len(self.columns))
+        self.columns += [column.label(f'{key}__{column.key}') for column in serializer.columns]
+        self.segments.append((key, serializer, len(self.columns)))
+        self.columns.append(model.id.label(f'{key}__key'))
+        self.joins.append((model, join_column == parent_column))
+
+    def query(self, *extra_columns):
+        """A column-only query for the fields and includes, plus any
+        ``extra_columns`` (e.g. a pagination key) appended after them."""
+        extra = [column for column in extra_columns if column.key not in self.fields]
+        query = db.session.query(*self.columns, *extra)
+        for model, onclause in self.joins:
+            query = query.outerjoin(model, onclause)
+        return query
+
+    def row(self, row):
+        item = self.primary.row(row)
+        parent = item
+        for key, serializer, key_index in self.segments:
+            if row[key_index] is None:
+                parent[key] = None
+                break
+            parent[key] = parent = serializer.row(row)
+        return item
+
+    def page_response(self, rows, next_cursor):
+        row = self.row
+        return json_response({"items": [row(r) for r in rows], "next_cursor": next_cursor})
+
+
+@lru_cache(maxsize=256)
+def _projection(model, fields, includes, user_fields, profile_fields):
+    return Projection(model, fields, includes, user_fields, profile_fields)
+
+
+def projection_for(model):
+    """The projection the request asks for; raises ``InvalidFieldset``."""
+    includes = requested_includes(model)
+    fields = requested_fields(model, primary=True) or model.serialize_fields
+    user_fields = requested_fields(User) if 'author' in includes else None
+    profile_fields = requested_fields(Profile) if 'profile' in includes else None
+    return _projection(model, fields, includes, user_fields, profile_fields)
@@ -0,0 +1,178 @@
+"""Password hashing on a bounded process pool.
+
+bcrypt is deliberately slow, so running it on the WSGI worker thread stalls
+every other request that worker could be serving. ``PasswordHasher`` ships
+the work to a small process pool instead and refuses new work once a fixed
+number of jobs are in flight, so a login spike turns into quick 503s with
+``Retry-After`` rather than a growing queue.
+
+The bcrypt cost is derived from ``BCRYPT_TARGET_MS`` on first use and
+``needs_rehash`` reports hashes made with a lower cost, so the stored
+hashes keep up with faster hardware as users log in.
+
+``hash_async`` and ``verify_async`` await the same pool from a coroutine
+(see asgi.py), so the event loop keeps serving while bcrypt runs.
+"""
+import asyncio
+import hmac
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+DEFAULT_TARGET_MS = 250
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+CALIBRATION_ROUNDS = 8
+# bcrypt only looks at the first 72 bytes of a password.
+MAX_PASSWORD_BYTES = 72
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool has no free capacity."""
+
+    def __init__(self, retry_after):
+        super().__init__("Password hashing is at capacity, retry shortly.")
+        self.retry_after = retry_after
+
+
+def _encode(password):
+    if isinstance(password, str):
+        password = password.encode('utf-8')
+    return password[:MAX_PASSWORD_BYTES]
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(password, password_hash):
+    password_hash = password_hash.encode('utf-8')
+    return hmac.compare_digest(bcrypt.hashpw(password, password_hash), password_hash)
+
+
+def hash_rounds(password_hash):
+    """Return the cost factor stored in a ``$2b$<rounds>$...`` hash."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def calibrate_rounds(target_ms):
+    """Pick the cost whose hash time is closest to ``target_ms``.
+
+    Each extra round doubles the work, so one cheap measurement is enough
+    to extrapolate.
+    """
+    started = time.perf_counter()
+    _hash(b'calibration', CALIBRATION_ROUNDS)
+    elapsed_ms = max((time.perf_counter() - started) * 1000, 0.01)
+    rounds = CALIBRATION_ROUNDS + round(math.log2(target_ms / elapsed_ms))
+    return max(MIN_ROUNDS, min(MAX_ROUNDS, rounds))
+
+
+class PasswordHasher:
+
+    def __init__(self, app=None):
+        self.config = {}
+        self._pool = None
+        self._slots = None
+        self._rounds = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = app.config.setdefault('BCRYPT_POOL_WORKERS', min(os.cpu_count() or 1, 4))
+        app.config.setdefault('BCRYPT_POOL_MAX_PENDING', max(workers, 1) * 4)
+        app.config.setdefault('BCRYPT_TARGET_MS', DEFAULT_TARGET_MS)
+        app.config.setdefault('BCRYPT_ROUNDS', None)
+        app.config.setdefault('BCRYPT_TIMEOUT', 10)
+        app.config.setdefault('BCRYPT_RETRY_AFTER', 1)
+        self.config = app.config
+        app.extensions['password_hasher'] = self
+
+    def _setting(self, name, default):
+        return self.config.get(name, default)
+
+    @property
+    def rounds(self):
+        fixed = self._setting('BCRYPT_ROUNDS', None)
+        if fixed:
+            return fixed
+        if self._rounds is None:
+            self._rounds = calibrate_rounds(self._setting('BCRYPT_TARGET_MS', DEFAULT_TARGET_MS))
+        return self._rounds
+
+    def _start(self, fn, *args):
+        """Queue ``fn`` on the pool; ``None`` when the pool is turned off."""
+        workers = self._setting('BCRYPT_POOL_WORKERS', 1)
+        if not workers:
+            return None
+
+        with self._lock:
+            if self._pool is None:
+                # Created on first use so each pre-forked server worker gets
+                # its own pool instead of sharing the master's.
+                self._pool = ProcessPoolExecutor(max_workers=workers)
+                self._slots = threading.BoundedSemaphore(
+                    self._setting('BCRYPT_POOL_MAX_PENDING', workers * 4)
+                )
+
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy(self._setting('BCRYPT_RETRY_AFTER', 1))
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _submit(self, fn, *args):
+        future = self._start(fn, *args)
+        if future is None:
+            return fn(*args)
+        try:
+            return future.result(timeout=self._setting('BCRYPT_TIMEOUT', 10))
+        except FutureTimeout:
+            raise HashingBusy(self._setting('BCRYPT_RETRY_AFTER', 1))
+
+    async def _submit_async(self, fn, *args):
+        future = self._start(fn, *args)
+        if future is None:
+            return fn(*args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self._setting('BCRYPT_TIMEOUT', 10))
+        except asyncio.TimeoutError:
+            raise HashingBusy(self._setting('BCRYPT_RETRY_AFTER', 1))
+
+    def hash(self, password):
+        return self._submit(_hash, _encode(password), self.rounds)
+
+    def verify(self, password, password_hash):
+        if not password_hash:
+            return False
+        return self._submit(_verify, _encode(password), password_hash)
+
+    async def hash_async(self, password):
+        return await self._submit_async(_hash, _encode(password), self.rounds)
+
+    async def verify_async(self, password, password_hash):
+        if not password_hash:
+            return False
+        return await self._submit_async(_verify, _encode(password), password_hash)
+
+    def needs_rehash(self, password_hash):
+        rounds = hash_rounds(password_hash)
+        return rounds is None or rounds < self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
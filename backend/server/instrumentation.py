@@ -0,0 +1,258 @@
+"""Per-request performance instrumentation.
+
+Every request is measured for wall time, the number of SQL statements it
+ran and the time spent in them, the rows those statements returned and the
+size of the response body. The numbers go out in a ``Server-Timing`` header
+(visible in the browser's network panel), requests slower than
+``SLOW_REQUEST_MS`` are logged together with the statements they ran, and
+per-route histograms are served in Prometheus text format at ``/metrics``.
+
+Statements are counted with engine events, so an N+1 query pattern shows up
+as a growing ``queries`` count for its route. Rows are counted by buffering
+each non-streaming ORM ``SELECT`` result; streamed exports report their rows
+with :func:`record_rows`.
+
+The histograms live in process memory: each worker exports its own, and
+Prometheus sums them across scrape targets.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+DEFAULT_SLOW_REQUEST_MS = 500
+DEFAULT_MAX_LOGGED_STATEMENTS = 50
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name -> (help, bucket upper bounds)
+HISTOGRAMS = {
+    'pixify_request_duration_seconds': (
+        'Wall time spent handling the request.',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'pixify_request_db_duration_seconds': (
+        'Time spent executing SQL statements.',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)),
+    'pixify_request_db_queries': (
+        'SQL statements executed.',
+        (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)),
+    'pixify_request_db_rows': (
+        'Rows returned by SELECT statements.',
+        (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)),
+    'pixify_response_size_bytes': (
+        'Size of the response body.',
+        (100, 1000, 10000, 100000, 1000000, 10000000)),
+}
+
+
+class RequestStats:
+    """What one request did, collected while it runs."""
+
+    def __init__(self, max_statements):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.size = None
+        self.status = None
+        self.statements = []
+        self.max_statements = max_statements
+
+    def add_statement(self, statement, duration):
+        self.queries += 1
+        self.db_time += duration
+        if len(self.statements) < self.max_statements:
+            self.statements.append((duration, statement))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class Histogram:
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+
+class Metrics:
+    """Per-route histograms and request counters, safe across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._requests = {}
+
+    def observe(self, route, method, status, values):
+        with self._lock:
+            key = (route, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for name, value in values.items():
+                if value is None:
+                    continue
+                histogram = self._histograms.get((name, route, method))
+                if histogram is None:
+                    histogram = self._histograms[(name, route, method)] = Histogram(HISTOGRAMS[name][1])
+                histogram.observe(value)
+
+    def render(self):
+        """The current values in Prometheus text exposition format."""
+        lines = ['# HELP pixify_requests_total Requests handled.',
+                 '# TYPE pixify_requests_total counter']
+        with self._lock:
+            for (route, method, status), count in sorted(self._requests.items()):
+                lines.append(f'pixify_requests_total{{route="{_escape(route)}",method="{method}",'
+                             f'status="{status}"}} {count}')
+            for name, (help_text, bounds) in HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (metric, route, method), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    labels = f'route="{_escape(route)}",method="{method}"'
+                    cumulative = 0
+                    for bound, count in zip(bounds + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.total!r}')
+                    lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def current_stats():
+    return g.get('request_stats') if has_app_context() else None
+
+
+def record_rows(count):
+    """Add rows that were fetched without going through a buffered result."""
+    stats = current_stats()
+    if stats is not None:
+        stats.rows += count
+
+
+class Instrumentation:
+
+    def __init__(self, app=None):
+        self.metrics = Metrics()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('INSTRUMENTATION_ENABLED', True)
+        app.config.setdefault('SERVER_TIMING_ENABLED', True)
+        app.config.setdefault('SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+        app.config.setdefault('SLOW_REQUEST_MAX_STATEMENTS', DEFAULT_MAX_LOGGED_STATEMENTS)
+        app.extensions['instrumentation'] = self
+        app.before_request(self._start)
+        app.after_request(self._finish_response)
+        app.teardown_request(self._record)
+
+    def metrics_response(self):
+        return Response(self.metrics.render(), mimetype=PROMETHEUS_MIMETYPE)
+
+    def _start(self):
+        if current_app.config['INSTRUMENTATION_ENABLED']:
+            g.request_stats = RequestStats(current_app.config['SLOW_REQUEST_MAX_STATEMENTS'])
+
+    def _finish_response(self, response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        stats.status = response.status_code
+        if response.is_streamed:
+            # The body is generated after this hook (see stream_with_context,
+            # which also delays teardown); count it as it goes out rather
+            # than buffering it to measure it.
+            stats.size = 0
+            response.response = _counting(response.response, stats)
+        else:
+            stats.size = response.content_length or response.calculate_content_length()
+        if current_app.config['SERVER_TIMING_ENABLED']:
+            response.headers['Server-Timing'] = (
+                f'app;dur={stats.elapsed() * 1000:.1f}, '
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries, {stats.rows} rows"'
+            )
+        return response
+
+    def _record(self, error=None):
+        # Runs once the response is built, or, for streamed responses, once
+        # the last chunk has been sent.
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return
+        elapsed = stats.elapsed()
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        status = stats.status or 500
+        self.metrics.observe(route, request.method, status, {
+            'pixify_request_duration_seconds': elapsed,
+            'pixify_request_db_duration_seconds': stats.db_time,
+            'pixify_request_db_queries': stats.queries,
+            'pixify_request_db_rows': stats.rows,
+            'pixify_response_size_bytes': stats.size,
+        })
+        if elapsed * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+            self._log_slow(stats, elapsed, status)
+
+    def _log_slow(self, stats, elapsed, status):
+        lines = [f'Slow request: {request.method} {request.full_path.rstrip("?")} -> {status} '
+                 f'in {elapsed * 1000:.1f} ms; {stats.queries} queries '
+                 f'({stats.db_time * 1000:.1f} ms), {stats.rows} rows, {stats.size} bytes']
+        for duration, statement in stats.statements:
+            lines.append(f'  {duration * 1000:8.2f} ms  {" ".join(statement.split())}')
+        if stats.queries > len(stats.statements):
+            lines.append(f'  ... {stats.queries - len(stats.statements)} more')
+        current_app.logger.warning('\n'.join(lines))
+
+
+def _counting(chunks, stats):
+    try:
+        for chunk in chunks:
+            stats.size += len(chunk)
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+instrumentation = Instrumentation()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    stats = current_stats()
+    if stats is not None and started is not None:
+        stats.add_statement(statement, time.perf_counter() - started)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _count_rows(orm_execute_state):
+    stats = current_stats()
+    if stats is None or not orm_execute_state.is_select:
+        return None
+    options = orm_execute_state.execution_options
+    if options.get('yield_per') or options.get('stream_results'):
+        return None
+    # Buffer the result so its rows can be counted; the caller gets an
+    # equivalent result over the same rows.
+    frozen = orm_execute_state.invoke_statement().freeze()
+    stats.rows += len(frozen.data)
+    return frozen()
@@ -0,0 +1,277 @@
+"""Background jobs stored in the application database.
+
+Write handlers call ``enqueue()`` in the same transaction as the row they
+create, so a job exists exactly when its write committed, and return without
+doing the follow-up work. ``flask jobs work`` runs worker processes that
+claim due jobs one at a time, run the registered handler and mark the job
+done in the handler's own transaction. A failed job is retried with
+exponential backoff until ``max_attempts`` is reached.
+
+Handlers are plain functions registered with ``@job_handler('name')`` and
+called with the job's payload as keyword arguments. With ``JOBS_EAGER`` set,
+``enqueue()`` runs the handler immediately instead, which is handy for
+scripts and local runs without a worker.
+"""
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, select, update
+
+from extensions import db
+from database import insert_ignoring_conflicts
+from models import Job
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_BASE = 2
+DEFAULT_BACKOFF_MAX = 600
+DEFAULT_LOCK_TIMEOUT = 300
+DEFAULT_POLL_INTERVAL = 1.0
+
+HANDLERS = {}
+
+
+def job_handler(kind):
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default)
+
+
+def enqueue(kind, payload=None, key=None, delay=0, max_attempts=None):
+    """Add a job to the current transaction; it runs once that commits.
+
+    ``key`` is an idempotency key: enqueueing the same key again is a no-op,
+    whatever state the first job is in. Returns the new job id, or ``None``
+    when the key already existed or the job ran eagerly.
+    """
+    if kind not in HANDLERS:
+        raise LookupError(f"No handler registered for job {kind!r}.")
+    payload = payload or {}
+    if _setting('JOBS_EAGER', False):
+        HANDLERS[kind](**payload)
+        return None
+
+    row = {
+        "kind": kind,
+        "payload": payload,
+        "status": 'pending',
+        "attempts": 0,
+        "max_attempts": max_attempts or _setting('JOBS_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+        "idempotency_key": key,
+        "run_at": _now() + timedelta(seconds=delay),
+    }
+    inserted = insert_ignoring_conflicts(Job, [row], ['idempotency_key'])
+    return inserted[0]['id'] if inserted else None
+
+
+def enqueue_periodic(kind, interval, delay=0):
+    """Queue ``kind`` ``delay`` seconds from now, at most once per ``interval``.
+
+    A handler that ends by calling this with ``delay=interval`` runs on a
+    schedule; the idempotency key stops two such chains from forming. With
+    ``JOBS_EAGER`` nothing delayed is queued, as it would run at once.
+    """
+    if delay and _setting('JOBS_EAGER', False):
+        return None
+    slot = int((time.time() + delay) // interval)
+    return enqueue(kind, key=f'{kind}:{slot}', delay=delay)
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts``, with jitter."""
+    base = _setting('JOBS_BACKOFF_BASE', DEFAULT_BACKOFF_BASE)
+    ceiling = _setting('JOBS_BACKOFF_MAX', DEFAULT_BACKOFF_MAX)
+    delay = min(ceiling, base * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def requeue_stale():
+    """Put back jobs whose worker died mid-run."""
+    cutoff = _now() - timedelta(seconds=_setting('JOBS_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT))
+    result = db.session.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.locked_at < cutoff)
+        .values(status='pending', locked_by=None, locked_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def claim(worker):
+    """Atomically take the oldest due job, or return ``None``."""
+    now = _now()
+    due = (select(Job.id)
+           .where(Job.status == 'pending', Job.run_at <= now)
+           .order_by(Job.run_at, Job.id)
+           .limit(1)
+           .with_for_update(skip_locked=True)
+           .scalar_subquery())
+    # The status check makes the claim safe even where SKIP LOCKED isn't
+    # available: two workers racing for one row can't both update it.
+    job = db.session.execute(
+        update(Job)
+        .where(Job.id == due, Job.status == 'pending')
+        .values(status='running', attempts=Job.attempts + 1, locked_by=worker, locked_at=now)
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.session.commit()
+    return job
+
+
+def run(job):
+    """Run a claimed job and record the outcome. Returns True on success."""
+    try:
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            raise LookupError(f"No handler registered for job {job.kind!r}.")
+        handler(**job.payload)
+        # Marked done in the handler's transaction, so its effects and the
+        # status change commit (or roll back) together.
+        db.session.execute(
+            update(Job).where(Job.id == job.id)
+            .values(status='done', finished_at=_now(), locked_by=None, locked_at=None, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)
+        if job.attempts >= job.max_attempts:
+            values = {"status": 'failed', "finished_at": _now()}
+        else:
+            values = {"status": 'pending', "run_at": _now() + timedelta(seconds=backoff(job.attempts))}
+        db.session.execute(
+            update(Job).where(Job.id == job.id)
+            .values(locked_by=None, locked_at=None, last_error=error, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return False
+
+
+def work(worker, burst=False, poll_interval=DEFAULT_POLL_INTERVAL, should_stop=lambda: False):
+    """Process jobs until stopped (or, with ``burst``, until none are due)."""
+    processed = 0
+    requeue_stale()
+    while not should_stop():
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        run(job)
+        processed += 1
+    return processed
+
+
+def _worker_process(app, name, burst, poll_interval):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    with app.app_context():
+        # Connections inherited from the parent must not be shared.
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        work(name, burst=burst, poll_interval=poll_interval, should_stop=lambda: bool(stopping))
+
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+@jobs_cli.command('work')
+@click.option('--workers', '-w', default=1, show_default=True, help='Worker processes to run.')
+@click.option('--burst', is_flag=True, help='Exit once no jobs are due.')
+@click.option('--poll-interval', default=DEFAULT_POLL_INTERVAL, show_default=True)
+def work_command(workers, burst, poll_interval):
+    """Run workers until interrupted (SIGTERM lets the current job finish)."""
+    import multiprocessing
+
+    app = current_app._get_current_object()
+    base = f"{socket.gethostname()}:{os.getpid()}"
+    if workers <= 1:
+        _worker_process(app, base, burst, poll_interval)
+        return
+
+    # Forked so each worker starts from the already-configured app.
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_worker_process, args=(app, f"{base}/{n}", burst, poll_interval))
+                 for n in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+@jobs_cli.command('stats')
+def stats_command():
+    """Count jobs by status."""
+    counts = db.session.execute(select(Job.status, func.count()).group_by(Job.status)).all()
+    for status, count in sorted(counts):
+        click.echo(f"{status:10} {count}")
+
+
+@jobs_cli.command('list')
+@click.option('--status', default='failed', show_default=True)
+@click.option('--limit', default=20, show_default=True)
+def list_command(status, limit):
+    """Show the most recent jobs in one status."""
+    jobs = db.session.execute(select(Job).where(Job.status == status)
+                              .order_by(Job.id.desc()).limit(limit)).scalars()
+    for job in jobs:
+        error = (job.last_error or '').strip().splitlines()[-1:] or ['']
+        click.echo(f"{job.id:>8} {job.kind:30} attempts={job.attempts} {error[0]}")
+
+
+@jobs_cli.command('retry')
+@click.argument('job_ids', nargs=-1, type=int)
+@click.option('--all-failed', is_flag=True, help='Retry every failed job.')
+def retry_command(job_ids, all_failed):
+    """Reset failed jobs so they run again."""
+    statement = update(Job).where(Job.status == 'failed')
+    if not all_failed:
+        statement = statement.where(Job.id.in_(job_ids))
+    result = db.session.execute(statement.values(status='pending', attempts=0, run_at=_now(),
+                                                 finished_at=None)
+                                .execution_options(synchronize_session=False))
+    db.session.commit()
+    click.echo(f"Requeued {result.rowcount} jobs.")
+
+
+@jobs_cli.command('purge')
+@click.option('--older-than', default=7, show_default=True, help='Age in days.')
+def purge_command(older_than):
+    """Delete finished jobs (done or failed) older than --older-than days.
+
+    Their idempotency keys are released with them.
+    """
+    cutoff = _now() - timedelta(days=older_than)
+    result = db.session.execute(delete(Job).where(Job.status.in_(('done', 'failed')),
+                                                  Job.finished_at < cutoff))
+    db.session.commit()
+    click.echo(f"Deleted {result.rowcount} jobs.")
@@ -0,0 +1,147 @@
+"""Replay a read/write request mix against the app and time every request.
+
+Requests go through Flask's test client, so the numbers cover routing,
+queries and serialization but not the WSGI server or the network. They run
+against the configured database, which should hold a generated dataset
+(``flask data generate``): the writes in the mix add likes, comments,
+follows and posts to it, each sent with an access token minted for a random
+user.
+"""
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from extensions import db
+from models import User, Post, Comment, Like, Follow
+from tokens import issue_access_token
+
+WORDS = ('post', 'body', 'comment', 'user', 'number')
+
+
+class Targets:
+    """Picks ids for request paths from the rows in the database."""
+
+    def __init__(self, rng, users, posts, comments):
+        self.rng = rng
+        self.users = users
+        self.posts = posts
+        self.comments = comments
+
+    def user(self):
+        return self.rng.randint(1, self.users)
+
+    def post(self):
+        return self.rng.randint(1, self.posts)
+
+    def comment(self):
+        return self.rng.randint(1, self.comments)
+
+
+# (weight, endpoint, request builder). A builder returns (method, path, body,
+# user); requests with a user are sent with an access token for them.
+MIX = [
+    (25, 'GET /feed', lambda t: ('GET', f'/feed?user_id={t.user()}', None, None)),
+    (10, 'GET /users/<id>/timeline', lambda t: ('GET', f'/users/{t.user()}/timeline', None, None)),
+    (15, 'GET /posts/<id>', lambda t: ('GET', f'/posts/{t.post()}', None, None)),
+    (12, 'GET /posts/<id>/comments', lambda t: ('GET', f'/posts/{t.post()}/comments', None, None)),
+    (8, 'GET /users/<id>', lambda t: ('GET', f'/users/{t.user()}', None, None)),
+    (3, 'GET /users/<id>/suggestions', lambda t: ('GET', f'/users/{t.user()}/suggestions', None, None)),
+    (5, 'GET /profiles/<user_id>', lambda t: ('GET', f'/profiles/{t.user()}', None, None)),
+    (5, 'GET /posts', lambda t: ('GET', '/posts', None, None)),
+    (3, 'GET /posts/trending', lambda t: ('GET', f'/posts/trending?user_id={t.user()}', None, None)),
+    (4, 'GET /search', lambda t: ('GET', f'/search?q={t.rng.choice(WORDS)}', None, None)),
+    (3, 'GET /comments/<id>/replies', lambda t: ('GET', f'/comments/{t.comment()}/replies', None, None)),
+    (6, 'POST /likes', lambda t: ('POST', '/likes', {"post_id": t.post()}, t.user())),
+    (3, 'POST /comments', lambda t: ('POST', '/comments', {
+        "body": "Load test comment", "post_id": t.post()}, t.user())),
+    (2, 'POST /follows', lambda t: ('POST', '/follows', {"followed_id": t.user()}, t.user())),
+    (1, 'POST /posts', lambda t: ('POST', '/posts', {
+        "title": "Load test post", "body": "Written by the load test."}, t.user())),
+]
+
+
+def dataset_size():
+    return {model.__tablename__: db.session.execute(select(func.count()).select_from(model)).scalar()
+            for model in (User, Post, Comment, Like, Follow)}
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def _worker(app, seed, count, maxima, samples):
+    rng = random.Random(seed)
+    targets = Targets(rng, *maxima)
+    weights = [weight for weight, _, _ in MIX]
+    client = app.test_client()
+    for _ in range(count):
+        _, endpoint, build = rng.choices(MIX, weights=weights)[0]
+        method, path, body, user = build(targets)
+        headers = {}
+        if user is not None:
+            with app.app_context():
+                headers['Authorization'] = f'Bearer {issue_access_token(user, 0)}'
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        response.close()
+        samples.append((endpoint, response.status_code, time.perf_counter() - started))
+
+
+def run(app, requests=1000, threads=1, warmup=50, seed=0):
+    """Send ``requests`` requests from ``threads`` threads; return the report.
+
+    ``warmup`` untimed requests go first, to fill caches and connection pools.
+    """
+    with app.app_context():
+        size = dataset_size()
+        maxima = [db.session.execute(select(func.max(model.id))).scalar() or 1
+                  for model in (User, Post, Comment)]
+
+    _worker(app, seed - 1, warmup, maxima, [])
+    samples = []
+    per_thread = [requests // threads + (1 if n < requests % threads else 0) for n in range(threads)]
+    workers = [threading.Thread(target=_worker, args=(app, seed + n, count, maxima, samples))
+               for n, count in enumerate(per_thread)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duration = time.perf_counter() - started
+
+    endpoints = {}
+    for _, endpoint, _ in MIX:
+        timings = sorted(elapsed for name, _, elapsed in samples if name == endpoint)
+        if not timings:
+            continue
+        statuses = [status for name, status, _ in samples if name == endpoint]
+        endpoints[endpoint] = {
+            "requests": len(timings),
+            "rejected": sum(1 for status in statuses if 400 <= status < 500),
+            "errors": sum(1 for status in statuses if status >= 500),
+            "throughput_rps": round(len(timings) / duration, 2),
+            "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            "p99_ms": round(percentile(timings, 99) * 1000, 3),
+            "max_ms": round(timings[-1] * 1000, 3),
+        }
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "database": make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name(),
+        "dataset": size,
+        "settings": {"requests": requests, "threads": threads, "warmup": warmup, "seed": seed,
+                     "cache": app.config.get('CACHE_ENABLED', True)},
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(samples) / duration, 2),
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "endpoints": endpoints,
+    }
@@ -0,0 +1,246 @@
+"""Uploaded images: content-addressed storage and resized variants.
+
+``POST /media`` streams the upload to a temporary file under ``MEDIA_ROOT``
+while hashing it, checks it is an image Pillow can read, and moves it to
+``<root>/<sha[:2]>/<sha[2:4]>/<sha>/original.<ext>``. The same bytes
+uploaded twice hash to the same path, so they are stored once and share one
+``media`` row.
+
+A ``media.variants`` job, run by the job worker pool, then writes a JPEG
+(PNG when the image has transparency) of each size in ``MEDIA_VARIANTS``
+next to the original. Files are written under a temporary name and renamed
+into place, so a half-written variant is never served.
+
+Posts and profiles refer to an upload as ``media:<sha>``; serializers turn
+that into variant URLs. Variant URLs never change content, so
+``GET /media/<sha>/<variant>`` serves them as immutable for a year, with
+range and conditional request support. Until the job has run, a variant URL
+redirects to the original.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from datetime import datetime, timezone
+
+from flask import current_app, redirect, send_file
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import update
+
+from extensions import db
+from database import insert_ignoring_conflicts
+from jobs import enqueue, job_handler
+from models import Media
+from serializers import MEDIA_SCHEME, MEDIA_VARIANTS, media_base_url, media_url, media_variants
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 40_000_000
+DEFAULT_JPEG_QUALITY = 85
+DEFAULT_CACHE_MAX_AGE = 365 * 24 * 3600
+CHUNK_SIZE = 64 * 1024
+
+# Pillow format name -> extension of the stored original.
+FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+EXTENSIONS = tuple(FORMATS.values())
+DIGEST = re.compile(r'[0-9a-f]{64}')
+
+
+class InvalidMedia(Exception):
+    pass
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default)
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def max_bytes():
+    return _setting('MEDIA_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+
+def media_root():
+    return _setting('MEDIA_ROOT', None) or os.path.join(current_app.instance_path, 'media')
+
+
+def _directory(digest):
+    return os.path.join(media_root(), digest[:2], digest[2:4], digest)
+
+
+def _find(digest, name):
+    """Path of ``<name>.<ext>`` in the digest's directory, or ``None``."""
+    directory = _directory(digest)
+    for extension in EXTENSIONS:
+        path = os.path.join(directory, name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _spool(stream):
+    """Copy ``stream`` to a temporary file in the media root, hashing it.
+
+    Returns the path, SHA-256 and size; gives up past ``MEDIA_MAX_BYTES``.
+    """
+    limit = max_bytes()
+    root = media_root()
+    os.makedirs(root, exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    handle, path = tempfile.mkstemp(dir=root, prefix='.upload-')
+    try:
+        with os.fdopen(handle, 'wb') as spooled:
+            while chunk := stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > limit:
+                    raise InvalidMedia(f"Images can be at most {limit} bytes.")
+                digest.update(chunk)
+                spooled.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest(), size
+
+
+def _inspect(path):
+    """Format, width and height of the image at ``path``."""
+    try:
+        with Image.open(path) as image:
+            if image.format not in FORMATS:
+                raise InvalidMedia("Images must be JPEG, PNG, GIF or WebP.")
+            width, height = image.size
+            if width * height > _setting('MEDIA_MAX_PIXELS', DEFAULT_MAX_PIXELS):
+                raise InvalidMedia("Image dimensions are too large.")
+            image.verify()
+            return image.format, width, height
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise InvalidMedia("File is not a readable image.")
+
+
+def describe(media):
+    reference = MEDIA_SCHEME + media.id
+    return {
+        "id": media.id,
+        "reference": reference,
+        "url": media_url(reference),
+        "variants": media_variants(reference),
+        "content_type": media.content_type,
+        "width": media.width,
+        "height": media.height,
+        "size": media.size,
+    }
+
+
+def store(stream, uploaded_by):
+    """Store an upload in the current transaction; returns ``(media, created)``.
+
+    The variants job is queued only for new images.
+    """
+    path, digest, size = _spool(stream)
+    try:
+        image_format, width, height = _inspect(path)
+        media = db.session.get(Media, digest)
+        if media is not None:
+            return media, False
+        os.makedirs(_directory(digest), exist_ok=True)
+        os.replace(path, os.path.join(_directory(digest), 'original' + FORMATS[image_format]))
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+    # A concurrent upload of the same bytes may have inserted the row first.
+    insert_ignoring_conflicts(Media, [{
+        "id": digest,
+        "content_type": Image.MIME[image_format],
+        "width": width,
+        "height": height,
+        "size": size,
+        "uploaded_by": uploaded_by,
+        "created_at": _now(),
+    }], ['id'])
+    enqueue('media.variants', {"media_id": digest}, key=f'media.variants:{digest}')
+    return db.session.get(Media, digest), True
+
+
+def reference(value):
+    """Normalise an image field from a client.
+
+    ``media:<sha>`` and this server's media URLs (as returned by the upload
+    or a serializer) become ``media:<sha>``, which must name an upload;
+    anything else is kept as an external URL. Raises ``ValueError``.
+    """
+    if not value:
+        return value
+    if value.startswith(MEDIA_SCHEME):
+        digest = value[len(MEDIA_SCHEME):]
+    else:
+        base = media_base_url() + '/'
+        if not value.startswith(base):
+            return value
+        digest = value[len(base):].split('/', 1)[0]
+    if not DIGEST.fullmatch(digest) or db.session.get(Media, digest) is None:
+        raise ValueError("image does not refer to an uploaded image.")
+    return MEDIA_SCHEME + digest
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _write_atomically(image, path, **options):
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.variant-')
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            image.save(output, **options)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def generate_variants(digest):
+    """Write every variant of an upload; never upscales."""
+    original = _find(digest, 'original')
+    if original is None:
+        raise FileNotFoundError(f"No original stored for media {digest}.")
+    quality = _setting('MEDIA_JPEG_QUALITY', DEFAULT_JPEG_QUALITY)
+    with Image.open(original) as opened:
+        # Animated images keep their first frame.
+        image = ImageOps.exif_transpose(opened)
+        transparent = _has_alpha(image)
+        image = image.convert('RGBA' if transparent else 'RGB')
+    for variant, edge in MEDIA_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        if transparent:
+            _write_atomically(resized, os.path.join(_directory(digest), variant + '.png'),
+                              format='PNG', optimize=True)
+        else:
+            _write_atomically(resized, os.path.join(_directory(digest), variant + '.jpg'),
+                              format='JPEG', quality=quality, optimize=True, progressive=True)
+
+
+@job_handler('media.variants')
+def variants_job(media_id):
+    generate_variants(media_id)
+    db.session.execute(update(Media).where(Media.id == media_id).values(variants_at=_now()))
+
+
+def serve(digest, variant):
+    """Response for ``GET /media/<digest>/<variant>``, or ``None`` for a 404."""
+    if not DIGEST.fullmatch(digest) or (variant != 'original' and variant not in MEDIA_VARIANTS):
+        return None
+    path = _find(digest, variant)
+    if path is None:
+        if variant == 'original' or _find(digest, 'original') is None:
+            return None
+        # Not generated yet: send the original, but don't let it be cached
+        # under the variant's URL.
+        return redirect(f"{media_base_url()}/{digest}/original", code=302)
+    response = send_file(path, mimetype=mimetypes.guess_type(path)[0], conditional=True,
+                         max_age=_setting('MEDIA_CACHE_MAX_AGE', DEFAULT_CACHE_MAX_AGE))
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,61 @@
+"""comment paths
+
+Revision ID: 5c81f2e0a9d3
+Revises: 1a0067d7904d
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c81f2e0a9d3'
+down_revision = '1a0067d7904d'
+branch_labels = None
+depends_on = None
+
+
+PATH_SEGMENT_WIDTH = 10
+
+
+def upgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('path', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('depth', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_comments_post_id_path', ['post_id', 'path'], unique=False)
+
+    # Backfill paths for existing threads, parents before children.
+    connection = op.get_bind()
+    comments = sa.table('comments',
+                        sa.column('id', sa.Integer),
+                        sa.column('parent_comment_id', sa.Integer),
+                        sa.column('path', sa.String),
+                        sa.column('depth', sa.Integer))
+    rows = connection.execute(sa.select(comments.c.id, comments.c.parent_comment_id)).all()
+    children = {}
+    for comment_id, parent_id in rows:
+        children.setdefault(parent_id, []).append(comment_id)
+
+    updates = []
+    stack = [(comment_id, '', -1) for comment_id in children.get(None, [])]
+    while stack:
+        comment_id, parent_path, parent_depth = stack.pop()
+        path = f"{parent_path}{comment_id:0{PATH_SEGMENT_WIDTH}d}/"
+        updates.append({'comment_id': comment_id, 'path': path, 'depth': parent_depth + 1})
+        stack.extend((child_id, path, parent_depth + 1) for child_id in children.get(comment_id, []))
+
+    if updates:
+        connection.execute(
+            comments.update()
+            .where(comments.c.id == sa.bindparam('comment_id'))
+            .values(path=sa.bindparam('path'), depth=sa.bindparam('depth')),
+            updates
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_index('ix_comments_post_id_path')
+        batch_op.drop_column('depth')
+        batch_op.drop_column('path')
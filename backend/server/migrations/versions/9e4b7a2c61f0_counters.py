@@ -0,0 +1,50 @@
+"""counters
+
+Revision ID: 9e4b7a2c61f0
+Revises: 5c81f2e0a9d3
+Create Date: 2026-10-18 10:02:17.284551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b7a2c61f0'
+down_revision = '5c81f2e0a9d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('follower_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('following_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute("""
+        UPDATE posts SET
+            like_count = (SELECT count(*) FROM likes WHERE likes.post_id = posts.id),
+            comment_count = (SELECT count(*) FROM comments WHERE comments.post_id = posts.id)
+    """)
+    op.execute("""
+        UPDATE users SET
+            follower_count = (SELECT count(*) FROM follows WHERE follows.followed_id = users.id),
+            following_count = (SELECT count(*) FROM follows WHERE follows.follower_id = users.id),
+            post_count = (SELECT count(*) FROM posts WHERE posts.author_id = users.id)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('post_count')
+        batch_op.drop_column('following_count')
+        batch_op.drop_column('follower_count')
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
@@ -0,0 +1,41 @@
+"""media
+
+Revision ID: a7c3e9f1d5b2
+Revises: f4d9a3b8c6e2
+Create Date: 2026-10-18 23:04:51.602117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1d5b2'
+down_revision = 'f4d9a3b8c6e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('media',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('content_type', sa.String(), nullable=False),
+    sa.Column('width', sa.Integer(), nullable=False),
+    sa.Column('height', sa.Integer(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('uploaded_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('variants_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['uploaded_by'], ['users.id'], name='fk_media_uploaded_by_users',
+                            ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('media', schema=None) as batch_op:
+        batch_op.create_index('ix_media_uploaded_by', ['uploaded_by'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('media', schema=None) as batch_op:
+        batch_op.drop_index('ix_media_uploaded_by')
+
+    op.drop_table('media')
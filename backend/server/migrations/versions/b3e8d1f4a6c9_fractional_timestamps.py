@@ -0,0 +1,45 @@
+"""fractional timestamps
+
+Revision ID: b3e8d1f4a6c9
+Revises: a7c3e9f1d5b2
+Create Date: 2026-10-19 10:12:44.201937
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d1f4a6c9'
+down_revision = 'a7c3e9f1d5b2'
+branch_labels = None
+depends_on = None
+
+# Columns that CURRENT_TIMESTAMP defaults (or copies of them) wrote in whole
+# seconds, 'YYYY-MM-DD HH:MM:SS', next to SQLAlchemy's
+# 'YYYY-MM-DD HH:MM:SS.ffffff'. As text the two forms don't sort together,
+# which broke keyset paging; func.now() now writes the longer form.
+TIMESTAMP_COLUMNS = [
+    ('users', 'date_created'),
+    ('posts', 'created_at'),
+    ('posts', 'updated_at'),
+    ('comments', 'created_at'),
+    ('likes', 'created_at'),
+    ('follows', 'created_at'),
+    ('timeline_entries', 'created_at'),
+    ('jobs', 'created_at'),
+    ('refresh_tokens', 'created_at'),
+    ('media', 'created_at'),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, column in TIMESTAMP_COLUMNS:
+        op.execute(f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19")
+
+
+def downgrade():
+    # The whole-second values can't be told apart from the rest afterwards,
+    # and the longer form is valid either way.
+    pass
@@ -0,0 +1,99 @@
+"""on delete cascade
+
+Revision ID: b9d3f1c6e8a4
+Revises: a4c7e2f9b5d1
+Create Date: 2026-10-18 18:02:37.615093
+
+"""
+from contextlib import contextmanager
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9d3f1c6e8a4'
+down_revision = 'a4c7e2f9b5d1'
+branch_labels = None
+depends_on = None
+
+# Names the originally unnamed foreign keys so batch mode can drop them.
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+# table -> [(column, referred table)]
+FOREIGN_KEYS = {
+    'follows': [('follower_id', 'users'), ('followed_id', 'users')],
+    'posts': [('author_id', 'users')],
+    'profiles': [('user_id', 'users')],
+    'comments': [('user_id', 'users'), ('post_id', 'posts'), ('parent_comment_id', 'comments')],
+    'likes': [('user_id', 'users'), ('post_id', 'posts')],
+    'timeline_entries': [('user_id', 'users'), ('post_id', 'posts'), ('author_id', 'users')],
+}
+
+# Rows left behind by earlier deletes would break the constraints once they
+# are enforced. Parents come first so removed comments are handled before
+# their replies.
+ORPHANS = [
+    "DELETE FROM posts WHERE author_id NOT IN (SELECT id FROM users)",
+    "DELETE FROM profiles WHERE user_id NOT IN (SELECT id FROM users)",
+    "DELETE FROM follows WHERE follower_id NOT IN (SELECT id FROM users)"
+    " OR followed_id NOT IN (SELECT id FROM users)",
+    "DELETE FROM likes WHERE user_id NOT IN (SELECT id FROM users)"
+    " OR post_id NOT IN (SELECT id FROM posts)",
+    "DELETE FROM timeline_entries WHERE user_id NOT IN (SELECT id FROM users)"
+    " OR author_id NOT IN (SELECT id FROM users) OR post_id NOT IN (SELECT id FROM posts)",
+    # Replies to a missing comment are removed along with it.
+    """DELETE FROM comments WHERE id IN (
+        WITH RECURSIVE doomed(id) AS (
+            SELECT id FROM comments
+            WHERE user_id NOT IN (SELECT id FROM users) OR post_id NOT IN (SELECT id FROM posts)
+               OR (parent_comment_id IS NOT NULL
+                   AND parent_comment_id NOT IN (SELECT id FROM comments))
+            UNION
+            SELECT c.id FROM comments c JOIN doomed d ON c.parent_comment_id = d.id
+        )
+        SELECT id FROM doomed)""",
+]
+
+
+@contextmanager
+def _triggers_set_aside():
+    """SQLite drops a table's triggers when batch mode rebuilds it, and
+    refuses to rename tables while other triggers point at a missing one,
+    so the search index triggers are dropped first and recreated after."""
+    bind = op.get_bind()
+    triggers = []
+    if bind.dialect.name == 'sqlite':
+        triggers = bind.execute(sa.text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+        )).all()
+        for name, _ in triggers:
+            op.execute(f"DROP TRIGGER {name}")
+    yield
+    for _, sql in triggers:
+        op.execute(sql)
+
+
+def _replace_foreign_keys(ondelete):
+    for table, keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred in keys:
+                name = f"fk_{table}_{column}_{referred}"
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    for statement in ORPHANS:
+        op.execute(statement)
+    with _triggers_set_aside():
+        _replace_foreign_keys('CASCADE')
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with _triggers_set_aside():
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.drop_column('deleted_at')
+        _replace_foreign_keys(None)
@@ -0,0 +1,44 @@
+"""lookup indexes
+
+Revision ID: c37d05b8e1a2
+Revises: 9e4b7a2c61f0
+Create Date: 2026-10-18 11:26:53.918402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c37d05b8e1a2'
+down_revision = '9e4b7a2c61f0'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns) -- each one matches a query shape in app.py,
+# feed.py or counters.py; `flask plans check` verifies they are used.
+INDEXES = [
+    ('ix_users_date_created', 'users', ['date_created', 'id']),
+    ('ix_posts_created_at', 'posts', ['created_at', 'id']),
+    ('ix_posts_author_id_created_at', 'posts', ['author_id', 'created_at', 'id']),
+    ('ix_comments_post_id_created_at', 'comments', ['post_id', 'created_at', 'id']),
+    ('ix_comments_parent_comment_id_created_at', 'comments', ['parent_comment_id', 'created_at', 'id']),
+    ('ix_comments_user_id', 'comments', ['user_id']),
+    ('ix_comments_created_at', 'comments', ['created_at', 'id']),
+    ('ix_likes_post_id_user_id', 'likes', ['post_id', 'user_id']),
+    ('ix_likes_created_at', 'likes', ['created_at', 'id']),
+    ('ix_follows_follower_id_created_at', 'follows', ['follower_id', 'created_at', 'id']),
+    ('ix_follows_followed_id_created_at', 'follows', ['followed_id', 'created_at', 'id']),
+    ('ix_follows_created_at', 'follows', ['created_at', 'id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,28 @@
+"""cache versions
+
+Revision ID: c8f1e4a2d7b6
+Revises: b3e8d1f4a6c9
+Create Date: 2026-10-19 14:37:20.514308
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f1e4a2d7b6'
+down_revision = 'b3e8d1f4a6c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_versions',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_versions')
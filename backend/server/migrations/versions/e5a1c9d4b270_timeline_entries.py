@@ -0,0 +1,42 @@
+"""timeline entries
+
+Revision ID: e5a1c9d4b270
+Revises: c37d05b8e1a2
+Create Date: 2026-10-18 12:40:05.117263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a1c9d4b270'
+down_revision = 'c37d05b8e1a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('timeline_entries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    with op.batch_alter_table('timeline_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_timeline_entries_user_id_created_at', ['user_id', 'created_at', 'post_id'], unique=False)
+        batch_op.create_index('ix_timeline_entries_user_id_author_id', ['user_id', 'author_id'], unique=False)
+        batch_op.create_index('ix_timeline_entries_post_id', ['post_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('timeline_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_timeline_entries_post_id')
+        batch_op.drop_index('ix_timeline_entries_user_id_author_id')
+        batch_op.drop_index('ix_timeline_entries_user_id_created_at')
+
+    op.drop_table('timeline_entries')
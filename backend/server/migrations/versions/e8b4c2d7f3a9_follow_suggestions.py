@@ -0,0 +1,41 @@
+"""follow suggestions
+
+Revision ID: e8b4c2d7f3a9
+Revises: d6f2a8c4e1b7
+Create Date: 2026-10-18 20:02:31.540712
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b4c2d7f3a9'
+down_revision = 'd6f2a8c4e1b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('follow_suggestions',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('suggested_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('mutual_count', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_follow_suggestions_user_id_users',
+                            ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['suggested_id'], ['users.id'], name='fk_follow_suggestions_suggested_id_users',
+                            ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'position')
+    )
+    with op.batch_alter_table('follow_suggestions', schema=None) as batch_op:
+        batch_op.create_index('ix_follow_suggestions_suggested_id', ['suggested_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('follow_suggestions', schema=None) as batch_op:
+        batch_op.drop_index('ix_follow_suggestions_suggested_id')
+
+    op.drop_table('follow_suggestions')
@@ -0,0 +1,100 @@
+"""full-text search index
+
+Revision ID: f2b8d6e1a7c3
+Revises: e5a1c9d4b270
+Create Date: 2026-10-18 16:20:41.503218
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d6e1a7c3'
+down_revision = 'e5a1c9d4b270'
+branch_labels = None
+depends_on = None
+
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+
+# posts_fts and comments_fts read their text from the base tables (external
+# content); users_fts spans users and profiles, so it keeps its own copy.
+TABLES = [
+    f"CREATE VIRTUAL TABLE posts_fts USING fts5(title, body, content='posts', content_rowid='id', {TOKENIZE})",
+    f"CREATE VIRTUAL TABLE comments_fts USING fts5(body, content='comments', content_rowid='id', {TOKENIZE})",
+    f"CREATE VIRTUAL TABLE users_fts USING fts5(username, first_name, last_name, bio, location, {TOKENIZE})",
+]
+
+# Column weights for bm25(), stored as each table's default ``rank``.
+RANKS = [
+    "INSERT INTO posts_fts(posts_fts, rank) VALUES ('rank', 'bm25(4.0, 1.0)')",
+    "INSERT INTO users_fts(users_fts, rank) VALUES ('rank', 'bm25(4.0, 2.0, 2.0, 1.0, 1.0)')",
+]
+
+
+def _refresh_user(user_id):
+    return f"""
+        DELETE FROM users_fts WHERE rowid = {user_id};
+        INSERT INTO users_fts(rowid, username, first_name, last_name, bio, location)
+        SELECT u.id, u.username, u.first_name, u.last_name, p.bio, p.location
+        FROM users u LEFT JOIN profiles p ON p.user_id = u.id WHERE u.id = {user_id};"""
+
+
+# Triggers rather than ORM events, so bulk and Core writes (batch inserts,
+# subtree deletes) keep the index in sync too. Updates only fire on the
+# indexed columns, so counter increments don't touch the index.
+TRIGGERS = {
+    'posts_fts_insert': """AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    'posts_fts_delete': """AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    'posts_fts_update': """AFTER UPDATE OF title, body ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO posts_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    'comments_fts_insert': """AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+    'comments_fts_delete': """AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    END""",
+    'comments_fts_update': """AFTER UPDATE OF body ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO comments_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+    'users_fts_insert': f"AFTER INSERT ON users BEGIN {_refresh_user('new.id')} END",
+    'users_fts_update': f"AFTER UPDATE OF username, first_name, last_name ON users BEGIN {_refresh_user('new.id')} END",
+    'users_fts_delete': f"AFTER DELETE ON users BEGIN {_refresh_user('old.id')} END",
+    'profiles_fts_insert': f"AFTER INSERT ON profiles BEGIN {_refresh_user('new.user_id')} END",
+    'profiles_fts_update': f"""AFTER UPDATE OF bio, location, user_id ON profiles BEGIN
+        {_refresh_user('old.user_id')} {_refresh_user('new.user_id')} END""",
+    'profiles_fts_delete': f"AFTER DELETE ON profiles BEGIN {_refresh_user('old.user_id')} END",
+}
+
+
+def upgrade():
+    # FTS5 is SQLite-only; other databases go without /search.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in TABLES + RANKS:
+        op.execute(statement)
+    for name, body in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+    op.execute("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+    op.execute("INSERT INTO comments_fts(comments_fts) VALUES ('rebuild')")
+    op.execute("""
+        INSERT INTO users_fts(rowid, username, first_name, last_name, bio, location)
+        SELECT u.id, u.username, u.first_name, u.last_name, p.bio, p.location
+        FROM users u LEFT JOIN profiles p ON p.user_id = u.id
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for table in ('users_fts', 'comments_fts', 'posts_fts'):
+        op.execute(f"DROP TABLE IF EXISTS {table}")
@@ -0,0 +1,45 @@
+"""post scores
+
+Revision ID: f4d9a3b8c6e2
+Revises: e8b4c2d7f3a9
+Create Date: 2026-10-18 21:26:07.318455
+
+"""
+import time
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4d9a3b8c6e2'
+down_revision = 'e8b4c2d7f3a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('post_scores',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], name='fk_post_scores_post_id_posts',
+                            ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+    with op.batch_alter_table('post_scores', schema=None) as batch_op:
+        batch_op.create_index('ix_post_scores_score', ['score', 'post_id'], unique=False)
+
+    trending_state = op.create_table('trending_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('epoch', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(trending_state, [{'id': 1, 'epoch': time.time()}])
+
+
+def downgrade():
+    op.drop_table('trending_state')
+    with op.batch_alter_table('post_scores', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_scores_score')
+
+    op.drop_table('post_scores')
@@ -1,20 +1,25 @@
-from extensions import db, bcrypt
-from sqlalchemy_serializer import SerializerMixin
+from extensions import db, password_hasher
+from sqlalchemy import event, select
 from sqlalchemy.orm import validates
+from sqlalchemy.orm.attributes import set_committed_value
 
+from serializers import SerializableMixin
 
 
-class Follow(db.Model, SerializerMixin):
+class Follow(db.Model, SerializableMixin):
 
     __tablename__="follows"
 
     __table_args__ = (
         db.UniqueConstraint('follower_id', 'followed_id', name='_follower_followed_uc'),
+        db.Index('ix_follows_follower_id_created_at', 'follower_id', 'created_at', 'id'),
+        db.Index('ix_follows_followed_id_created_at', 'followed_id', 'created_at', 'id'),
+        db.Index('ix_follows_created_at', 'created_at', 'id'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
-    follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    follower_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    followed_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
     followed_user = db.relationship("User", foreign_keys=[followed_id], back_populates="followers")
     follower_user = db.relationship("User", foreign_keys=[follower_id], back_populates="following")
@@ -29,18 +34,17 @@ class Follow(db.Model, SerializerMixin):
         return follower_id
 
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "follower_id": self.follower_id,
-            "followed_id": self.followed_id,
-            "created_at": self.created_at
-        }
+    serialize_fields = ("id", "follower_id", "followed_id", "created_at")
 
 
-class User(db.Model,SerializerMixin):
+class User(db.Model, SerializableMixin):
 
     __tablename__="users"
+
+    __table_args__ = (
+        db.Index('ix_users_date_created', 'date_created', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True) 
     username = db.Column(db.String(80), unique=True, nullable=False)  
     email = db.Column(db.String(120), unique=True, nullable=False)  
@@ -48,29 +52,39 @@ class User(db.Model,SerializerMixin):
     first_name = db.Column(db.String(100), nullable=True)  
     last_name = db.Column(db.String(100), nullable=True)  
     date_created = db.Column(db.DateTime, default=db.func.now())
-    posts = db.relationship("Post", back_populates="author", cascade='all, delete-orphan')
+    # Set while a large account is being purged in the background.
+    deleted_at = db.Column(db.DateTime, nullable=True)
+
+    # Denormalized counters, kept in sync by the write handlers (see counters.py).
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Dependent rows are removed by ON DELETE CASCADE in the database;
+    # passive_deletes stops the ORM from loading them just to delete them.
+    posts = db.relationship("Post", back_populates="author", cascade='all, delete-orphan',
+                            passive_deletes=True)
 
     comments = db.relationship('Comment', back_populates='user', lazy=True) #added these line
-    followers = db.relationship("Follow", foreign_keys=[Follow.followed_id], back_populates="followed_user")
-    following = db.relationship("Follow", foreign_keys=[Follow.follower_id], back_populates="follower_user")
+    followers = db.relationship("Follow", foreign_keys=[Follow.followed_id], back_populates="followed_user",
+                                cascade='all, delete-orphan', passive_deletes=True)
+    following = db.relationship("Follow", foreign_keys=[Follow.follower_id], back_populates="follower_user",
+                                cascade='all, delete-orphan', passive_deletes=True)
 
-    profile = db.relationship("Profile", back_populates="user", uselist=False, cascade='all, delete-orphan')
-    likes = db.relationship("Like", back_populates="user", cascade='all, delete-orphan')
-    comments = db.relationship("Comment", back_populates="user", cascade="all, delete-orphan")
+    profile = db.relationship("Profile", back_populates="user", uselist=False, cascade='all, delete-orphan',
+                              passive_deletes=True)
+    likes = db.relationship("Like", back_populates="user", cascade='all, delete-orphan', passive_deletes=True)
+    comments = db.relationship("Comment", back_populates="user", cascade="all, delete-orphan",
+                               passive_deletes=True)
+
+    serialize_fields = ("id", "username", "email", "first_name", "last_name", "date_created",
+                        "follower_count", "following_count", "post_count")
 
-    serialize_rules = ("-password_hash", "-posts.author", "-profile.user")
     def __repr__(self):
         return f"<user {self.username}, {self.email}, {self.password_hash}, {self.first_name}, {self.last_name}, {self.date_created}>"
     
     def to_dict_basic(self):
-        return{
-            "id":self.id,
-            "username":self.username,
-            "email":self.email,
-            "first_name":self.first_name,
-            "last_name":self.last_name,
-            "date_created":self.date_created
-        }
+        return self.to_dict()
     
     @validates("username")
     def validate_username(self, key, username):
@@ -87,42 +101,47 @@ class User(db.Model,SerializerMixin):
         return email
         
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.verify(password, self.password_hash)
     
 
 
  
-class Post(db.Model, SerializerMixin):
+class Post(db.Model, SerializableMixin):
     __tablename__="posts"
+
+    __table_args__ = (
+        db.Index('ix_posts_created_at', 'created_at', 'id'),
+        db.Index('ix_posts_author_id_created_at', 'author_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String, nullable=False)
     body = db.Column(db.Text, nullable=False)
-    image_url = db.Column(db.String, nullable=True)
+    # An external URL, or ``media:<sha256>`` for an upload (see media.py).
+    image_url = db.Column(db.String, nullable=True, info={'variants': 'image_variants'})
     created_at = db.Column(db.DateTime, default=db.func.now())
     updated_at = db.Column(db.DateTime, default=db.func.now())
    # author_id = db.Column(db.Integer, db.ForeignKey('users.id'),back_populates="posts", nullable=False)
-    comments = db.relationship("Comment", back_populates="post", cascade='all, delete-orphan' )
-    author_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    comments = db.relationship("Comment", back_populates="post", cascade='all, delete-orphan',
+                               passive_deletes=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     author = db.relationship("User", back_populates="posts")
-    likes = db.relationship("Like", back_populates="post", cascade='all, delete-orphan')
+    likes = db.relationship("Like", back_populates="post", cascade='all, delete-orphan', passive_deletes=True)
     updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
 
+    # Denormalized counters, kept in sync by the write handlers (see counters.py).
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     def __repr__(self):
         return f'<post {self.title}, {self.body}, {self.created_at}, {self.updated_at}, {self.author_id}>'
 
-    def to_dict(self):
-        return{
-            "id":self.id,
-            "title":self.title,
-            "body":self.body,
-            "image_url": self.image_url,
-            "created_at":self.created_at,
-            "updated_at":self.updated_at,
-            "author_id":self.author_id
-        }
+    serialize_fields = ("id", "title", "body", "image_url", "created_at", "updated_at",
+                        "author_id", "like_count", "comment_count")
+
     @validates("title")
     def validate_title(self, key, title):
         if not title:
@@ -141,36 +160,58 @@ class Post(db.Model, SerializerMixin):
 
 
 
-class Comment(db.Model, SerializerMixin):
+class Comment(db.Model, SerializableMixin):
     __tablename__ = "comments"
+
+    __table_args__ = (
+        db.Index('ix_comments_post_id_path', 'post_id', 'path'),
+        db.Index('ix_comments_post_id_created_at', 'post_id', 'created_at', 'id'),
+        db.Index('ix_comments_parent_comment_id_created_at', 'parent_comment_id', 'created_at', 'id'),
+        db.Index('ix_comments_user_id', 'user_id'),
+        db.Index('ix_comments_created_at', 'created_at', 'id'),
+    )
+
+    # Width of one zero-padded id in a materialized path, e.g. a reply to
+    # comment 12 with id 34 has path "0000000012/0000000034/".
+    PATH_SEGMENT_WIDTH = 10
     
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
     
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # 👈 ADD THIS
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)  # 👈 ADD THIS
     user = db.relationship('User', back_populates='comments')  # 👈 ADD THIS
 
-    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
     post = db.relationship("Post", back_populates="comments")
     
-    parent_comment_id = db.Column(db.Integer, db.ForeignKey('comments.id'), nullable=True)
+    parent_comment_id = db.Column(db.Integer, db.ForeignKey('comments.id', ondelete='CASCADE'), nullable=True)
     parent_comment = db.relationship("Comment", remote_side=[id], back_populates="replies")
-    replies = db.relationship("Comment", back_populates="parent_comment", cascade='all, delete-orphan')
+    replies = db.relationship("Comment", back_populates="parent_comment", cascade='all, delete-orphan',
+                              passive_deletes=True)
+
+    path = db.Column(db.String, nullable=True)
+    depth = db.Column(db.Integer, nullable=False, default=0)
 
     def __repr__(self):
         return f"<Comment {self.id}, {self.body}, {self.created_at}>"
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "body": self.body,
-            "created_at": self.created_at,
-            "post_id": self.post_id,
-            "user_id": self.user_id,  # 👈 INCLUDE THIS TOO
-            "parent_comment": self.parent_comment.to_dict() if self.parent_comment else None,
-            "replies": [reply.to_dict() for reply in self.replies]
-        }
+    @classmethod
+    def path_segment(cls, comment_id):
+        return f"{comment_id:0{cls.PATH_SEGMENT_WIDTH}d}/"
+
+    @classmethod
+    def descendants_of(cls, path):
+        """Filter matching every comment strictly below ``path``.
+
+        Expressed as a range rather than LIKE so it is served by the
+        (post_id, path) index: '0' sorts right after '/', so every
+        descendant path falls between the two bounds.
+        """
+        return db.and_(cls.path > path, cls.path < path[:-1] + '0')
+
+    serialize_fields = ("id", "body", "created_at", "post_id", "user_id",
+                        "parent_comment_id", "depth")
 
     @validates("body")
     def validate_body(self, key, body):
@@ -182,15 +223,38 @@ class Comment(db.Model, SerializerMixin):
 
 
 
-class Profile(db.Model, SerializerMixin):
+@event.listens_for(Comment, 'after_insert')
+def assign_comment_path(mapper, connection, target):
+    # The path ends with the comment's own id, so it can only be written once
+    # the INSERT has assigned one; this runs inside the same flush/transaction.
+    comments = Comment.__table__
+    path = Comment.path_segment(target.id)
+    depth = 0
+    if target.parent_comment_id is not None:
+        parent = connection.execute(
+            select(comments.c.path, comments.c.depth)
+            .where(comments.c.id == target.parent_comment_id)
+        ).one()
+        path = parent.path + path
+        depth = parent.depth + 1
+
+    connection.execute(
+        comments.update().where(comments.c.id == target.id).values(path=path, depth=depth)
+    )
+    set_committed_value(target, 'path', path)
+    set_committed_value(target, 'depth', depth)
+
+
+
+class Profile(db.Model, SerializableMixin):
     __tablename__="profiles"
     id = db.Column(db.Integer, primary_key=True)
     location = db.Column(db.String, nullable=False)
-    profile_image = db.Column(db.String, nullable=False)
+    profile_image = db.Column(db.String, nullable=False, info={'variants': 'profile_image_variants'})
     website = db.Column(db.String, nullable=False)
     bio =  db.Column(db.String, nullable=False)
 
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'),unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'),unique=True, nullable=False)
     user = db.relationship("User", back_populates="profile", uselist=False)
 
     @validates("location")
@@ -212,29 +276,24 @@ class Profile(db.Model, SerializerMixin):
     def __repr__(self):
         return f"<userprofile {self.id}, {self.location}, {self.profile_image}, {self.website}, {self.bio}>"
     
-    def to_dict(self):
-        return{
-            "id":self.id,
-            "location":self.location,
-            "profile_image":self.profile_image,
-            "website":self.website,
-            "bio":self.bio,
-            "user_id":self.user_id
-        }
-
-class Like(db.Model, SerializerMixin):
+    serialize_fields = ("id", "location", "profile_image", "website", "bio", "user_id")
+
+
+class Like(db.Model, SerializableMixin):
     __tablename__="likes"
 
     __table_args__ = (
     db.UniqueConstraint('user_id', 'post_id', name='_user_post_like_uc'),
+    db.Index('ix_likes_post_id_user_id', 'post_id', 'user_id'),
+    db.Index('ix_likes_created_at', 'created_at', 'id'),
 )
 
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=db.func.now())
    # user = db.relationship("User", back_populates="likes", cascade='all, delete-orphan')
 
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
 
     user = db.relationship("User", back_populates="likes")
     post = db.relationship("Post", back_populates="likes")
@@ -242,10 +301,156 @@ class Like(db.Model, SerializerMixin):
     def __repr__(self):
         return f"<like {self.id}, {self.created_at}>"
     
-    def to_dict(self):
-        return{
-            "id":self.id,
-            "created_at":self.created_at,
-            "user_id":self.user_id,
-            "post_id":self.post_id
-        }
+    serialize_fields = ("id", "created_at", "user_id", "post_id")
+
+
+class TimelineEntry(db.Model):
+    """One post pushed into one follower's timeline (fan-out on write)."""
+    __tablename__ = "timeline_entries"
+
+    __table_args__ = (
+        db.Index('ix_timeline_entries_user_id_created_at', 'user_id', 'created_at', 'post_id'),
+        db.Index('ix_timeline_entries_user_id_author_id', 'user_id', 'author_id'),
+        db.Index('ix_timeline_entries_post_id', 'post_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # Copied from the post so a timeline page is one range scan on this table.
+    created_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<TimelineEntry user_id={self.user_id}, post_id={self.post_id}>"
+
+
+class Job(db.Model):
+    """A unit of background work, run by ``flask jobs work`` (see jobs.py)."""
+    __tablename__ = "jobs"
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at', 'id'),
+        db.Index('ix_jobs_status_finished_at', 'status', 'finished_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # pending -> running -> done, or back to pending (retry) / failed.
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    idempotency_key = db.Column(db.String(200), nullable=True, unique=True)
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+
+class RefreshToken(db.Model):
+    """One login session; only a hash of its refresh token is kept (see tokens.py)."""
+    __tablename__ = "refresh_tokens"
+
+    __table_args__ = (
+        db.Index('ix_refresh_tokens_revoked_at', 'revoked_at'),
+        db.Index('ix_refresh_tokens_user_id', 'user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Kept, revoked, when the user is deleted, so the revocation still
+    # reaches access tokens issued before the delete.
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<RefreshToken {self.id} user_id={self.user_id}>"
+
+
+class FollowSuggestion(db.Model):
+    """A precomputed "who to follow" candidate (see recommendations.py)."""
+    __tablename__ = "follow_suggestions"
+
+    __table_args__ = (
+        db.Index('ix_follow_suggestions_suggested_id', 'suggested_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    # 0 is the best candidate; a user's list is one range scan on the key.
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    suggested_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    # People the user follows who follow the candidate.
+    mutual_count = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<FollowSuggestion user_id={self.user_id} suggested_id={self.suggested_id}>"
+
+
+class PostScore(db.Model):
+    """A post's trending score, relative to the shared epoch (see trending.py)."""
+    __tablename__ = "post_scores"
+
+    __table_args__ = (
+        db.Index('ix_post_scores_score', 'score', 'post_id'),
+    )
+
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<PostScore post_id={self.post_id} score={self.score}>"
+
+
+class TrendingState(db.Model):
+    """The single row holding the epoch that ``post_scores`` are relative to."""
+    __tablename__ = "trending_state"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Unix time in seconds.
+    epoch = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<TrendingState epoch={self.epoch}>"
+
+
+class Media(db.Model):
+    """An uploaded image, stored on disk under its SHA-256 (see media.py)."""
+    __tablename__ = "media"
+
+    __table_args__ = (
+        db.Index('ix_media_uploaded_by', 'uploaded_by'),
+    )
+
+    # Hex SHA-256 of the original file.
+    id = db.Column(db.String(64), primary_key=True)
+    content_type = db.Column(db.String, nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    # Set once the resized variants have been written.
+    variants_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Media {self.id} {self.width}x{self.height}>"
+
+
+class CacheVersion(db.Model):
+    """A counter bumped whenever a commit touches the table (see cache.py)."""
+    __tablename__ = "cache_versions"
+
+    key = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<CacheVersion {self.key}={self.version}>"
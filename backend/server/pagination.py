@@ -0,0 +1,97 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import literal, tuple_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    # Timestamps are kept in the text form they are stored in on SQLite
+    # (microseconds always present, see database.py), so the keyset
+    # comparison below resumes exactly after the cursor row.
+    values = [v.strftime(TIMESTAMP_FORMAT) if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _valid_value(value, kind):
+    if isinstance(value, bool):
+        return False
+    if kind is datetime:
+        # Sent back in the stored text form, see encode_cursor().
+        try:
+            datetime.strptime(value, TIMESTAMP_FORMAT)
+        except (TypeError, ValueError):
+            return False
+        return True
+    if kind is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, kind)
+
+
+def column_types(columns):
+    """The Python type of each sort column, as ``decode_cursor`` expects."""
+    return tuple(column.type.python_type for column in columns)
+
+
+def decode_cursor(cursor, types):
+    """The sort key values in ``cursor``, one per type in ``types``.
+
+    Cursors come from clients, so every value is checked against the type of
+    its sort column (``int``, ``float``, ``str`` or ``datetime``, the latter
+    as a timestamp string) before it reaches a query.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise InvalidCursor("Invalid cursor.")
+    if not all(_valid_value(value, kind) for value, kind in zip(values, types)):
+        raise InvalidCursor("Invalid cursor.")
+    return values
+
+
+def page_limit():
+    """Read ?limit= from the request, clamped to the server maximum."""
+    default = current_app.config.get('PAGE_SIZE_DEFAULT', DEFAULT_PAGE_SIZE)
+    maximum = current_app.config.get('PAGE_SIZE_MAX', MAX_PAGE_SIZE)
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, maximum))
+
+
+def keyset_filter(columns, values, descending=False):
+    """Row-value comparison that resumes a scan right after the cursor row."""
+    bound = tuple_(*[literal(value) for value in values])
+    if descending:
+        return tuple_(*columns) < bound
+    return tuple_(*columns) > bound
+
+
+def paginate(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """Keyset-paginate ``query`` on ``columns`` (e.g. ``(created_at, id)``).
+
+    Returns the page of rows and an opaque cursor for the next page, or
+    ``None`` once the scan is exhausted.
+    """
+    if cursor:
+        query = query.filter(keyset_filter(columns, decode_cursor(cursor, column_types(columns)), descending))
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(*[getattr(last, column.key) for column in columns])
+    return rows, next_cursor
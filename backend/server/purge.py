@@ -0,0 +1,124 @@
+"""Account deletion.
+
+Dependent rows (posts, comments, likes, follows, profile, timeline entries)
+go with the user through ``ON DELETE CASCADE``, so deleting an ordinary
+account is one DELETE statement. Accounts with more than
+``USER_PURGE_INLINE_MAX`` dependent rows are instead marked deleted at once
+and emptied by a background job in chunks of ``USER_PURGE_CHUNK``, one
+transaction per chunk, so neither the request nor any single transaction
+grows with the size of the account.
+"""
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import delete, func, select, union
+
+from extensions import db
+from models import User, Post, Comment, Like, Follow
+from counters import recount_posts, recount_users
+from jobs import enqueue, job_handler
+
+DEFAULT_INLINE_MAX = 1000
+DEFAULT_CHUNK = 500
+
+
+def _limited_count(statement, cap):
+    return db.session.execute(
+        select(func.count()).select_from(statement.limit(cap).subquery())
+    ).scalar()
+
+
+def dependent_rows(user_id, cap):
+    """Rough number of rows deleting ``user_id`` removes, counted up to ``cap``."""
+    user = db.session.get(User, user_id)
+    total = user.post_count + user.follower_count + user.following_count
+    total += db.session.execute(
+        select(func.coalesce(func.sum(Post.like_count + Post.comment_count), 0))
+        .where(Post.author_id == user_id)
+    ).scalar()
+    for model in (Like, Comment):
+        if total >= cap:
+            break
+        total += _limited_count(select(model.id).where(model.user_id == user_id), cap)
+    return total
+
+
+def _touched_posts(user_id):
+    """Posts whose counters change when this user's likes and comments go."""
+    return [post_id for (post_id,) in db.session.execute(union(
+        select(Like.post_id).where(Like.user_id == user_id),
+        select(Comment.post_id).where(Comment.user_id == user_id),
+    ))]
+
+
+def _follow_counterparts(user_id):
+    return [other for (other,) in db.session.execute(union(
+        select(Follow.followed_id).where(Follow.follower_id == user_id),
+        select(Follow.follower_id).where(Follow.followed_id == user_id),
+    ))]
+
+
+def delete_user_now(user_id):
+    """Delete the user and everything hanging off it in this transaction."""
+    posts = _touched_posts(user_id)
+    users = _follow_counterparts(user_id)
+    db.session.execute(delete(User).where(User.id == user_id))
+    if posts:
+        recount_posts(posts)
+    if users:
+        recount_users(users)
+
+
+def delete_user(user_id):
+    """Delete inline, or schedule a purge for large accounts.
+
+    Returns True when the account is already gone, False when a purge was
+    scheduled.
+    """
+    cap = current_app.config.get('USER_PURGE_INLINE_MAX', DEFAULT_INLINE_MAX)
+    if dependent_rows(user_id, cap + 1) <= cap:
+        delete_user_now(user_id)
+        return True
+    db.session.execute(User.__table__.update().where(User.id == user_id)
+                       .values(deleted_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+    enqueue('users.purge', {"user_id": user_id})
+    return False
+
+
+@job_handler('users.purge')
+def purge_user(user_id):
+    """Empty a large account chunk by chunk, then delete it.
+
+    Every chunk commits on its own, so a retried job picks up where the
+    last one stopped.
+    """
+    chunk = current_app.config.get('USER_PURGE_CHUNK', DEFAULT_CHUNK)
+
+    # The user's own likes, comments and follows change other rows' counters.
+    sources = [(Like, Like.user_id, Like.post_id, recount_posts),
+               (Comment, Comment.user_id, Comment.post_id, recount_posts),
+               (Follow, Follow.follower_id, Follow.followed_id, recount_users),
+               (Follow, Follow.followed_id, Follow.follower_id, recount_users)]
+    for model, owner, counterpart, recount in sources:
+        while True:
+            rows = db.session.execute(
+                select(model.id, counterpart).where(owner == user_id).limit(chunk)
+            ).all()
+            if not rows:
+                break
+            db.session.execute(delete(model).where(model.id.in_([row[0] for row in rows])))
+            recount({row[1] for row in rows})
+            db.session.commit()
+
+    # Comments and likes on the user's posts cascade with each post, so
+    # posts go in smaller chunks.
+    while True:
+        post_ids = db.session.execute(
+            select(Post.id).where(Post.author_id == user_id).limit(max(1, chunk // 10))
+        ).scalars().all()
+        if not post_ids:
+            break
+        db.session.execute(delete(Post).where(Post.id.in_(post_ids)))
+        db.session.commit()
+
+    delete_user_now(user_id)
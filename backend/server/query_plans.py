@@ -0,0 +1,133 @@
+import re
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select, text
+
+from extensions import db
+from models import (User, Post, Comment, Like, Follow, Profile, Job, RefreshToken, FollowSuggestion,
+                    PostScore, TrendingState)
+from pagination import keyset_filter
+
+CURSOR = ('2025-01-01 00:00:00', 1)
+
+# Query shapes issued on the hot request paths. Each one must be answered
+# from an index: no full table scan and no sort of the whole result.
+HOT_QUERIES = {
+    'users page': lambda: select(User)
+        .where(keyset_filter((User.date_created, User.id), CURSOR), User.deleted_at.is_(None))
+        .order_by(User.date_created, User.id).limit(21),
+    'posts page': lambda: select(Post)
+        .where(keyset_filter((Post.created_at, Post.id), CURSOR))
+        .order_by(Post.created_at, Post.id).limit(21),
+    'posts page with authors': lambda: select(Post, User, Profile)
+        .outerjoin(User, User.id == Post.author_id)
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .where(keyset_filter((Post.created_at, Post.id), CURSOR))
+        .order_by(Post.created_at, Post.id).limit(21),
+    'feed page': lambda: select(Post)
+        .where(keyset_filter((Post.created_at, Post.id), CURSOR, descending=True))
+        .order_by(Post.created_at.desc(), Post.id.desc()).limit(21),
+    'posts by author': lambda: select(Post)
+        .where(Post.author_id == 1)
+        .order_by(Post.created_at.desc(), Post.id.desc()).limit(21),
+    'comments page': lambda: select(Comment)
+        .order_by(Comment.created_at, Comment.id).limit(21),
+    'comments of post': lambda: select(Comment)
+        .where(Comment.post_id == 1)
+        .order_by(Comment.created_at, Comment.id).limit(21),
+    'post thread': lambda: select(Comment)
+        .where(Comment.post_id == 1)
+        .order_by(Comment.path).limit(21),
+    'comment subtree': lambda: select(Comment)
+        .where(Comment.post_id == 1, Comment.descendants_of('0000000001/'))
+        .order_by(Comment.path).limit(21),
+    'comment replies': lambda: select(Comment)
+        .where(Comment.parent_comment_id == 1)
+        .order_by(Comment.created_at, Comment.id).limit(21),
+    'comments by user': lambda: select(Comment.post_id)
+        .where(Comment.user_id == 1),
+    'profile by user': lambda: select(Profile)
+        .where(Profile.user_id == 1),
+    'likes page': lambda: select(Like)
+        .order_by(Like.created_at, Like.id).limit(21),
+    'likes of post': lambda: select(func.count())
+        .select_from(Like).where(Like.post_id == 1),
+    'viewer likes': lambda: select(Like.post_id, Like.id)
+        .where(Like.user_id == 1, Like.post_id.in_([1, 2, 3])),
+    'follows page': lambda: select(Follow)
+        .order_by(Follow.created_at, Follow.id).limit(21),
+    'following of user': lambda: select(Follow)
+        .where(Follow.follower_id == 1)
+        .order_by(Follow.created_at, Follow.id).limit(21),
+    'followers of user': lambda: select(Follow)
+        .where(Follow.followed_id == 1)
+        .order_by(Follow.created_at, Follow.id).limit(21),
+    'follow pair': lambda: select(Follow)
+        .where(Follow.follower_id == 1, Follow.followed_id == 2),
+    'next due job': lambda: select(Job.id)
+        .where(Job.status == 'pending', Job.run_at <= CURSOR[0])
+        .order_by(Job.run_at, Job.id).limit(1),
+    'revoked sessions': lambda: select(RefreshToken.id)
+        .where(RefreshToken.revoked_at >= CURSOR[0]),
+    'refresh token': lambda: select(RefreshToken.id)
+        .where(RefreshToken.token_hash == 'x' * 64),
+    'follow suggestions': lambda: select(FollowSuggestion.suggested_id)
+        .where(FollowSuggestion.user_id == 1)
+        .order_by(FollowSuggestion.position).limit(20),
+    'trending posts': lambda: select(PostScore.post_id, PostScore.score, TrendingState.epoch)
+        .join(TrendingState, TrendingState.id == 1)
+        .order_by(PostScore.score.desc(), PostScore.post_id.desc()).limit(100),
+}
+
+# A bare "SCAN <table>" reads every row; "SCAN <table> USING INDEX" walks an
+# index in order and stops at the LIMIT, which is fine.
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def explain(statement):
+    """Return the EXPLAIN QUERY PLAN detail lines for ``statement``."""
+    sql = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).all()
+    return [row[-1] for row in rows]
+
+
+def plan_problems(plan):
+    problems = []
+    for detail in plan:
+        if FULL_SCAN.match(detail):
+            problems.append(f'full table scan: {detail}')
+        elif detail.startswith('USE TEMP B-TREE'):
+            problems.append(f'unindexed sort: {detail}')
+    return problems
+
+
+plans_cli = AppGroup('plans', help='Inspect query plans of the hot queries.')
+
+
+@plans_cli.command('check')
+@click.option('--verbose', '-v', is_flag=True, help='Print every plan, not just failures.')
+def check_command(verbose):
+    """Fail if any hot query falls back to a table scan (SQLite only)."""
+    if db.engine.dialect.name != 'sqlite':
+        click.echo(f'Plan check only supports SQLite, not {db.engine.dialect.name}.')
+        return
+
+    failures = 0
+    for name, build in HOT_QUERIES.items():
+        plan = explain(build())
+        problems = plan_problems(plan)
+        if problems:
+            failures += 1
+            click.echo(f'FAIL {name}')
+            for problem in problems:
+                click.echo(f'    {problem}')
+        elif verbose:
+            click.echo(f'ok   {name}')
+        if verbose or problems:
+            for detail in plan:
+                click.echo(f'       | {detail}')
+
+    click.echo(f'{len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} hot queries use an index.')
+    if failures:
+        raise SystemExit(1)
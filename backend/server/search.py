@@ -0,0 +1,102 @@
+"""Full-text search over posts, comments and users.
+
+Backed by the SQLite FTS5 tables created in the ``search index`` migration,
+which triggers keep in sync with the base tables. Results come back in
+BM25 order (best first) and are cursor-paged on ``(rank, id)``.
+"""
+import html
+import re
+
+from sqlalchemy import text
+
+from extensions import db
+from models import User, Post, Comment
+from pagination import decode_cursor, encode_cursor
+from serializers import serializer_for
+
+SEARCH_TYPES = {
+    # type: (fts table, model, highlighted columns)
+    'posts': ('posts_fts', Post, ('title', 'body')),
+    'comments': ('comments_fts', Comment, ('body',)),
+    'users': ('users_fts', User, ('username', 'first_name', 'last_name', 'bio', 'location')),
+}
+FTS_TABLES = {'posts_fts', 'comments_fts', 'users_fts'}
+MAX_QUERY_TERMS = 16
+SNIPPET_TOKENS = 24
+
+# Control characters can't occur in user text, so they are safe markers to
+# replace with <mark> once the rest of the snippet has been HTML-escaped.
+_OPEN, _CLOSE = '\x02', '\x03'
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def match_expression(q):
+    """Turn free text into a safe FTS5 query: every word must match, and the
+    last one may be a prefix (so results show up while typing)."""
+    terms = _TERM.findall(q or '')[:MAX_QUERY_TERMS]
+    if not terms:
+        raise InvalidSearch("A search query (q) is required.")
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _highlight(value):
+    if value is None:
+        return None
+    return html.escape(value).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+
+def exclude_search_tables(obj, name, type_, reflected, compare_to):
+    """Alembic ``include_object`` hook: the FTS tables (and their shadow
+    tables) are managed by raw SQL, so autogenerate must not drop them."""
+    return not (type_ == 'table' and (name in FTS_TABLES or name.rsplit('_', 1)[0] in FTS_TABLES))
+
+
+def search(q, kind='posts', cursor=None, limit=20):
+    """Return one page of ``{"items", "next_cursor"}`` for a search."""
+    if kind not in SEARCH_TYPES:
+        raise InvalidSearch(f"type must be one of: {', '.join(SEARCH_TYPES)}.")
+    table, model, columns = SEARCH_TYPES[kind]
+    params = {'match': match_expression(q), 'limit': limit + 1,
+              'open': _OPEN, 'close': _CLOSE, 'tokens': SNIPPET_TOKENS}
+
+    # snippet() trims long text around the matches; short columns (titles,
+    # names) fit within SNIPPET_TOKENS and come back whole.
+    highlights = ', '.join(
+        f"snippet({table}, {index}, :open, :close, '…', :tokens) AS {column}"
+        for index, column in enumerate(columns)
+    )
+    where = f"{table} MATCH :match"
+    if cursor:
+        params['after_rank'], params['after_id'] = decode_cursor(cursor, (float, int))
+        where += " AND (rank, rowid) > (:after_rank, :after_id)"
+    hits = db.session.execute(text(
+        f"SELECT rowid AS id, rank, {highlights} FROM {table} "
+        f"WHERE {where} ORDER BY rank, rowid LIMIT :limit"
+    ), params).mappings().all()
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_cursor(hits[-1]['rank'], hits[-1]['id'])
+
+    serializer = serializer_for(model)
+    query = serializer.query().filter(model.id.in_([hit['id'] for hit in hits]))
+    if model is User:
+        # Accounts being purged (see purge.py) are hidden at once.
+        query = query.filter(User.deleted_at.is_(None))
+    rows = {row.id: serializer.row(row) for row in query}
+    items = []
+    for hit in hits:
+        item = rows.get(hit['id'])
+        if item is None:
+            continue
+        item['rank'] = hit['rank']
+        item['highlights'] = {column: _highlight(hit[column]) for column in columns}
+        items.append(item)
+    return {"items": items, "next_cursor": next_cursor}
@@ -1,17 +1,14 @@
 from app import app
 from extensions import db
 from models import User, Post, Comment, Profile, Follow, Like
+from datagen import clear
+from counters import recount_posts, recount_users
 
 def seed_database():
     with app.app_context():
         print("Deleting all records...")
-        # Clear all tables in reverse order of dependency
-        Like.query.delete()
-        Comment.query.delete()
-        Post.query.delete()
-        Follow.query.delete()
-        Profile.query.delete()
-        User.query.delete()
+        # One DELETE per table, children first.
+        clear()
 
         print("Creating users...")
         # Create users
@@ -136,6 +133,10 @@ def seed_database():
             Like(user_id=users[2].id, post_id=posts[0].id)
         ]
         db.session.add_all(likes)
+        # The rows above were added through the ORM, which doesn't maintain
+        # the denormalized counters; fill them in from the data.
+        recount_posts()
+        recount_users()
         db.session.commit()
 
         print("Database seeded successfully!")
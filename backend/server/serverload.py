@@ -0,0 +1,193 @@
+"""Compare the WSGI and ASGI servers at increasing client concurrency.
+
+Each server is started as a subprocess on a free port, against the same
+configured database: the WSGI app (app.py) on Flask's threaded server, one
+thread per connection, and the ASGI app (asgi.py) on uvicorn's event loop.
+An asyncio client then holds ``concurrency`` keep-alive connections open and
+sends a read-heavy mix with some logins over them, until ``requests``
+requests have been answered. Both servers run in one process, so the numbers
+show how each copes with many requests in flight rather than how far it can
+be scaled out.
+
+The database should hold a generated dataset (``flask data generate``),
+whose users all have ``datagen.PASSWORD`` as their password.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from datagen import PASSWORD
+from loadtest import Targets, percentile
+
+SERVERS = {
+    'wsgi': lambda port: [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port),
+                          '--with-threads', '--no-reload', '--no-debugger'],
+    'asgi': lambda port: [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+                          '--no-access-log', '--log-level', 'warning'],
+}
+HOST = '127.0.0.1'
+STARTUP_TIMEOUT = 30
+REQUEST_TIMEOUT = 60
+
+# (weight, endpoint, request builder); a builder returns (method, path, body).
+MIX = [
+    (35, 'GET /posts', lambda t: ('GET', '/posts', None)),
+    (25, 'GET /feed', lambda t: ('GET', f'/feed?user_id={t.user()}', None)),
+    (20, 'GET /posts/<id>', lambda t: ('GET', f'/posts/{t.post()}', None)),
+    (15, 'GET /posts/<id>/comments', lambda t: ('GET', f'/posts/{t.post()}/comments', None)),
+    (5, 'POST /login', lambda t: ('POST', '/login', {
+        "email": f"user{t.user()}@example.com", "password": PASSWORD})),
+]
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind((HOST, 0))
+        return probe.getsockname()[1]
+
+
+def _wait_until_listening(process, port):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode} while starting.")
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start listening on port {port}.")
+
+
+def start_server(kind):
+    """Start a ``SERVERS`` entry from this directory; returns ``(process, port)``."""
+    port = _free_port()
+    process = subprocess.Popen(SERVERS[kind](port), cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_until_listening(process, port)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    return process, port
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def _request(reader, writer, method, path, body):
+    """Send one request and read its response; returns ``(status, keep_alive)``."""
+    payload = json.dumps(body).encode() if body is not None else b''
+    head = f"{method} {path} HTTP/1.1\r\nHost: {HOST}\r\nContent-Length: {len(payload)}\r\n"
+    if body is not None:
+        head += "Content-Type: application/json\r\n"
+    writer.write(head.encode('latin-1') + b"\r\n" + payload)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Server closed the connection.")
+    status = int(status_line.split()[1])
+    length, keep_alive = None, True
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value == 'close':
+            keep_alive = False
+    if length is None:
+        await reader.read()
+        return status, False
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def _connection(port, seed, maxima, remaining, samples):
+    rng = random.Random(seed)
+    targets = Targets(rng, *maxima)
+    weights = [weight for weight, _, _ in MIX]
+    reader = writer = None
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        _, endpoint, build = rng.choices(MIX, weights=weights)[0]
+        method, path, body = build(targets)
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(HOST, port)
+            status, keep_alive = await asyncio.wait_for(
+                _request(reader, writer, method, path, body), REQUEST_TIMEOUT)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            status, keep_alive = None, False
+        samples.append((endpoint, status, time.perf_counter() - started))
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _drive(port, concurrency, requests, maxima, seed):
+    remaining, samples = [requests], []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _connection(port, seed + n, maxima, remaining, samples)
+        for n in range(concurrency)
+    ))
+    return samples, time.perf_counter() - started
+
+
+def _summary(samples, duration):
+    timings = sorted(elapsed for _, _, elapsed in samples)
+    logins = sorted(elapsed for endpoint, _, elapsed in samples if endpoint == 'POST /login')
+    return {
+        "requests": len(samples),
+        # 503s: the password pool turning logins away (see hashing.py).
+        "busy": sum(1 for _, status, _ in samples if status == 503),
+        "errors": sum(1 for _, status, _ in samples if status is None or (status >= 500 and status != 503)),
+        "throughput_rps": round(len(samples) / duration, 2),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "login_p99_ms": round(percentile(logins, 99) * 1000, 3) if logins else None,
+    }
+
+
+def run(maxima, servers=('wsgi', 'asgi'), levels=(1, 16, 64, 256), requests=2000, warmup=100,
+        seed=0, echo=None):
+    """Run every server at every concurrency level; returns the report.
+
+    ``maxima`` is the highest user, post and comment id in the database.
+    """
+    results = {}
+    for kind in servers:
+        process, port = start_server(kind)
+        try:
+            asyncio.run(_drive(port, min(warmup, 16), warmup, maxima, seed - 1))
+            results[kind] = {}
+            for level in levels:
+                samples, duration = asyncio.run(_drive(port, level, max(requests, level), maxima, seed))
+                results[kind][level] = _summary(samples, duration)
+                if echo is not None:
+                    stats = results[kind][level]
+                    echo(f"  {kind:5} c={level:<4} {stats['throughput_rps']:9.1f} requests/s"
+                         f"  p50={stats['p50_ms']:9.2f} ms  p99={stats['p99_ms']:9.2f} ms"
+                         f"  busy={stats['busy']}  errors={stats['errors']}")
+        finally:
+            stop_server(process)
+    return {
+        "settings": {"levels": list(levels), "requests": requests, "warmup": warmup, "seed": seed},
+        "servers": results,
+    }
@@ -0,0 +1,45 @@
+from collections import defaultdict, deque
+
+from pagination import encode_cursor
+
+DEFAULT_THREAD_DEPTH = 5
+DEFAULT_REPLIES_LIMIT = 10
+
+
+def build_thread(comments, roots, max_depth=DEFAULT_THREAD_DEPTH, replies_limit=DEFAULT_REPLIES_LIMIT):
+    """Link already-loaded comments into a tree without touching the ORM.
+
+    ``comments`` must be ordered by ``(created_at, id)`` and contain the
+    descendants of ``roots`` down to one level past ``max_depth``, so nodes at
+    the cut-off still know how many replies they have. Each comment is
+    serialized exactly once. Nodes
+    below ``max_depth`` reply levels, or past the first ``replies_limit``
+    replies of their parent, are left out; their parent sets
+    ``has_more_replies`` and a ``next_replies_cursor`` to continue from with
+    ``GET /comments/<id>/replies``.
+    """
+    children = defaultdict(list)
+    for comment in comments:
+        children[comment.parent_comment_id].append(comment)
+
+    tree = []
+    # Walk breadth-first with an explicit queue so deep threads can't hit
+    # the interpreter's recursion limit.
+    queue = deque((root, 0, tree) for root in roots)
+    while queue:
+        comment, depth, siblings = queue.popleft()
+        node = comment.to_dict()
+        replies = children.get(comment.id, [])
+        shown = replies[:replies_limit] if depth < max_depth else []
+
+        node["reply_count"] = len(replies)
+        node["has_more_replies"] = len(shown) < len(replies)
+        node["next_replies_cursor"] = None
+        if node["has_more_replies"] and shown:
+            node["next_replies_cursor"] = encode_cursor(shown[-1].created_at, shown[-1].id)
+        node["replies"] = []
+        siblings.append(node)
+
+        for reply in shown:
+            queue.append((reply, depth + 1, node["replies"]))
+    return tree
@@ -0,0 +1,153 @@
+"""Followed-user timelines.
+
+With ``TIMELINE_FANOUT`` enabled, ``create_post`` pushes each new post into a
+``timeline_entries`` row per follower, so reading a timeline is one range scan
+on ``(user_id, created_at, post_id)``. Authors with more than
+``TIMELINE_FANOUT_MAX_FOLLOWERS`` followers are not fanned out; their posts
+are pulled at read time and merged in, which keeps a single post from
+writing millions of rows. With fan-out disabled every followed author is
+pulled at read time.
+
+Fan-out and backfill run as background jobs (jobs.py), so the request that
+creates a post or a follow only writes that one row. Entries of deleted
+posts and users go with them through ``ON DELETE CASCADE``.
+"""
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, literal, select
+
+from extensions import db
+from jobs import enqueue, job_handler
+from models import User, Post, Follow, TimelineEntry
+from pagination import decode_cursor, encode_cursor, keyset_filter
+
+DEFAULT_MAX_FOLLOWERS = 10000
+DEFAULT_BACKFILL = 20
+
+
+def fanout_enabled():
+    return current_app.config.get('TIMELINE_FANOUT', False)
+
+
+def _max_followers():
+    return current_app.config.get('TIMELINE_FANOUT_MAX_FOLLOWERS', DEFAULT_MAX_FOLLOWERS)
+
+
+def schedule_fan_out(post_id):
+    if fanout_enabled():
+        enqueue('timeline.fan_out_post', {"post_id": post_id})
+
+
+def schedule_backfill(follower_id, followed_id):
+    if fanout_enabled():
+        enqueue('timeline.backfill_follow', {"follower_id": follower_id, "followed_id": followed_id})
+
+
+@job_handler('timeline.fan_out_post')
+def fan_out_post(post_id):
+    """Push a post into its author's followers' timelines."""
+    if not fanout_enabled():
+        return 0
+    rows = (select(Follow.follower_id, Post.id, Post.author_id, Post.created_at)
+            .join(Post, Post.author_id == Follow.followed_id)
+            .join(User, User.id == Post.author_id)
+            .where(Post.id == post_id, User.follower_count <= _max_followers()))
+    # OR IGNORE keeps a retried job from failing on rows it already wrote.
+    statement = (insert(TimelineEntry)
+                 .from_select(['user_id', 'post_id', 'author_id', 'created_at'], rows)
+                 .prefix_with('OR IGNORE', dialect='sqlite'))
+    return db.session.execute(statement).rowcount
+
+
+@job_handler('timeline.backfill_follow')
+def backfill_follow(follower_id, followed_id):
+    """Seed a new follower's timeline with the followed user's latest posts."""
+    if not fanout_enabled():
+        return 0
+    limit = current_app.config.get('TIMELINE_BACKFILL', DEFAULT_BACKFILL)
+    rows = (select(literal(follower_id), Post.id, Post.author_id, Post.created_at)
+            .join(User, User.id == Post.author_id)
+            .where(Post.author_id == followed_id, User.follower_count <= _max_followers())
+            .order_by(Post.created_at.desc(), Post.id.desc())
+            .limit(limit))
+    statement = (insert(TimelineEntry)
+                 .from_select(['user_id', 'post_id', 'author_id', 'created_at'], rows)
+                 .prefix_with('OR IGNORE', dialect='sqlite'))
+    return db.session.execute(statement).rowcount
+
+
+def retract_follow(follower_id, followed_id):
+    db.session.execute(delete(TimelineEntry).where(TimelineEntry.user_id == follower_id,
+                                                   TimelineEntry.author_id == followed_id))
+
+
+def read_timeline(user_id, cursor=None, limit=20):
+    """Return ``(post ids, next cursor)`` for one page of a user's timeline.
+
+    Pushed entries and pulled posts are both ordered by the post's
+    ``(created_at, id)``, newest first, so they merge on the same cursor.
+    """
+    position = decode_cursor(cursor, (datetime, int)) if cursor else None
+
+    candidates = []
+    if fanout_enabled():
+        pushed = (select(TimelineEntry.created_at, TimelineEntry.post_id)
+                  .where(TimelineEntry.user_id == user_id))
+        if position:
+            pushed = pushed.where(keyset_filter((TimelineEntry.created_at, TimelineEntry.post_id),
+                                                position, descending=True))
+        pushed = pushed.order_by(TimelineEntry.created_at.desc(),
+                                 TimelineEntry.post_id.desc()).limit(limit + 1)
+        candidates.extend(db.session.execute(pushed).all())
+
+        pulled_authors = (select(Follow.followed_id)
+                          .join(User, User.id == Follow.followed_id)
+                          .where(Follow.follower_id == user_id,
+                                 User.follower_count > _max_followers()))
+    else:
+        pulled_authors = select(Follow.followed_id).where(Follow.follower_id == user_id)
+
+    # The user's own posts are always read from the posts table.
+    pulled = select(Post.created_at, Post.id).where(
+        db.or_(Post.author_id == user_id, Post.author_id.in_(pulled_authors))
+    )
+    if position:
+        pulled = pulled.where(keyset_filter((Post.created_at, Post.id), position, descending=True))
+    pulled = pulled.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit + 1)
+    candidates.extend(db.session.execute(pulled).all())
+
+    # An author who crossed the fan-out threshold can appear in both sources.
+    merged = sorted({tuple(row) for row in candidates}, reverse=True)
+    next_cursor = None
+    if len(merged) > limit:
+        merged = merged[:limit]
+        next_cursor = encode_cursor(*merged[-1])
+    return [post_id for _, post_id in merged], next_cursor
+
+
+timeline_cli = AppGroup('timeline', help='Maintain fan-out-on-write timelines.')
+
+
+@timeline_cli.command('rebuild')
+def rebuild_command():
+    """Refill every timeline, e.g. after turning TIMELINE_FANOUT on."""
+    limit = current_app.config.get('TIMELINE_BACKFILL', DEFAULT_BACKFILL)
+    ranked = select(
+        Post.id, Post.author_id, Post.created_at,
+        func.row_number().over(partition_by=Post.author_id,
+                               order_by=(Post.created_at.desc(), Post.id.desc())).label('position')
+    ).subquery()
+    rows = (select(Follow.follower_id, ranked.c.id, ranked.c.author_id, ranked.c.created_at)
+            .join(ranked, ranked.c.author_id == Follow.followed_id)
+            .join(User, User.id == Follow.followed_id)
+            .where(ranked.c.position <= limit, User.follower_count <= _max_followers()))
+
+    db.session.execute(delete(TimelineEntry))
+    result = db.session.execute(
+        insert(TimelineEntry).from_select(['user_id', 'post_id', 'author_id', 'created_at'], rows)
+    )
+    db.session.commit()
+    click.echo(f"Wrote {result.rowcount} timeline entries.")
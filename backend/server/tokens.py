@@ -0,0 +1,230 @@
+"""Access and refresh tokens.
+
+An access token is ``<payload>.<signature>``: base64url JSON claims (user
+id, session id, expiry) signed with HMAC-SHA256 under ``SECRET_KEY``. It is
+checked locally, without a database round trip, so ``@require_auth`` costs
+nothing per request beyond the HMAC.
+
+A refresh token is an opaque random string. Only its SHA-256 is stored, in
+``refresh_tokens``, one row per login session, and it is swapped for a new
+one every time it is used. Logging out revokes the session. Its access
+tokens stay cryptographically valid until they expire, so every process
+keeps an in-memory list of recently revoked sessions, reloaded at most every
+``REVOCATION_CACHE_TTL`` seconds, and rejects tokens from those.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+import click
+from flask import current_app, g, jsonify, request
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import RefreshToken
+
+DEFAULT_ACCESS_TOKEN_TTL = 15 * 60
+DEFAULT_REFRESH_TOKEN_TTL = 30 * 24 * 3600
+DEFAULT_REVOCATION_CACHE_TTL = 5
+
+CurrentUser = namedtuple('CurrentUser', ['id', 'session_id'])
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default)
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _signature(payload):
+    key = current_app.config['SECRET_KEY'].encode('utf-8')
+    return _b64encode(hmac.new(key, payload.encode('ascii'), hashlib.sha256).digest())
+
+
+def _hash_refresh_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_access_token(user_id, session_id):
+    claims = {"sub": user_id, "sid": session_id,
+              "exp": int(time.time()) + _setting('ACCESS_TOKEN_TTL', DEFAULT_ACCESS_TOKEN_TTL)}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return f"{payload}.{_signature(payload)}"
+
+
+def verify_access_token(token):
+    """Return the token's claims, or raise ``InvalidToken``."""
+    payload, _, signature = token.partition('.')
+    try:
+        if not payload or not hmac.compare_digest(signature, _signature(payload)):
+            raise InvalidToken("Invalid access token.")
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        raise InvalidToken("Invalid access token.")
+    if claims.get('exp', 0) < time.time():
+        raise InvalidToken("Access token has expired.")
+    return claims
+
+
+def _token_response(user_id, session_id, refresh_token):
+    return {
+        "access_token": issue_access_token(user_id, session_id),
+        "refresh_token": refresh_token,
+        "token_type": "Bearer",
+        "expires_in": _setting('ACCESS_TOKEN_TTL', DEFAULT_ACCESS_TOKEN_TTL),
+    }
+
+
+def start_session(user_id):
+    """Create a login session in the current transaction; returns its tokens."""
+    refresh_token = secrets.token_urlsafe(32)
+    session = RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_refresh_token(refresh_token),
+        expires_at=_now() + timedelta(seconds=_setting('REFRESH_TOKEN_TTL', DEFAULT_REFRESH_TOKEN_TTL)),
+    )
+    db.session.add(session)
+    db.session.flush()
+    return _token_response(user_id, session.id, refresh_token)
+
+
+def refresh_session(refresh_token):
+    """Swap a refresh token for a new pair of tokens on the same session."""
+    new_token = secrets.token_urlsafe(32)
+    session = db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.token_hash == _hash_refresh_token(refresh_token),
+               RefreshToken.revoked_at.is_(None),
+               RefreshToken.expires_at > _now())
+        .values(token_hash=_hash_refresh_token(new_token),
+                expires_at=_now() + timedelta(seconds=_setting('REFRESH_TOKEN_TTL',
+                                                               DEFAULT_REFRESH_TOKEN_TTL)))
+        .returning(RefreshToken.id, RefreshToken.user_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if session is None:
+        raise InvalidToken("Invalid or expired refresh token.")
+    return _token_response(session.user_id, session.id, new_token)
+
+
+def revoke_sessions(*criteria):
+    """Revoke the sessions matching ``criteria`` in the current transaction."""
+    revoked = db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.revoked_at.is_(None), *criteria)
+        .values(revoked_at=_now())
+        .returning(RefreshToken.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    # Rejected locally once the transaction commits, see _on_commit().
+    db.session.info.setdefault('revoked_sessions', set()).update(revoked)
+    return revoked
+
+
+class RevocationList:
+    """Ids of sessions revoked within the last access token lifetime.
+
+    Sessions revoked earlier have no live access tokens left, so the list
+    stays small. Revocations made by this process show up immediately, those
+    made by other processes after at most ``REVOCATION_CACHE_TTL`` seconds.
+    """
+
+    def __init__(self):
+        self._ids = frozenset()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, session_id):
+        ttl = _setting('REVOCATION_CACHE_TTL', DEFAULT_REVOCATION_CACHE_TTL)
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > ttl:
+            self.reload()
+        return session_id in self._ids
+
+    def reload(self):
+        cutoff = _now() - timedelta(seconds=_setting('ACCESS_TOKEN_TTL', DEFAULT_ACCESS_TOKEN_TTL))
+        ids = db.session.execute(
+            select(RefreshToken.id).where(RefreshToken.revoked_at >= cutoff)
+        ).scalars().all()
+        with self._lock:
+            self._ids = frozenset(ids)
+            self._loaded_at = time.monotonic()
+
+    def add(self, session_ids):
+        with self._lock:
+            self._ids = self._ids | set(session_ids)
+
+
+revocations = RevocationList()
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    revoked = session.info.pop('revoked_sessions', None)
+    if revoked:
+        revocations.add(revoked)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _on_rollback(session, previous_transaction):
+    session.info.pop('revoked_sessions', None)
+
+
+def require_auth(view):
+    """Reject the request unless it carries a valid ``Authorization: Bearer``
+    access token; the view gets the caller as ``current_user``."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        try:
+            if scheme.lower() != 'bearer' or not token:
+                raise InvalidToken("Authentication required.")
+            claims = verify_access_token(token.strip())
+            if claims['sid'] in revocations:
+                raise InvalidToken("Session has been revoked.")
+        except InvalidToken as e:
+            # A Response rather than a tuple, so Flask-RESTful resources can
+            # use the decorator too.
+            response = jsonify({"error": str(e)})
+            response.status_code = 401
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response
+        g.current_user = CurrentUser(claims['sub'], claims['sid'])
+        return view(*args, current_user=g.current_user, **kwargs)
+    return wrapper
+
+
+tokens_cli = AppGroup('tokens', help='Maintain login sessions.')
+
+
+@tokens_cli.command('purge')
+def purge_command():
+    """Delete expired sessions and revoked ones whose access tokens have expired."""
+    cutoff = _now() - timedelta(seconds=_setting('ACCESS_TOKEN_TTL', DEFAULT_ACCESS_TOKEN_TTL))
+    result = db.session.execute(delete(RefreshToken).where(
+        (RefreshToken.expires_at < _now()) | (RefreshToken.revoked_at < cutoff)
+    ))
+    db.session.commit()
+    click.echo(f"Deleted {result.rowcount} sessions.")
@@ -0,0 +1,228 @@
+"""Trending posts: likes and comments with exponential time decay.
+
+Scores use forward decay. An event of weight ``w`` at time ``t`` adds
+``w * 2 ** ((t - epoch) / TRENDING_HALF_LIFE)`` to its post's row in
+``post_scores``, where ``epoch`` is shared by every row (``trending_state``).
+A post's score now is its stored score times ``2 ** (-(now - epoch) /
+half_life)``. That factor is the same for every post, so the stored scores
+keep their order as time passes: likes, unlikes and comments each add one
+upsert, and ``GET /posts/trending`` reads an index on ``score``.
+
+Stored scores double every half-life past the epoch and overflow a float
+after about a thousand, so a periodic compaction (``flask trending
+compact``, or the ``trending.compact`` job every
+``TRENDING_COMPACT_INTERVAL`` seconds once scheduled) moves the epoch up to
+now, scales every score down to match and drops the posts whose score has
+decayed below ``TRENDING_MIN_SCORE``. Should the schedule lapse, ``record``
+queues a compaction itself once events land more than
+``TRENDING_REBASE_AFTER`` half-lives past the epoch; it needs the job
+worker (or ``JOBS_EAGER``) to run.
+
+Each process keeps the top ``TRENDING_TOP_N`` posts in memory and reloads
+them at most every ``TRENDING_CACHE_TTL`` seconds.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+
+from extensions import db
+from jobs import enqueue_periodic, job_handler
+from models import Comment, Like, PostScore, TrendingState
+
+DEFAULT_HALF_LIFE = 6 * 3600
+DEFAULT_LIKE_WEIGHT = 1.0
+DEFAULT_COMMENT_WEIGHT = 3.0
+DEFAULT_MIN_SCORE = 0.01
+DEFAULT_COMPACT_INTERVAL = 3600
+DEFAULT_REBASE_AFTER = 100
+DEFAULT_TOP_N = 100
+DEFAULT_CACHE_TTL = 10
+# Floats overflow at 2 ** 1024; the cap leaves room for scores to add up.
+MAX_EXPONENT = 900
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default)
+
+
+def _half_life():
+    return _setting('TRENDING_HALF_LIFE', DEFAULT_HALF_LIFE)
+
+
+def like_weight():
+    return _setting('TRENDING_LIKE_WEIGHT', DEFAULT_LIKE_WEIGHT)
+
+
+def comment_weight():
+    return _setting('TRENDING_COMMENT_WEIGHT', DEFAULT_COMMENT_WEIGHT)
+
+
+def timestamp(value):
+    """Unix time of a naive UTC datetime from the database."""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _epoch():
+    return db.session.execute(select(TrendingState.epoch).where(TrendingState.id == 1)).scalar_one()
+
+
+def _upsert(dialect):
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(PostScore.__table__)
+
+
+def record(events):
+    """Add ``(post_id, weight, unix_time)`` events to the current transaction.
+
+    One executemany upsert; the epoch is read inside the statement, so a
+    compaction running at the same time can't skew it. Events more than
+    ``TRENDING_REBASE_AFTER`` half-lives past the epoch queue a compaction
+    first, and the exponent is capped so a lapsed compaction can't overflow
+    the scores.
+    """
+    if not events:
+        return
+    latest = max(at for _, _, at in events)
+    if (latest - _epoch()) / _half_life() > _setting('TRENDING_REBASE_AFTER', DEFAULT_REBASE_AFTER):
+        schedule()
+
+    epoch = select(TrendingState.epoch).where(TrendingState.id == 1).scalar_subquery()
+    exponent = (bindparam('at') - epoch) / _half_life()
+    statement = _upsert(db.session.get_bind().dialect.name).values(
+        post_id=bindparam('post_id'),
+        score=bindparam('weight') * func.power(2.0, case((exponent > MAX_EXPONENT, MAX_EXPONENT),
+                                                         else_=exponent)),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=['post_id'],
+        set_={'score': PostScore.__table__.c.score + statement.excluded.score},
+    )
+    db.session.execute(statement, [{"post_id": post_id, "weight": weight, "at": at}
+                                   for post_id, weight, at in events])
+
+
+def compact():
+    """Move the epoch to now and drop posts that have decayed away."""
+    now = time.time()
+    factor = 2.0 ** (-(now - _epoch()) / _half_life())
+    db.session.execute(update(PostScore).values(score=PostScore.score * factor)
+                       .execution_options(synchronize_session=False))
+    dropped = db.session.execute(
+        delete(PostScore).where(PostScore.score < _setting('TRENDING_MIN_SCORE', DEFAULT_MIN_SCORE))
+    ).rowcount
+    db.session.execute(update(TrendingState).where(TrendingState.id == 1).values(epoch=now))
+    return dropped
+
+
+def rebuild(days=7):
+    """Recompute every score from the last ``days`` of likes and comments."""
+    now = time.time()
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    half_life = _half_life()
+    scores = defaultdict(float)
+    for model, weight in ((Like, like_weight()), (Comment, comment_weight())):
+        rows = db.session.execute(select(model.post_id, model.created_at)
+                                  .where(model.created_at >= since)
+                                  .execution_options(yield_per=10000))
+        for post_id, created_at in rows:
+            scores[post_id] += weight * 2.0 ** ((timestamp(created_at) - now) / half_life)
+
+    minimum = _setting('TRENDING_MIN_SCORE', DEFAULT_MIN_SCORE)
+    db.session.execute(delete(PostScore))
+    rows = [{"post_id": post_id, "score": score} for post_id, score in scores.items() if score >= minimum]
+    if rows:
+        db.session.execute(insert(PostScore), rows)
+    db.session.execute(update(TrendingState).where(TrendingState.id == 1).values(epoch=now))
+    return len(rows)
+
+
+class TopPosts:
+    """The highest-scoring posts, with their current scores, per process."""
+
+    def __init__(self):
+        self._entries = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        ttl = _setting('TRENDING_CACHE_TTL', DEFAULT_CACHE_TTL)
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > ttl:
+            self.reload()
+        return self._entries
+
+    def reload(self):
+        rows = db.session.execute(
+            select(PostScore.post_id, PostScore.score, TrendingState.epoch)
+            .join(TrendingState, TrendingState.id == 1)
+            .order_by(PostScore.score.desc(), PostScore.post_id.desc())
+            .limit(_setting('TRENDING_TOP_N', DEFAULT_TOP_N))
+        ).all()
+        now = time.time()
+        minimum = _setting('TRENDING_MIN_SCORE', DEFAULT_MIN_SCORE)
+        entries = []
+        for post_id, score, epoch in rows:
+            current = score * 2.0 ** (-(now - epoch) / _half_life())
+            if current >= minimum:
+                entries.append((post_id, current))
+        with self._lock:
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+
+
+top_posts = TopPosts()
+
+
+def schedule(delay=0):
+    return enqueue_periodic('trending.compact',
+                            _setting('TRENDING_COMPACT_INTERVAL', DEFAULT_COMPACT_INTERVAL), delay)
+
+
+@job_handler('trending.compact')
+def compact_job():
+    compact()
+    schedule(delay=_setting('TRENDING_COMPACT_INTERVAL', DEFAULT_COMPACT_INTERVAL))
+
+
+trending_cli = AppGroup('trending', help='Maintain trending post scores. Run `schedule` once, with '
+                        'the job worker running, so stored scores are compacted before '
+                        'they overflow.')
+
+
+@trending_cli.command('compact')
+def compact_command():
+    """Rebase scores on the current time and drop decayed posts."""
+    dropped = compact()
+    db.session.commit()
+    click.echo(f"Dropped {dropped} decayed posts.")
+
+
+@trending_cli.command('rebuild')
+@click.option('--days', default=7, show_default=True, help='Days of likes and comments to count.')
+def rebuild_command(days):
+    """Recompute every score from recent likes and comments."""
+    scored = rebuild(days)
+    db.session.commit()
+    click.echo(f"Scored {scored} posts.")
+
+
+@trending_cli.command('schedule')
+def schedule_command():
+    """Queue a compaction now; each one queues the next.
+
+    Needed once per database: stored scores overflow after about a thousand
+    half-lives without compaction. Scoring also queues one by itself past
+    TRENDING_REBASE_AFTER half-lives, but only the job worker runs it.
+    """
+    job_id = schedule()
+    db.session.commit()
+    click.echo(f"Queued job {job_id}." if job_id else "No job queued: one is already due this interval, "
+                                                       "or JOBS_EAGER ran it inline.")
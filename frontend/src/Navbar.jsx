@@ -1,13 +1,18 @@
 import React, { useState } from "react";
 import { Link, useNavigate } from "react-router-dom";
+import { authFetch, clearTokens } from "./auth";
 
 const Navbar = () => {
   const navigate = useNavigate();
   const [activeLink, setActiveLink] = useState("dashboard");
 
-  const handleLogout = () => {
-    sessionStorage.removeItem("userId");
-    navigate("/login");
+  const handleLogout = async () => {
+    try {
+      await authFetch("https://pixi-fy.onrender.com/logout", { method: "POST" });
+    } finally {
+      clearTokens();
+      navigate("/login");
+    }
   };
 
   return (
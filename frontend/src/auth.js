@@ -0,0 +1,44 @@
+// Access and refresh tokens from /login, kept for the browser session.
+const API = "https://pixi-fy.onrender.com";
+
+export const saveTokens = (data) => {
+  sessionStorage.setItem("accessToken", data.access_token);
+  sessionStorage.setItem("refreshToken", data.refresh_token);
+};
+
+export const clearTokens = () => {
+  sessionStorage.removeItem("accessToken");
+  sessionStorage.removeItem("refreshToken");
+  sessionStorage.removeItem("userId");
+};
+
+const refreshTokens = async () => {
+  const refreshToken = sessionStorage.getItem("refreshToken");
+  if (!refreshToken) return false;
+  const res = await fetch(`${API}/token/refresh`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ refresh_token: refreshToken }),
+  });
+  if (!res.ok) return false;
+  saveTokens(await res.json());
+  return true;
+};
+
+// fetch() with the access token attached. An expired token is refreshed
+// once and the request retried.
+export const authFetch = async (url, options = {}) => {
+  const send = () =>
+    fetch(url, {
+      ...options,
+      headers: {
+        ...options.headers,
+        Authorization: `Bearer ${sessionStorage.getItem("accessToken")}`,
+      },
+    });
+  const res = await send();
+  if (res.status === 401 && (await refreshTokens())) {
+    return send();
+  }
+  return res;
+};
@@ -8,7 +8,7 @@ const Follows = () => {
   useEffect(() => {
     fetch("http://127.0.0.1:5000/follows")
       .then((res) => res.json())
-      .then((data) => setFollows(data))
+      .then((data) => setFollows(data.items))
       .catch((error) => console.error("Error fetching follows:", error));
   }, []);
 
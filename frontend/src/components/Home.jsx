@@ -3,6 +3,7 @@ import { Link } from "react-router-dom";
 import Navbar from "../Navbar";
 import { formatDistanceToNow } from "date-fns";
 import { ToastContainer, toast } from "react-toastify";
+import { authFetch } from "../auth";
 
 const Home = () => {
   const [posts, setPosts] = useState([]);
@@ -11,86 +12,41 @@ const Home = () => {
   // For comment handling: track which posts have their comments expanded and the new comment input text
   const [expandedComments, setExpandedComments] = useState({});
   const [commentInputs, setCommentInputs] = useState({});
+  const [nextCursor, setNextCursor] = useState(null);
 
   // Assume that the session storage directly contains the user id
   const storedUserId = sessionStorage.getItem("userId");
   const currentUserId = storedUserId ? parseInt(storedUserId, 10) : null;
 
+  // The feed endpoint returns posts with author, profile, counts and the
+  // current user's like/follow state already attached.
+  const toFeedPost = (post) => ({
+    ...post,
+    likesCount: post.like_count,
+    isLiked: post.liked_by_viewer,
+    likeId: post.viewer_like_id,
+    commentsCount: post.comment_count,
+    comments: null,
+    isFollowing: post.following_author,
+    followersCount: post.author?.follower_count || 0,
+    createdAt: new Date(post.created_at),
+  });
+
+  const fetchFeed = async (cursor = null) => {
+    const params = new URLSearchParams();
+    if (currentUserId) params.set("user_id", currentUserId);
+    if (cursor) params.set("cursor", cursor);
+    const res = await fetch(`https://pixi-fy.onrender.com/feed?${params}`);
+    if (!res.ok) throw new Error("Unable to fetch feed");
+    return res.json();
+  };
+
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [
-          postsRes,
-          usersRes,
-          profilesRes,
-          likesRes,
-          commentsRes,
-          followsRes
-        ] = await Promise.all([
-          fetch("https://pixi-fy.onrender.com/posts"),
-          fetch("https://pixi-fy.onrender.com/users"),
-          fetch("https://pixi-fy.onrender.com/profiles"),
-          fetch("https://pixi-fy.onrender.com/likes"),
-          fetch("https://pixi-fy.onrender.com/comments"),
-          currentUserId ? fetch("https://pixi-fy.onrender.com/follows") : Promise.resolve(null),
-        ]);
-
-        const postsData = await postsRes.json();
-        const usersData = await usersRes.json();
-        const profilesData = await profilesRes.json();
-        const likesData = await likesRes.json();
-        const commentsData = await commentsRes.json();
-
-        // Create lookup maps for users and profiles
-        const usersMap = usersData.reduce(
-          (acc, user) => ({ ...acc, [user.id]: user }), {}
-        );
-        const profilesMap = profilesData.reduce(
-          (acc, profile) => ({ ...acc, [profile.user_id]: profile }), {}
-        );
-        const likesCountMap = likesData.reduce(
-          (acc, like) => ({ ...acc, [like.post_id]: (acc[like.post_id] || 0) + 1 }), {}
-        );
-        const userLikesMap = likesData.reduce(
-          (acc, like) => ({ ...acc, [like.post_id]: like.id }), {}
-        );
-        const commentsMap = commentsData.reduce((acc, comment) => {
-          acc[comment.post_id] = [...(acc[comment.post_id] || []), comment];
-          return acc;
-        }, {});
-
-        // Process follows:
-        let followedIds = [];
-        let followersCountMap = {};
-        if (currentUserId && followsRes) {
-          const followsData = await followsRes.json();
-          // Those the current user follows
-          followedIds = followsData
-            .filter(f => f.follower_id === currentUserId)
-            .map(f => f.followed_id);
-          // Count followers for each user
-          followsData.forEach(f => {
-            followersCountMap[f.followed_id] = (followersCountMap[f.followed_id] || 0) + 1;
-          });
-        }
-
-        // Enrich posts with additional data
-        const enrichedPosts = postsData.map(post => ({
-          ...post,
-          author: {
-            ...usersMap[post.author_id],
-            profile: profilesMap[post.author_id],
-          },
-          likesCount: likesCountMap[post.id] || 0,
-          isLiked: Boolean(userLikesMap[post.id]),
-          likeId: userLikesMap[post.id],
-          comments: commentsMap[post.id] || [],
-          isFollowing: followedIds.includes(post.author_id),
-          followersCount: followersCountMap[post.author_id] || 0,
-          createdAt: new Date(post.created_at),
-        }));
-
-        setPosts(enrichedPosts);
+        const feed = await fetchFeed();
+        setPosts(feed.items.map(toFeedPost));
+        setNextCursor(feed.next_cursor);
         setLoading(false);
       } catch (err) {
         setError(err.message);
@@ -101,14 +57,21 @@ const Home = () => {
     fetchData();
   }, [currentUserId]);
 
+  const loadMore = async () => {
+    try {
+      const feed = await fetchFeed(nextCursor);
+      setPosts(prevPosts => [...prevPosts, ...feed.items.map(toFeedPost)]);
+      setNextCursor(feed.next_cursor);
+    } catch (err) {
+      toast.error(err.message);
+    }
+  };
+
   const handleLike = async (postId, likeId) => {
     try {
       if (likeId) {
-        await fetch(`https://pixi-fy.onrender.com/likes/${likeId}`, {
-          method: "DELETE",
-          headers: {
-            Authorization: `Bearer ${localStorage.getItem("token")}`
-          }
+        await authFetch(`https://pixi-fy.onrender.com/likes/${likeId}`, {
+          method: "DELETE"
         });
         // Update post like status after deleting like
         setPosts(posts.map(post => 
@@ -121,11 +84,10 @@ const Home = () => {
         ));
         toast.info("Removed like");
       } else {
-        const response = await fetch("https://pixi-fy.onrender.com/likes", {
+        const response = await authFetch("https://pixi-fy.onrender.com/likes", {
           method: "POST",
           headers: {
-            "Content-Type": "application/json",
-            Authorization: `Bearer ${localStorage.getItem("token")}`
+            "Content-Type": "application/json"
           },
           body: JSON.stringify({
             user_id: currentUserId,
@@ -156,7 +118,7 @@ const Home = () => {
     try {
       if (!isFollowing) {
         // Follow the user
-        const response = await fetch("https://pixi-fy.onrender.com/follows", {
+        const response = await authFetch("https://pixi-fy.onrender.com/follows", {
           method: "POST",
           headers: {
             "Content-Type": "application/json"
@@ -186,10 +148,10 @@ const Home = () => {
         const followRes = await fetch(
           `https://pixi-fy.onrender.com/follows?follower_id=${currentUserId}&followed_id=${authorId}`
         );
-        const followData = await followRes.json();
+        const { items: followData } = await followRes.json();
         if (followData.length > 0) {
           const followId = followData[0].id;
-          const response = await fetch(`https://pixi-fy.onrender.com/follows/${followId}`, {
+          const response = await authFetch(`https://pixi-fy.onrender.com/follows/${followId}`, {
             method: "DELETE"
           });
           if (response.ok) {
@@ -214,8 +176,21 @@ const Home = () => {
     }
   };
 
-  // Toggle the comments section for a given post
-  const toggleComments = (postId) => {
+  // Toggle the comments section for a given post, loading its comments on first open
+  const toggleComments = async (postId) => {
+    const post = posts.find(p => p.id === postId);
+    if (post && post.comments === null) {
+      try {
+        const res = await fetch(`https://pixi-fy.onrender.com/posts/${postId}/comments`);
+        const { items: comments } = await res.json();
+        setPosts(prevPosts => prevPosts.map(p =>
+          p.id === postId ? { ...p, comments } : p
+        ));
+      } catch (err) {
+        console.error("Error loading comments:", err);
+        toast.error("Error loading comments");
+      }
+    }
     setExpandedComments(prevState => ({
       ...prevState,
       [postId]: !prevState[postId]
@@ -235,7 +210,7 @@ const Home = () => {
     const commentText = commentInputs[postId];
     if (!commentText) return;
     try {
-      const response = await fetch("https://pixi-fy.onrender.com/comments", {
+      const response = await authFetch("https://pixi-fy.onrender.com/comments", {
         method: 'POST',
         headers: {
           "Content-Type": "application/json"
@@ -252,7 +227,8 @@ const Home = () => {
         if (post.id === postId) {
           return {
             ...post,
-            comments: [...post.comments, newComment]
+            comments: [...(post.comments || []), newComment],
+            commentsCount: post.commentsCount + 1
           };
         }
         return post;
@@ -285,7 +261,11 @@ const Home = () => {
             <div key={post.id} className="bg-white rounded-lg shadow-md mb-6 p-4">
               <div className="flex items-center mb-4">
                 <img
-                  src={post.author.profile?.profile_image || "/default-avatar.png"}
+                  src={
+                    post.author.profile?.profile_image_variants?.thumbnail ||
+                    post.author.profile?.profile_image ||
+                    "/default-avatar.png"
+                  }
                   alt={post.author.username}
                   className="w-12 h-12 rounded-full mr-3"
                 />
@@ -322,7 +302,7 @@ const Home = () => {
 
               {post.image_url && (
                 <img
-                  src={post.image_url}
+                  src={post.image_variants?.feed || post.image_url}
                   alt={post.title}
                   className="w-full h-64 object-cover mb-4 rounded-lg"
                 />
@@ -347,7 +327,7 @@ const Home = () => {
                   className="flex items-center space-x-1 hover:text-purple-700"
                 >
                   <span className="text-xl">💬</span>
-                  <span>{post.comments.length}</span>
+                  <span>{post.commentsCount}</span>
                   <span className="underline">View/Add Comments</span>
                 </button>
               </div>
@@ -355,7 +335,7 @@ const Home = () => {
               {/* Comments section */}
               {expandedComments[post.id] && (
                 <div className="mt-4 border-t pt-4">
-                  {post.comments.map((comment, index) => (
+                  {(post.comments || []).map((comment, index) => (
                     <div key={index} className="mb-2">
                       <p className="text-gray-700">{comment.body}</p>
                     </div>
@@ -379,6 +359,15 @@ const Home = () => {
               )}
             </div>
           ))}
+
+          {nextCursor && (
+            <button
+              onClick={loadMore}
+              className="block mx-auto bg-purple-700 text-white px-4 py-2 rounded"
+            >
+              Load more
+            </button>
+          )}
         </div>
       </div>
       <ToastContainer />
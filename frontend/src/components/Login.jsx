@@ -3,6 +3,7 @@ import { useFormik } from "formik";
 import * as yup from "yup";
 import { useNavigate, Link } from "react-router-dom";
 import { ToastContainer, toast } from "react-toastify";
+import { saveTokens } from "../auth";
 
 const LoginForm = () => {
   const navigate = useNavigate();
@@ -34,6 +35,7 @@ const LoginForm = () => {
         .then((data) => {
           const userId = data.user?.id ?? data.id;
           sessionStorage.setItem("userId", userId);
+          saveTokens(data);
           toast.success("Login successful!");
           navigate("/home");
         })
@@ -2,6 +2,7 @@
 import React, { useState } from "react";
 import { useNavigate } from "react-router-dom";
 import Navbar from "../Navbar";
+import { authFetch } from "../auth";
 
 const Post = () => {
   const [title, setTitle] = useState("");
@@ -32,7 +33,7 @@ const Post = () => {
     };
 
     try {
-      const response = await fetch("https://pixi-fy.onrender.com/posts", {
+      const response = await authFetch("https://pixi-fy.onrender.com/posts", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -1,6 +1,7 @@
 // Profile.jsx
 import React, { useState, useEffect } from "react";
 import Navbar from "../Navbar";
+import { authFetch } from "../auth";
 
 const Profile = () => {
   const [profile, setProfile] = useState(null);
@@ -69,7 +70,7 @@ const Profile = () => {
       return;
     }
     try {
-      const response = await fetch(`https://pixi-fy.onrender.com/profiles/${currentUserId}`, {
+      const response = await authFetch(`https://pixi-fy.onrender.com/profiles/${currentUserId}`, {
         method: "PATCH",
         headers: {
           "Content-Type": "application/json",
@@ -109,7 +110,7 @@ const Profile = () => {
         website,
         user_id: currentUserId,
       };
-      const response = await fetch("https://pixi-fy.onrender.com/profiles", {
+      const response = await authFetch("https://pixi-fy.onrender.com/profiles", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -1,5 +1,6 @@
 'use client'
 import { useEffect, useState } from 'react'
+import { authFetch } from '../auth'
 
 export default function Profile() {
   const userId = sessionStorage.getItem("userId");
@@ -30,7 +31,7 @@ export default function Profile() {
 
   const handleUpdate = async () => {
     try {
-      const res = await fetch(`https://pixi-fy.onrender.com/profiles/${userId}`, {
+      const res = await authFetch(`https://pixi-fy.onrender.com/profiles/${userId}`, {
         method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
@@ -54,7 +55,7 @@ export default function Profile() {
     <div className="max-w-2xl mx-auto p-6 rounded-xl shadow-md bg-white space-y-6">
       <div className="flex items-center gap-4">
         <img
-          src={profile.profile_image}
+          src={profile.profile_image_variants?.thumbnail || profile.profile_image}
           alt="Profile"
           className="w-24 h-24 rounded-full object-cover border"
         />
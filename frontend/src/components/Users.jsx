@@ -1,5 +1,6 @@
 // src/components/Users.jsx
 import React, { useEffect, useState } from "react";
+import { authFetch } from "../auth";
 
 const Users = () => {
   const [users, setUsers] = useState([]);
@@ -8,7 +9,7 @@ const Users = () => {
   useEffect(() => {
     fetch("https://pixi-fy.onrender.com/users")
       .then((res) => res.json())
-      .then((data) => setUsers(data))
+      .then((data) => setUsers(data.items))
       .catch((error) => console.error("Error fetching users:", error));
   }, []);
 
@@ -32,7 +33,7 @@ const Users = () => {
   };
 
   const handleDeleteUser = (id) => {
-    fetch(`https://pixi-fy.onrender.com/users/${id}`, { method: "DELETE" })
+    authFetch(`https://pixi-fy.onrender.com/users/${id}`, { method: "DELETE" })
       .then(() => setUsers(users.filter((user) => user.id !== id)))
       .catch((error) => console.error("Error deleting user:", error));
   };